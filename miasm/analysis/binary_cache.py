@@ -0,0 +1,700 @@
+"""
+On-disk cache of the disassembly and lifting of binaries
+
+Disassembling and lifting a binary is costly, and is done again each time
+the binary is analysed. BinaryCache stores, for each analysed function (the
+AsmCFG disassembled from an entry point), its blocks, the locations they use
+and their IR, in a compact binary form. Each function is stored in its own
+file, which is only loaded when the function is requested.
+
+Cached data are identified by the digest of the binary content, the
+architecture, the disassembly options and the lifter settings. They are
+discarded if the binary is analysed by another Miasm (or Python) version.
+
+Instructions are stored with their arguments (as expressions, see
+miasm.expression.expression_serialize) and their additional information (as
+plain values: nothing is unpickled). LocKeys are stored with their offset and
+names, and are mapped to the LocKeys of the LocationDB used on load; LocKeys
+without offset nor name are created again.
+
+The cache is stored in a directory private to the user (see
+miasm.core.table_cache), and is not used if this directory can be written by
+other users.
+"""
+
+from builtins import int as int_types
+import hashlib
+import json
+import logging
+import os
+import sys
+
+from future.utils import viewitems
+
+import miasm
+from miasm.analysis.binary import Container
+from miasm.analysis.machine import Machine
+from miasm.core import table_cache
+from miasm.core.asmblock import AsmBlock, AsmBlockBad, AsmCFG, AsmConstraint
+from miasm.expression.expression_serialize import ExprSerializer, \
+    ExprDeserializer, write_varint, read_varint
+from miasm.ir.ir import IRBlock, IRCFG
+from miasm.ir.serialize import write_assignblk, read_assignblk
+
+log = logging.getLogger("binary_cache")
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter("[%(levelname)-8s]: %(message)s"))
+log.addHandler(console_handler)
+log.setLevel(logging.WARN)
+
+MAGIC = b"MIASMBIN"
+# Bump to invalidate every cached binary
+FORMAT_VERSION = 2
+
+# Sections of a function file
+SECTION_ASMCFG = "asmcfg"
+SECTION_IR = "ir:"
+
+
+def version_key():
+    """Return the version of the cached data: a cache written by another
+    version is discarded"""
+    return repr((FORMAT_VERSION, miasm.VERSION, sys.version_info[:2]))
+
+
+# Plain values tags
+VALUE_NONE = 0
+VALUE_FALSE = 1
+VALUE_TRUE = 2
+VALUE_INT = 3
+VALUE_NEG_INT = 4
+VALUE_BYTES = 5
+VALUE_STR = 6
+VALUE_TUPLE = 7
+VALUE_LIST = 8
+VALUE_OBJECT = 9
+
+
+def write_value(serializer, value, module):
+    """Serialize the plain @value: None, bool, int, bytes, str, tuple or list
+    of plain values, or instance of a class of @module whose attributes are
+    plain values
+    Raise TypeError for other values
+    @serializer: ExprSerializer instance
+    @module: architecture module
+    """
+    if value is None:
+        serializer.write_uint(VALUE_NONE)
+    elif value is True or value is False:
+        serializer.write_uint(VALUE_TRUE if value else VALUE_FALSE)
+    elif isinstance(value, int_types):
+        if value < 0:
+            serializer.write_uint(VALUE_NEG_INT)
+            serializer.write_uint(-value)
+        else:
+            serializer.write_uint(VALUE_INT)
+            serializer.write_uint(value)
+    elif isinstance(value, bytes):
+        serializer.write_uint(VALUE_BYTES)
+        serializer.write_bytes(value)
+    elif isinstance(value, str):
+        serializer.write_uint(VALUE_STR)
+        serializer.write_str(value)
+    elif isinstance(value, (tuple, list)):
+        serializer.write_uint(
+            VALUE_TUPLE if isinstance(value, tuple) else VALUE_LIST
+        )
+        serializer.write_uint(len(value))
+        for item in value:
+            write_value(serializer, item, module)
+    elif getattr(module, value.__class__.__name__, None) is value.__class__:
+        serializer.write_uint(VALUE_OBJECT)
+        serializer.write_str(value.__class__.__name__)
+        attributes = sorted(viewitems(vars(value)))
+        serializer.write_uint(len(attributes))
+        for name, item in attributes:
+            serializer.write_str(name)
+            write_value(serializer, item, module)
+    else:
+        raise TypeError("Cannot store %r" % (value,))
+
+
+def read_value(deserializer, module):
+    """Return the plain value read from @deserializer
+    @deserializer: ExprDeserializer instance
+    @module: architecture module, defining the classes of the objects
+    """
+    tag = deserializer.read_uint()
+    if tag == VALUE_NONE:
+        return None
+    if tag in (VALUE_FALSE, VALUE_TRUE):
+        return tag == VALUE_TRUE
+    if tag == VALUE_INT:
+        return deserializer.read_uint()
+    if tag == VALUE_NEG_INT:
+        return -deserializer.read_uint()
+    if tag == VALUE_BYTES:
+        return deserializer.read_bytes()
+    if tag == VALUE_STR:
+        return deserializer.read_str()
+    if tag in (VALUE_TUPLE, VALUE_LIST):
+        items = [
+            read_value(deserializer, module)
+            for _ in range(deserializer.read_uint())
+        ]
+        return tuple(items) if tag == VALUE_TUPLE else items
+    if tag == VALUE_OBJECT:
+        cls = getattr(module, deserializer.read_str(), None)
+        if not isinstance(cls, type) or cls.__module__ != module.__name__:
+            raise ValueError("Unknown class")
+        value = cls.__new__(cls)
+        for _ in range(deserializer.read_uint()):
+            name = deserializer.read_str()
+            setattr(value, name, read_value(deserializer, module))
+        return value
+    raise ValueError("Unknown value tag %d" % tag)
+
+
+def write_instr(serializer, instr):
+    """Serialize @instr
+    @serializer: ExprSerializer instance
+    @instr: instruction instance
+    """
+    module = sys.modules[instr.__class__.__module__]
+    serializer.write_str(instr.__class__.__name__)
+    serializer.write_str(instr.name)
+    write_value(serializer, instr.mode, module)
+    serializer.write_uint(instr.offset)
+    serializer.write_uint(instr.l)
+    serializer.write_bytes(instr.b)
+    serializer.write_uint(len(instr.args))
+    for arg in instr.args:
+        serializer.write_expr(arg)
+    write_value(serializer, instr.additional_info, module)
+    serializer.write_uint(instr.delayslot)
+    write_value(serializer, getattr(instr, "data", None), module)
+
+
+def read_instr(deserializer, mn):
+    """Return the instruction read from @deserializer
+    @deserializer: ExprDeserializer instance
+    @mn: cls_mn of the architecture
+    """
+    cls = mn.instruction
+    module = sys.modules[cls.__module__]
+    if deserializer.read_str() != cls.__name__:
+        raise ValueError("Instruction of another architecture")
+    instr = cls.__new__(cls)
+    instr.name = deserializer.read_str()
+    instr.mode = read_value(deserializer, module)
+    instr.offset = deserializer.read_uint()
+    instr.l = deserializer.read_uint()
+    instr.b = deserializer.read_bytes()
+    instr.args = [
+        deserializer.read_expr() for _ in range(deserializer.read_uint())
+    ]
+    instr.additional_info = read_value(deserializer, module)
+    instr.delayslot = deserializer.read_uint()
+    data = read_value(deserializer, module)
+    if data is not None:
+        instr.data = data
+    return instr
+
+
+def write_asmcfg(serializer, asmcfg):
+    """Serialize the blocks of @asmcfg
+    @serializer: ExprSerializer instance
+    @asmcfg: AsmCFG instance
+    """
+    serializer.write_uint(len(asmcfg.blocks))
+    for block in asmcfg.blocks:
+        serializer.write_loc_key(block.loc_key)
+        if isinstance(block, AsmBlockBad):
+            # errno starts at -1
+            serializer.write_uint(block.errno + 2)
+        else:
+            serializer.write_uint(0)
+        serializer.write_uint(block.alignment)
+        serializer.write_uint(len(block.lines))
+        for instr in block.lines:
+            write_instr(serializer, instr)
+        serializer.write_uint(len(block.bto))
+        for constraint in block.bto:
+            serializer.write_loc_key(constraint.loc_key)
+            serializer.write_str(constraint.c_t)
+
+
+def read_asmcfg(deserializer, loc_db, mn):
+    """Return the AsmCFG read from @deserializer
+    @deserializer: ExprDeserializer instance
+    @loc_db: LocationDB instance of the AsmCFG
+    @mn: cls_mn of the architecture
+    """
+    asmcfg = AsmCFG(loc_db)
+    for _ in range(deserializer.read_uint()):
+        loc_key = deserializer.read_loc_key()
+        kind = deserializer.read_uint()
+        alignment = deserializer.read_uint()
+        if kind:
+            block = AsmBlockBad(loc_db, loc_key, alignment, errno=kind - 2)
+        else:
+            block = AsmBlock(loc_db, loc_key, alignment)
+        block.lines = [
+            read_instr(deserializer, mn)
+            for _ in range(deserializer.read_uint())
+        ]
+        for _ in range(deserializer.read_uint()):
+            loc_key = deserializer.read_loc_key()
+            block.bto.add(AsmConstraint(loc_key, deserializer.read_str()))
+        asmcfg.add_block(block)
+    return asmcfg
+
+
+def write_ircfg(serializer, ircfg):
+    """Serialize @ircfg, with the offsets of the instructions of its
+    AssignBlocks
+    @serializer: ExprSerializer instance
+    @ircfg: IRCFG instance
+    """
+    serializer.write_expr(ircfg.IRDst)
+    nodes = ircfg.nodes()
+    serializer.write_uint(len(nodes))
+    for node in nodes:
+        serializer.write_loc_key(node)
+    edges = ircfg.edges()
+    serializer.write_uint(len(edges))
+    for src, dst in edges:
+        serializer.write_loc_key(src)
+        serializer.write_loc_key(dst)
+    serializer.write_uint(len(ircfg.blocks))
+    for irblock in ircfg.blocks.values():
+        serializer.write_loc_key(irblock.loc_key)
+        serializer.write_uint(len(irblock))
+        for assignblk in irblock:
+            instr = assignblk.instr
+            if instr is None or instr.offset is None:
+                serializer.write_uint(0)
+            else:
+                serializer.write_uint(instr.offset + 1)
+            write_assignblk(serializer, assignblk)
+
+
+def read_ircfg(deserializer, loc_db, instrs):
+    """Return the IRCFG read from @deserializer
+    @deserializer: ExprDeserializer instance
+    @loc_db: LocationDB instance of the IRCFG
+    @instrs: dictionary offset -> instruction of the lifted instructions
+    """
+    ircfg = IRCFG(deserializer.read_expr(), loc_db)
+    for _ in range(deserializer.read_uint()):
+        ircfg.add_node(deserializer.read_loc_key())
+    for _ in range(deserializer.read_uint()):
+        src = deserializer.read_loc_key()
+        ircfg.add_edge(src, deserializer.read_loc_key())
+    for _ in range(deserializer.read_uint()):
+        loc_key = deserializer.read_loc_key()
+        assignblks = []
+        for _ in range(deserializer.read_uint()):
+            offset = deserializer.read_uint()
+            instr = instrs.get(offset - 1) if offset else None
+            assignblks.append(read_assignblk(deserializer, instr))
+        ircfg.blocks[loc_key] = IRBlock(loc_db, loc_key, assignblks)
+    return ircfg
+
+
+def dump_section(loc_db, writer, obj):
+    """Return the section storing @obj, written by @writer, and the locations
+    it uses
+    @loc_db: LocationDB instance of @obj
+    @writer: function (ExprSerializer, object)
+    @obj: object to serialize
+    """
+    serializer = ExprSerializer()
+    writer(serializer, obj)
+    locations = ExprSerializer()
+    locations.write_uint(len(serializer.loc_keys))
+    for loc_key in sorted(serializer.loc_keys):
+        offset = loc_db.get_location_offset(loc_key)
+        names = sorted(loc_db.get_location_names(loc_key), key=repr)
+        locations.write_uint(loc_key.key)
+        locations.write_uint(0 if offset is None else offset + 1)
+        locations.write_uint(len(names))
+        for name in names:
+            if isinstance(name, bytes):
+                locations.write_uint(1)
+                locations.write_bytes(name)
+            else:
+                locations.write_uint(0)
+                locations.write_str(name)
+    out = bytearray()
+    locations = locations.get_bytes()
+    write_varint(out, len(locations))
+    out += locations
+    out += serializer.get_bytes()
+    return bytes(out)
+
+
+def load_section(loc_db, data):
+    """Return an ExprDeserializer reading the section @data, whose LocKeys
+    are mapped to the ones of @loc_db
+    @loc_db: LocationDB instance
+    @data: bytes generated by dump_section
+    """
+    data = bytearray(data)
+    length, offset = read_varint(data, 0)
+    locations = ExprDeserializer(data[offset:offset + length])
+    stored = {}
+    for _ in range(locations.read_uint()):
+        key = locations.read_uint()
+        loc_offset = locations.read_uint()
+        names = []
+        for _ in range(locations.read_uint()):
+            if locations.read_uint():
+                names.append(locations.read_bytes())
+            else:
+                names.append(locations.read_str())
+        stored[key] = (loc_offset - 1 if loc_offset else None, names)
+    loc_keys = {}
+
+    def loc_key_map(key):
+        loc_key = loc_keys.get(key)
+        if loc_key is not None:
+            return loc_key
+        loc_offset, names = stored[key]
+        if loc_offset is not None:
+            loc_key = loc_db.get_or_create_offset_location(loc_offset)
+        else:
+            for name in names:
+                loc_key = loc_db.get_name_location(name)
+                if loc_key is not None:
+                    break
+            else:
+                loc_key = loc_db.add_location()
+        for name in names:
+            if loc_db.get_name_location(name) is None:
+                loc_db.add_location_name(loc_key, name)
+        loc_keys[key] = loc_key
+        return loc_key
+
+    return ExprDeserializer(data[offset + length:], loc_key_map)
+
+
+def dump_sections(sections):
+    """Return the content of a function file storing @sections
+    @sections: dictionary section name -> bytes
+    """
+    out = bytearray(MAGIC)
+    write_varint(out, len(sections))
+    for name, data in sorted(viewitems(sections)):
+        name = name.encode("utf8")
+        write_varint(out, len(name))
+        out += name
+        write_varint(out, len(data))
+        out += data
+    return bytes(out)
+
+
+def load_sections(data):
+    """Return the sections stored in the function file content @data"""
+    if data[:len(MAGIC)] != MAGIC:
+        raise ValueError("Not a function cache file")
+    data = bytearray(data)
+    count, offset = read_varint(data, len(MAGIC))
+    sections = {}
+    for _ in range(count):
+        length, offset = read_varint(data, offset)
+        name = bytes(data[offset:offset + length]).decode("utf8")
+        length, offset = read_varint(data, offset + length)
+        sections[name] = bytes(data[offset:offset + length])
+        offset += length
+    return sections
+
+
+class _CachedFunction(object):
+    """Function loaded from (or added to) the cache
+    Its sections are None if it cannot be stored"""
+
+    def __init__(self, path, asmcfg, sections):
+        self.path = path
+        self.asmcfg = asmcfg
+        self.sections = sections
+        self._instrs = None
+
+    @property
+    def instrs(self):
+        """Dictionary offset -> instruction of the function"""
+        if self._instrs is None:
+            self._instrs = dict(
+                (instr.offset, instr)
+                for block in self.asmcfg.blocks
+                for instr in block.lines
+            )
+        return self._instrs
+
+
+class BinaryCache(object):
+    """
+    On-disk cache of the disassembly and lifting of the functions of a binary
+
+    Usage:
+    >>> cache = BinaryCache(open("binary", "rb").read(), loc_db)
+    >>> asmcfg = cache.get_asmcfg(offset, follow_call=False)
+    >>> ircfg = cache.get_ircfg(offset, cache.machine.lifter(loc_db))
+
+    The binary is only parsed (see the container attribute) if it has to be
+    disassembled. AsmCFGs are shared between calls; IRCFGs are loaded again
+    on each call, and can be modified.
+    """
+
+    def __init__(self, data, loc_db, arch=None, cache_dir=None, **kwargs):
+        """
+        @data: bytes, content of the binary
+        @loc_db: LocationDB instance
+        @arch: (optional) architecture name, default to the one guessed from
+        the binary
+        @cache_dir: (optional) cache directory, default to the "binaries"
+        sub-directory of the tables cache directory
+        @kwargs: (optional) Container arguments (load address, relocations,
+        ...), which must have a stable repr
+        """
+        self.data = data
+        self.loc_db = loc_db
+        if cache_dir is None:
+            cache_dir = os.path.join(table_cache.cache_dir, "binaries")
+        digest = hashlib.sha256(data)
+        if kwargs:
+            # The binary mapping depends on the Container arguments
+            digest.update(repr(sorted(viewitems(kwargs))).encode("utf8"))
+        self.digest = digest.hexdigest()
+        self.directory = os.path.join(cache_dir, self.digest)
+        self.enabled = self._make_directory()
+        self._container_kwargs = kwargs
+        self._container = None
+        self._arch = arch
+        self._machine = None
+        # (offset, options) -> _CachedFunction
+        self._functions = {}
+        self.hits = 0
+        self.misses = 0
+        self._load_info()
+
+    def _make_directory(self):
+        """Create the cache directory of the binary
+        Return False if it cannot be used: cached data are only loaded from
+        directories writable by the current user only"""
+        try:
+            table_cache.make_directory(self.directory)
+        except (IOError, OSError) as error:
+            log.warning("Cannot create cache %s: %r", self.directory, error)
+            return False
+        for directory in [os.path.dirname(self.directory), self.directory]:
+            if not table_cache.is_safe_directory(directory):
+                log.warning("Cache %s not used: unsafe directory", directory)
+                return False
+        return True
+
+    def _info_path(self):
+        return os.path.join(self.directory, "info")
+
+    def _load_info(self):
+        """Discard the cached data if they have been written by another
+        version, read the architecture guessed from the binary"""
+        if not self.enabled:
+            return
+        try:
+            with open(self._info_path(), "rb") as fdesc:
+                info = json.loads(fdesc.read().decode("utf8"))
+        except (IOError, OSError):
+            info = None
+        except Exception as error:
+            log.warning("Cannot load cache information %s: %r",
+                        self._info_path(), error)
+            info = None
+        if not isinstance(info, dict):
+            info = None
+        if info is not None and info.get("version") == version_key():
+            if self._arch is None:
+                self._arch = info.get("arch")
+            return
+        if info is not None:
+            log.info("Discard cache %s (version mismatch)", self.directory)
+        self.clear()
+
+    def _save_info(self):
+        info = {"version": version_key(), "arch": None}
+        if self._container is not None:
+            info["arch"] = self._container.arch
+        table_cache.atomic_write(
+            self._info_path(),
+            json.dumps(info).encode("utf8")
+        )
+
+    def clear(self):
+        """Remove the cached data of the binary"""
+        self._functions.clear()
+        if not self.enabled:
+            return
+        if os.path.isdir(self.directory):
+            for name in os.listdir(self.directory):
+                os.remove(os.path.join(self.directory, name))
+        try:
+            self._save_info()
+        except (IOError, OSError) as error:
+            log.warning("Cannot write cache %s: %r", self.directory, error)
+
+    @property
+    def container(self):
+        """Container of the binary, parsed on first use"""
+        if self._container is None:
+            self._container = Container.from_string(
+                self.data, self.loc_db, **self._container_kwargs
+            )
+            if self._arch is None:
+                self._arch = self._container.arch
+                if not self.enabled:
+                    return self._container
+                try:
+                    self._save_info()
+                except (IOError, OSError) as error:
+                    log.warning("Cannot write cache %s: %r",
+                                self.directory, error)
+        return self._container
+
+    @property
+    def arch(self):
+        """Architecture name"""
+        if self._arch is None:
+            # Guessed by the container
+            self.container
+        return self._arch
+
+    @property
+    def machine(self):
+        """Machine instance of the architecture"""
+        if self._machine is None:
+            self._machine = Machine(self.arch)
+        return self._machine
+
+    def function_path(self, offset, options):
+        """Return the path of the file of the function at @offset,
+        disassembled with @options
+        @offset: function entry point
+        @options: repr of the disassembly options
+        """
+        digest = hashlib.sha256(options.encode("utf8")).hexdigest()[:16]
+        return os.path.join(
+            self.directory,
+            "%s-%x-%s.bin" % (self.arch, offset, digest)
+        )
+
+    def _save_function(self, function):
+        if not self.enabled or function.sections is None:
+            return
+        try:
+            table_cache.atomic_write(
+                function.path,
+                dump_sections(function.sections)
+            )
+        except (IOError, OSError) as error:
+            log.warning("Cannot write cache %s: %r", function.path, error)
+
+    def _get_function(self, offset, options):
+        """Return the _CachedFunction at @offset, disassembled with the
+        disassembly engine attributes @options"""
+        options_key = repr(sorted(viewitems(options)))
+        function = self._functions.get((offset, options_key))
+        if function is not None:
+            return function
+        path = self.function_path(offset, options_key)
+        try:
+            if not self.enabled:
+                raise IOError("Cache disabled")
+            with open(path, "rb") as fdesc:
+                sections = load_sections(fdesc.read())
+            asmcfg = read_asmcfg(
+                load_section(self.loc_db, sections[SECTION_ASMCFG]),
+                self.loc_db,
+                self.machine.mn
+            )
+        except (IOError, OSError):
+            function = None
+        except Exception as error:
+            log.warning("Cannot load cached function %s: %r", path, error)
+            function = None
+        else:
+            self.hits += 1
+            function = _CachedFunction(path, asmcfg, sections)
+        if function is None:
+            self.misses += 1
+            mdis = self.machine.dis_engine(
+                self.container.bin_stream, loc_db=self.loc_db
+            )
+            for name, value in viewitems(options):
+                if not hasattr(mdis, name):
+                    raise ValueError("Unknown disassembly option %r" % name)
+                setattr(mdis, name, value)
+            asmcfg = mdis.dis_multiblock(offset)
+            try:
+                sections = {
+                    SECTION_ASMCFG: dump_section(
+                        self.loc_db, write_asmcfg, asmcfg
+                    ),
+                }
+            except TypeError as error:
+                # Instructions information cannot be stored
+                log.warning("Cannot cache function %s: %r", path, error)
+                sections = None
+            function = _CachedFunction(path, asmcfg, sections)
+            self._save_function(function)
+        self._functions[(offset, options_key)] = function
+        return function
+
+    def get_asmcfg(self, offset, **options):
+        """Return the AsmCFG disassembled from @offset
+        @offset: function entry point
+        @options: disassembly engine attributes (follow_call, dontdis, ...),
+        which must have a stable repr
+        """
+        return self._get_function(offset, options).asmcfg
+
+    @staticmethod
+    def lifter_key(lifter):
+        """Return the key identifying the IR generated by @lifter: its class
+        and its settings"""
+        settings = [
+            (name, value) for name, value in sorted(viewitems(vars(lifter)))
+            if isinstance(value, (bool, int, str))
+        ]
+        return "%s.%s%r" % (
+            lifter.__class__.__module__,
+            lifter.__class__.__name__,
+            settings
+        )
+
+    def get_ircfg(self, offset, lifter, **options):
+        """Return the IRCFG of the function disassembled from @offset
+        @offset: function entry point
+        @lifter: Lifter instance, using the LocationDB of the cache
+        @options: disassembly engine attributes, see get_asmcfg
+        """
+        function = self._get_function(offset, options)
+        if function.sections is None:
+            return lifter.new_ircfg_from_asmcfg(function.asmcfg)
+        section = SECTION_IR + self.lifter_key(lifter)
+        data = function.sections.get(section)
+        if data is not None:
+            try:
+                return read_ircfg(
+                    load_section(self.loc_db, data),
+                    self.loc_db,
+                    function.instrs
+                )
+            except Exception as error:
+                log.warning("Cannot load cached IR %s: %r",
+                            function.path, error)
+        ircfg = lifter.new_ircfg_from_asmcfg(function.asmcfg)
+        function.sections[section] = dump_section(
+            self.loc_db, write_ircfg, ircfg
+        )
+        self._save_function(function)
+        return ircfg
@@ -8,7 +8,7 @@ from miasm.core.graph import DiGraph
 from miasm.ir.ir import AssignBlock, IRBlock
 from miasm.expression.expression import ExprLoc, ExprMem, ExprId, ExprInt,\
     ExprAssign, ExprOp, ExprWalk, ExprSlice, \
-    is_function_call, ExprVisitorCallbackBottomToTop
+    is_function_call, ExprVisitorCallbackBottomToTopIterative
 from miasm.expression.simplifications import expr_simp, expr_simp_explicit
 from miasm.core.interval import interval
 from miasm.expression.expression_helper import possible_values
@@ -380,14 +380,24 @@ class DeadRemoval(object):
         useful = set(useful)
         for block in list(viewvalues(ircfg.blocks)):
             irs = []
+            block_modified = False
             for idx, assignblk in enumerate(block):
                 new_assignblk = dict(assignblk)
                 for lval in assignblk:
                     if AssignblkNode(block.loc_key, idx, lval) not in useful:
                         del new_assignblk[lval]
-                        modified = True
-                irs.append(AssignBlock(new_assignblk, assignblk.instr))
-            ircfg.blocks[block.loc_key] = IRBlock(block.loc_db, block.loc_key, irs)
+                if len(new_assignblk) == len(assignblk):
+                    irs.append(assignblk)
+                    continue
+                block_modified = True
+                irs.append(
+                    AssignBlock.from_trusted(new_assignblk, assignblk.instr)
+                )
+            if block_modified:
+                modified = True
+                ircfg.blocks[block.loc_key] = IRBlock.from_trusted(
+                    block.loc_db, block.loc_key, tuple(irs)
+                )
         return modified
 
     def __call__(self, ircfg):
@@ -435,7 +445,7 @@ def _do_merge_blocks(ircfg, loc_key, son_loc_key):
             if dst != ircfg.IRDst:
                 affs[dst] = src
         if affs:
-            assignblks.append(AssignBlock(affs, assignblk.instr))
+            assignblks.append(AssignBlock.from_trusted(affs, assignblk.instr))
 
     assignblks += ircfg.blocks[son_loc_key].assignblks
     new_block = IRBlock(ircfg.loc_db, loc_key, assignblks)
@@ -583,7 +593,7 @@ def _remove_to_parent(ircfg, loc_key, son_loc_key):
     return True
 
 
-def merge_blocks(ircfg, heads):
+def merge_blocks(ircfg, heads, loc_keys=None):
     """
     This function modifies @ircfg to apply the following transformations:
     - group an irblock with its son if the irblock has one and only one son and
@@ -601,10 +611,13 @@ def merge_blocks(ircfg, heads):
 
     @ircfg: IRCFG instance
     @heads: loc_key to keep
+    @loc_keys: (optional) LocKeys of the candidate irblocks (default: all)
     """
 
     modified = False
-    todo = set(ircfg.nodes())
+    if loc_keys is None:
+        loc_keys = ircfg.nodes()
+    todo = set(loc_keys)
     while todo:
         loc_key = todo.pop()
 
@@ -640,15 +653,21 @@ def merge_blocks(ircfg, heads):
     return modified
 
 
-def remove_empty_assignblks(ircfg):
+def remove_empty_assignblks(ircfg, loc_keys=None):
     """
     Remove empty assignblks in irblocks of @ircfg
     Return True if at least an irblock has been modified
 
     @ircfg: IRCFG instance
+    @loc_keys: (optional) LocKeys of the irblocks to process (default: all)
     """
     modified = False
-    for loc_key, block in list(viewitems(ircfg.blocks)):
+    if loc_keys is None:
+        loc_keys = list(ircfg.blocks)
+    for loc_key in loc_keys:
+        block = ircfg.blocks.get(loc_key)
+        if block is None:
+            continue
         irs = []
         block_modified = False
         for assignblk in block:
@@ -1628,7 +1647,7 @@ def replace_expr_from_bottom(expr_orig, dct):
         if expr in dct:
             return dct[expr]
         return expr
-    visitor = ExprVisitorCallbackBottomToTop(lambda expr:replace(expr))
+    visitor = ExprVisitorCallbackBottomToTopIterative(lambda expr:replace(expr))
     return visitor.visit(expr_orig)
 
 
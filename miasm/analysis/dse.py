@@ -338,10 +338,6 @@ class DSEEngine(object):
         # Handle current address
         self.handle(ExprInt(cur_addr, self.lifter.IRDst.size))
 
-        # Avoid memory issue in ExpressionSimplifier
-        if len(self.symb.expr_simp.cache) > 100000:
-            self.symb.expr_simp.cache.clear()
-
         # Get IR blocks
         if cur_addr in self.addr_to_cacheblocks:
             self.ircfg.blocks.clear()
@@ -3,8 +3,12 @@ Apply simplification passes to an IR cfg
 """
 
 import logging
+import time
 import warnings
 from functools import wraps
+
+from future.utils import viewitems
+
 from miasm.analysis.ssa import SSADiGraph
 from miasm.analysis.outofssa import UnSSADiGraph
 from miasm.analysis.data_flow import DiGraphLivenessSSA
@@ -41,14 +45,125 @@ def fix_point(func):
     return ret_func
 
 
+class PassesStats(object):
+    """
+    Statistics of the simplification passes: for each pass, number of runs,
+    of runs modifying the graph, duration, and for the incremental passes,
+    number of irblocks processed and skipped
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        # pass name -> [runs, modified runs, duration, processed, skipped]
+        self.passes = {}
+
+    def _get(self, name):
+        return self.passes.setdefault(name, [0, 0, 0., 0, 0])
+
+    def add_run(self, name, modified, duration):
+        """Record a run of the pass @name
+        @modified: True if the run modified the graph
+        @duration: duration of the run
+        """
+        stats = self._get(name)
+        stats[0] += 1
+        stats[1] += int(bool(modified))
+        stats[2] += duration
+
+    def add_blocks(self, name, processed, skipped):
+        """Record the number of irblocks @processed and @skipped by a run of
+        the incremental pass @name"""
+        stats = self._get(name)
+        stats[3] += processed
+        stats[4] += skipped
+
+    def __str__(self):
+        out = ["%-28s %6s %8s %9s %10s %10s" % (
+            "pass", "runs", "modified", "time", "processed", "skipped"
+        )]
+        for name, stats in sorted(viewitems(self.passes)):
+            runs, modified, duration, processed, skipped = stats
+            if runs:
+                runs = "%6d %8d %8.3fs" % (runs, modified, duration)
+            else:
+                # Sub-pass of a pass
+                runs = "%6s %8s %9s" % ("-", "-", "-")
+            out.append("%-28s %s %10d %10d" % (name, runs, processed, skipped))
+        return "\n".join(out)
+
+
+class DirtyBlocks(object):
+    """
+    Track the irblocks of an IRCFG modified since the last run of a pass.
+
+    IRBlocks are immutable, and passes keep the ones they don't modify: an
+    irblock is dirty if the IRCFG holds another IRBlock at its LocKey, or if
+    its successors have changed.
+    """
+
+    def __init__(self):
+        # LocKey -> (IRBlock, successors) at the last run
+        self._clean = {}
+
+    def get_dirty(self, ircfg, neighbours=False):
+        """Return the set of LocKeys of the irblocks of @ircfg modified since
+        the last call to set_clean
+        @neighbours: also return the LocKeys of the irblocks whose edges may
+        be modified (predecessors and successors, present or past, of the
+        modified irblocks, and predecessors of these successors)
+        """
+        dirty = set()
+        successors = set()
+        for loc_key, irblock in viewitems(ircfg.blocks):
+            state = self._clean.get(loc_key)
+            if state is not None and state[0] is irblock:
+                if state[1] == frozenset(ircfg.successors_iter(loc_key)):
+                    continue
+            dirty.add(loc_key)
+            if state is not None:
+                successors.update(state[1])
+        if not neighbours:
+            return dirty
+        for loc_key, (_, old_successors) in viewitems(self._clean):
+            if loc_key not in ircfg.blocks:
+                # Removed irblock
+                successors.update(old_successors)
+        affected = set(dirty)
+        for loc_key in dirty:
+            successors.update(ircfg.successors_iter(loc_key))
+            affected.update(ircfg.predecessors_iter(loc_key))
+        nodes = ircfg.nodes()
+        for loc_key in successors:
+            if loc_key in nodes:
+                affected.add(loc_key)
+                affected.update(ircfg.predecessors_iter(loc_key))
+        return affected.intersection(ircfg.blocks)
+
+    def set_clean(self, ircfg):
+        """Record the current state of the irblocks of @ircfg"""
+        self._clean = dict(
+            (loc_key, (irblock, frozenset(ircfg.successors_iter(loc_key))))
+            for loc_key, irblock in viewitems(ircfg.blocks)
+        )
+
+
 class IRCFGSimplifier(object):
     """
     Simplify an IRCFG
     This class applies passes until reaching a fix point
+
+    Block-local passes only process the irblocks modified since their last run
+    (see get_dirty_blocks). Passes statistics are logged (INFO level) at the
+    end of the simplification, and are available in self.stats.
     """
 
     def __init__(self, lifter):
         self.lifter = lifter
+        self.stats = PassesStats()
+        # pass name -> DirtyBlocks
+        self.dirty_blocks = {}
         self.init_passes()
 
     @property
@@ -62,18 +177,57 @@ class IRCFGSimplifier(object):
         """
         self.passes = []
 
-    @fix_point
+    def get_dirty_blocks(self, name, ircfg, neighbours=False):
+        """
+        Return the LocKeys of the irblocks of @ircfg to process by the run of
+        the pass @name: the irblocks modified since its last run (all the
+        irblocks on its first run)
+
+        @name: name of the pass
+        @ircfg: IRCFG instance
+        @neighbours: (optional) also return the irblocks whose edges may have
+        been modified
+        """
+        tracker = self.dirty_blocks.setdefault(name, DirtyBlocks())
+        loc_keys = tracker.get_dirty(ircfg, neighbours)
+        tracker.set_clean(ircfg)
+        self.stats.add_blocks(
+            name, len(loc_keys), len(ircfg.blocks) - len(loc_keys)
+        )
+        return loc_keys
+
     def simplify(self, ircfg, head):
         """
         Apply passes until reaching a fix point
         Return True if the graph has been modified
 
+        @ircfg: IRCFG instance to simplify
+        @head: Location instance of the ircfg head
+        """
+        self.stats.reset()
+        modified = self.apply_passes(ircfg, head)
+        self.dirty_blocks = {}
+        log.info("Passes statistics:\n%s", self.stats)
+        return modified
+
+    @fix_point
+    def apply_passes(self, ircfg, head):
+        """
+        Apply passes until reaching a fix point
+        Return True if the graph has been modified
+
         @ircfg: IRCFG instance to simplify
         @head: Location instance of the ircfg head
         """
         modified = False
         for simplify_pass in self.passes:
-            modified |= simplify_pass(ircfg, head)
+            start = time.time()
+            pass_modified = simplify_pass(ircfg, head)
+            self.stats.add_run(
+                getattr(simplify_pass, "__name__", repr(simplify_pass)),
+                pass_modified, time.time() - start
+            )
+            modified |= pass_modified
         return modified
 
     def __call__(self, ircfg, head):
@@ -106,7 +260,8 @@ class IRCFGSimplifierCommon(IRCFGSimplifier):
 
         @ircfg: IRCFG instance to simplify
         """
-        modified = ircfg.simplify(self.expr_simp)
+        loc_keys = self.get_dirty_blocks("simplify_ircfg", ircfg)
+        modified = ircfg.simplify(self.expr_simp, loc_keys)
         return modified
 
     @fix_point
@@ -123,8 +278,10 @@ class IRCFGSimplifierCommon(IRCFGSimplifier):
         @head: Location instance of the ircfg head
         """
         modified = self.deadremoval(ircfg)
-        modified |= remove_empty_assignblks(ircfg)
-        modified |= merge_blocks(ircfg, set([head]))
+        loc_keys = self.get_dirty_blocks("remove_empty_assignblks", ircfg)
+        modified |= remove_empty_assignblks(ircfg, loc_keys)
+        loc_keys = self.get_dirty_blocks("merge_blocks", ircfg, True)
+        modified |= merge_blocks(ircfg, set([head]), loc_keys)
         return modified
 
 
@@ -218,7 +375,8 @@ class IRCFGSimplifierSSA(IRCFGSimplifierCommon):
 
         @ssa: SSADiGraph instance
         """
-        modified = ssa.graph.simplify(self.expr_simp)
+        loc_keys = self.get_dirty_blocks("simplify_ssa", ssa.graph)
+        modified = ssa.graph.simplify(self.expr_simp, loc_keys)
         return modified
 
     @fix_point
@@ -253,7 +411,10 @@ class IRCFGSimplifierSSA(IRCFGSimplifierCommon):
         Remove empty assignblks
         @head: Location instance of the graph head
         """
-        modified = remove_empty_assignblks(ssa.graph)
+        loc_keys = self.get_dirty_blocks(
+            "do_remove_empty_assignblks", ssa.graph
+        )
+        modified = remove_empty_assignblks(ssa.graph, loc_keys)
         return modified
 
     @fix_point
@@ -262,7 +423,8 @@ class IRCFGSimplifierSSA(IRCFGSimplifierCommon):
         Merge blocks with one parent/son
         @head: Location instance of the graph head
         """
-        modified = merge_blocks(ssa.graph, set([head]))
+        loc_keys = self.get_dirty_blocks("do_merge_blocks", ssa.graph, True)
+        modified = merge_blocks(ssa.graph, set([head]), loc_keys)
         return modified
 
     @fix_point
@@ -287,7 +449,7 @@ class IRCFGSimplifierSSA(IRCFGSimplifierCommon):
         Apply passes until reaching a fix point
         Return True if the graph has been modified
         """
-        return super(IRCFGSimplifierSSA, self).simplify(ssa, head)
+        return self.apply_passes(ssa, head)
 
     def do_simplify_loop(self, ssa, head):
         """
@@ -316,8 +478,11 @@ class IRCFGSimplifierSSA(IRCFGSimplifierCommon):
         @head: Location instance of the ircfg head
         """
 
+        self.stats.reset()
         ssa = self.ircfg_to_ssa(ircfg, head)
         ssa = self.do_simplify_loop(ssa, head)
+        self.dirty_blocks = {}
+        log.info("SSA passes statistics:\n%s", self.stats)
         ircfg = self.ssa_to_unssa(ssa, head)
         ircfg_simplifier = IRCFGSimplifierCommon(self.lifter)
         ircfg_simplifier.deadremoval.add_expr_to_original_expr(self.all_ssa_vars)
@@ -500,6 +500,7 @@ class mn_aarch64(cls_mn):
     sp = {'l': SP, 'b': SP}
     instruction = instruction_aarch64
     max_instruction_len = 4
+    dis_word_len = 4
     alignment = 4
 
     @classmethod
@@ -521,25 +522,14 @@ class mn_aarch64(cls_mn):
     def getbits(cls, bs, attrib, start, n):
         if not n:
             return 0
-        o = 0
         if n > bs.getlen() * 8:
             raise ValueError('not enough bits %r %r' % (n, len(bs.bin) * 8))
-        while n:
-            offset = start // 8
-            n_offset = cls.endian_offset(attrib, offset)
-            c = cls.getbytes(bs, n_offset, 1)
-            if not c:
-                raise IOError
-            c = ord(c)
-            r = 8 - start % 8
-            c &= (1 << r) - 1
-            l = min(r, n)
-            c >>= (r - l)
-            o <<= l
-            o |= c
-            n -= l
-            start += l
-        return o
+        if attrib == "l":
+            return bs.getbits_swapped(start, n, 4)
+        elif attrib == "b":
+            return bs.getbits(start, n)
+        else:
+            raise NotImplementedError('bad attrib')
 
     @classmethod
     def endian_offset(cls, attrib, offset):
@@ -644,7 +634,7 @@ class aarch64_simdreg(reg_noarg, aarch64_arg):
     simd_size = [8, 16, 32, 64]
 
     def decode(self, v):
-        if self.parent.size.value > len(self.simd_size):
+        if self.parent.size.value >= len(self.simd_size):
             return False
         size = self.simd_size[self.parent.size.value]
         self.expr = simds_info[size].expr[v]
@@ -1281,7 +1271,8 @@ def DecodeBitMasks(M, immN, imms, immr, immediate):
     len_ = HighestSetBit((~imms).concat_left(immN))
     if len_ < 1:
         raise ReservedValue()
-    assert M >= (1 << len_)
+    if M < (1 << len_):
+        raise ReservedValue()
 
     levels = ZeroExtend(Ones(len_), 6)
 
@@ -1357,12 +1348,15 @@ class aarch64_imm_nsr(aarch64_imm_sf, aarch64_arg):
 
     def decode(self, v):
         size = 64 if self.parent.sf.value else 32
-        bitmask, _ = DecodeBitMasks(size,
-                                    bits(1, self.parent.immn.value),
-                                    bits(6, v),
-                                    bits(6, self.parent.immr.value),
-                                    True
-        )
+        try:
+            bitmask, _ = DecodeBitMasks(size,
+                                        bits(1, self.parent.immn.value),
+                                        bits(6, v),
+                                        bits(6, self.parent.immr.value),
+                                        True
+            )
+        except ReservedValue:
+            return False
         self.expr = m2_expr.ExprInt(UInt(bitmask),
                                     size)
         return True
@@ -668,6 +668,7 @@ class mn_arm(cls_mn):
     sp = {'l':SP, 'b':SP}
     instruction = instruction_arm
     max_instruction_len = 4
+    dis_word_len = 4
     alignment = 4
 
     @classmethod
@@ -693,25 +694,14 @@ class mn_arm(cls_mn):
     def getbits(cls, bs, attrib, start, n):
         if not n:
             return 0
-        o = 0
         if n > bs.getlen() * 8:
             raise ValueError('not enough bits %r %r' % (n, len(bs.bin) * 8))
-        while n:
-            offset = start // 8
-            n_offset = cls.endian_offset(attrib, offset)
-            c = cls.getbytes(bs, n_offset, 1)
-            if not c:
-                raise IOError
-            c = ord(c)
-            r = 8 - start % 8
-            c &= (1 << r) - 1
-            l = min(r, n)
-            c >>= (r - l)
-            o <<= l
-            o |= c
-            n -= l
-            start += l
-        return o
+        if attrib == "l":
+            return bs.getbits_swapped(start, n, 4)
+        elif attrib == "b":
+            return bs.getbits(start, n)
+        else:
+            raise NotImplementedError('bad attrib')
 
     @classmethod
     def endian_offset(cls, attrib, offset):
@@ -771,6 +761,7 @@ class mn_armt(cls_mn):
     sp = SP
     instruction = instruction_armt
     max_instruction_len = 4
+    dis_word_len = 2
     alignment = 4
 
     @classmethod
@@ -794,25 +785,14 @@ class mn_armt(cls_mn):
     def getbits(cls, bs, attrib, start, n):
         if not n:
             return 0
-        o = 0
         if n > bs.getlen() * 8:
             raise ValueError('not enough bits %r %r' % (n, len(bs.bin) * 8))
-        while n:
-            offset = start // 8
-            n_offset = cls.endian_offset(attrib, offset)
-            c = cls.getbytes(bs, n_offset, 1)
-            if not c:
-                raise IOError
-            c = ord(c)
-            r = 8 - start % 8
-            c &= (1 << r) - 1
-            l = min(r, n)
-            c >>= (r - l)
-            o <<= l
-            o |= c
-            n -= l
-            start += l
-        return o
+        if attrib == "l":
+            return bs.getbits_swapped(start, n, 2)
+        elif attrib == "b":
+            return bs.getbits(start, n)
+        else:
+            raise NotImplementedError('bad attrib')
 
     @classmethod
     def endian_offset(cls, attrib, offset):
@@ -1649,6 +1629,7 @@ class armt2_rot_rm(arm_arg):
         e = self.expr
         if isinstance(e, ExprId):
             self.value = 0
+            self.parent.rm.expr = e
         else:
             raise NotImplementedError('rotation')
         return True
@@ -3103,6 +3084,8 @@ class armt_cond_arg(arm_arg):
 
     def decode(self, v):
         v = (v << 1) | self.parent.condlsb.value
+        if v >= len(cond_list_full):
+            return False
         self.expr = ExprId(cond_list_full[v], 32)
         return True
 
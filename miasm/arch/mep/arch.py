@@ -458,27 +458,14 @@ class mn_mep(cls_mn):
         if not n:
             return 0
 
-        o = 0  # the returned value
-        while n:
-            # Get a byte, the offset is adjusted according to the endianness
-            offset = start // 8  # the offset in bytes
-            n_offset = cls.endian_offset(attrib, offset)  # the adjusted offset
-            c = cls.getbytes(bitstream, n_offset, 1)
-            if not c:
-                raise IOError
-
-            # Extract the bits value
-            c = ord(c)
-            r = 8 - start % 8
-            c &= (1 << r) - 1
-            l = min(r, n)
-            c >>= (r - l)
-            o <<= l
-            o |= c
-            n -= l
-            start += l
+        if attrib == "l":  # Little Endian 16 bits words
+            return bitstream.getbits_swapped(start, n, 2)
 
-        return o
+        elif attrib == "b":  # Big Endian
+            return bitstream.getbits(start, n)
+
+        else:
+            raise NotImplementedError("Bad MeP endianness")
 
     @classmethod
     def endian_offset(cls, attrib, offset):
@@ -197,6 +197,7 @@ class mn_mips32(cpu.cls_mn):
     sp = {'l':regs.SP, 'b':regs.SP}
     instruction = instruction_mips32
     max_instruction_len = 4
+    dis_word_len = 4
 
     @classmethod
     def getpc(cls, attrib = None):
@@ -214,23 +215,12 @@ class mn_mips32(cpu.cls_mn):
     def getbits(cls, bitstream, attrib, start, n):
         if not n:
             return 0
-        o = 0
-        while n:
-            offset = start // 8
-            n_offset = cls.endian_offset(attrib, offset)
-            c = cls.getbytes(bitstream, n_offset, 1)
-            if not c:
-                raise IOError
-            c = ord(c)
-            r = 8 - start % 8
-            c &= (1 << r) - 1
-            l = min(r, n)
-            c >>= (r - l)
-            o <<= l
-            o |= c
-            n -= l
-            start += l
-        return o
+        if attrib == "l":
+            return bitstream.getbits_swapped(start, n, 4)
+        elif attrib == "b":
+            return bitstream.getbits(start, n)
+        else:
+            raise NotImplementedError('bad attrib')
 
     @classmethod
     def endian_offset(cls, attrib, offset):
@@ -496,10 +486,22 @@ class mips32_cpr(mips32_arg):
             return False
         index = regs.regs_cpr0_expr.index(e)
         self.value = index & 7
-        index >>=2
+        index >>= 3
+        # cpr0 is encoded from its expression
+        self.parent.cpr0.expr = ExprInt(index, 32)
         self.parent.cpr0.value = index
         return True
 
+
+class mips32_clz_rt(cpu.bsi):
+    """rt field of CLZ: not an argument, it must hold the same register as
+    rd"""
+    def encode(self):
+        if not self.parent.rd.expr in gpregs.expr:
+            return False
+        self.value = gpregs.expr.index(self.parent.rd.expr)
+        return True
+
 rs = cpu.bs(l=5, cls=(mips32_gpreg,))
 rt = cpu.bs(l=5, cls=(mips32_gpreg,))
 rd = cpu.bs(l=5, cls=(mips32_gpreg,))
@@ -518,6 +520,9 @@ oper = cpu.bs(l=5, cls=(mips32_u16imm,))
 cpr0 = cpu.bs(l=5, cls=(mips32_imm,), fname="cpr0")
 cpr =  cpu.bs(l=3, cls=(mips32_cpr,))
 
+rt_clz = cpu.bs(l=5, cls=(mips32_clz_rt,))
+rd_clz = cpu.bs(l=5, cls=(mips32_gpreg,), fname="rd")
+
 stype = cpu.bs(l=5, cls=(mips32_u16imm,))
 hint_pref = cpu.bs(l=5, cls=(mips32_u16imm,))
 
@@ -809,8 +814,8 @@ mips32op("teq",     [cpu.bs('000000'), rs, rt, bs_code, cpu.bs('110100')],
 mips32op("tne",     [cpu.bs('000000'), rs, rt, bs_code, cpu.bs('110110')],         
          [rs, rt])
 
-mips32op("clz",     [cpu.bs('011100'), rs, rt, rd, cpu.bs('00000'), cpu.bs('100000')],
-        [rd, rs])
+mips32op("clz",     [cpu.bs('011100'), rs, rt_clz, rd_clz, cpu.bs('00000'), cpu.bs('100000')],
+        [rd_clz, rs])
 mips32op("clz",     [cpu.bs('000000'), rs, cpu.bs('00000'), rd, cpu.bs('00001010000')],
         [rd, rs])
 
@@ -241,6 +241,7 @@ class mn_msp430(cls_mn):
     all_mn_inst = defaultdict(list)
     instruction = instruction_msp430
     max_instruction_len = 8
+    dis_word_len = 2
 
     @classmethod
     def getpc(cls, attrib):
@@ -259,24 +260,10 @@ class mn_msp430(cls_mn):
     def getbits(cls, bs, attrib, start, n):
         if not n:
             return 0
-        o = 0
         if n > bs.getlen() * 8:
             raise ValueError('not enough bits %r %r' % (n, len(bs.bin) * 8))
-        while n:
-            i = start // 8
-            c = cls.getbytes(bs, i)
-            if not c:
-                raise IOError
-            c = ord(c)
-            r = 8 - start % 8
-            c &= (1 << r) - 1
-            l = min(r, n)
-            c >>= (r - l)
-            o <<= l
-            o |= c
-            n -= l
-            start += l
-        return o
+        # Instructions are made of little endian 16 bits words
+        return bs.getbits_swapped(start, n, 2)
 
     @classmethod
     def getbytes(cls, bs, offset, l=1):
@@ -366,7 +353,8 @@ class msp430_sreg_arg(reg_noarg, msp430_arg):
             if e == SR:
                 self.expr = ExprInt(8, size)
             elif e == R3:
-                if self.parent.size.value == 0:
+                # Instructions without size are word sized
+                if size == 16:
                     self.expr = ExprInt(0xffff, size)
                 else:
                     self.expr = ExprInt(0xff, size)
@@ -2,6 +2,7 @@
 
 from __future__ import print_function
 from builtins import range
+import copy
 import re
 
 from future.utils import viewitems
@@ -10,6 +11,7 @@ from miasm.core import utils
 from miasm.expression.expression import *
 from pyparsing import *
 from miasm.core.cpu import *
+from miasm.core.table_cache import cached_table
 from collections import defaultdict
 import miasm.arch.x86.regs as regs_module
 from miasm.arch.x86.regs import *
@@ -469,6 +471,13 @@ class instruction_x86(instruction):
     def __init__(self, *args, **kargs):
         super(instruction_x86, self).__init__(*args, **kargs)
 
+    def clone(self):
+        new = super(instruction_x86, self).clone()
+        # Prefixes groups are modified in place (see mn_x86.fromstring)
+        new.additional_info.g1 = copy.copy(self.additional_info.g1)
+        new.additional_info.g2 = copy.copy(self.additional_info.g2)
+        return new
+
     def v_opmode(self):
         return self.additional_info.v_opmode
 
@@ -550,7 +559,9 @@ class instruction_x86(instruction):
         self.additional_info.v_opmode = c.v_opmode()
         self.additional_info.v_admode = c.v_admode()
         self.additional_info.prefix = c.prefix
-        self.additional_info.prefixed = getattr(c, "prefixed", b"")
+        self.additional_info.prefixed = b""
+        if hasattr(c, "prefixed"):
+            self.additional_info.prefixed = c.prefixed.default
 
     def __str__(self):
         return self.to_string()
@@ -560,13 +571,13 @@ class instruction_x86(instruction):
         if self.additional_info.g1.value & 1:
             o = "LOCK %s" % o
         if self.additional_info.g1.value & 2:
-            if getattr(self.additional_info.prefixed, 'default', b"") != b"\xF2":
+            if self.additional_info.prefixed != b"\xF2":
                 o = "REPNE %s" % o
         if self.additional_info.g1.value & 8:
-            if getattr(self.additional_info.prefixed, 'default', b"") != b"\xF3":
+            if self.additional_info.prefixed != b"\xF3":
                 o = "REP %s" % o
         elif self.additional_info.g1.value & 4:
-            if getattr(self.additional_info.prefixed, 'default', b"") != b"\xF3":
+            if self.additional_info.prefixed != b"\xF3":
                 o = "REPE %s" % o
         return o
 
@@ -576,15 +587,15 @@ class instruction_x86(instruction):
             text =  utils.set_html_text_color("LOCK", utils.COLOR_MNEMO)
             o = "%s %s" % (text, o)
         if self.additional_info.g1.value & 2:
-            if getattr(self.additional_info.prefixed, 'default', b"") != b"\xF2":
+            if self.additional_info.prefixed != b"\xF2":
                 text =  utils.set_html_text_color("REPNE", utils.COLOR_MNEMO)
                 o = "%s %s" % (text, o)
         if self.additional_info.g1.value & 8:
-            if getattr(self.additional_info.prefixed, 'default', b"") != b"\xF3":
+            if self.additional_info.prefixed != b"\xF3":
                 text =  utils.set_html_text_color("REP", utils.COLOR_MNEMO)
                 o = "%s %s" % (text, o)
         elif self.additional_info.g1.value & 4:
-            if getattr(self.additional_info.prefixed, 'default', b"") != b"\xF3":
+            if self.additional_info.prefixed != b"\xF3":
                 text =  utils.set_html_text_color("REPE", utils.COLOR_MNEMO)
                 o = "%s %s" % (text, o)
         return o
@@ -683,6 +694,7 @@ class mn_x86(cls_mn):
     sp = {16: SP, 32: ESP, 64: RSP}
     instruction = instruction_x86
     max_instruction_len = 15
+    dispatch_bits = 12
 
     @classmethod
     def getpc(cls, attrib):
@@ -1736,9 +1748,16 @@ def gen_modrm_form():
                 modrm_f = tuple(sorted(viewitems(modrm_f), key=str))
                 modrm2byte[size][modrm_f].append((i, j))
 
+    # Plain dictionaries can be stored in the table cache
+    modrm2byte = dict(
+        (size, dict(forms)) for size, forms in viewitems(modrm2byte)
+    )
     return byte2modrm, modrm2byte
 
-byte2modrm, modrm2byte = gen_modrm_form()
+# Tables only depend on this file
+byte2modrm, modrm2byte = cached_table(
+    "x86_modrm_forms", gen_modrm_form, [__file__]
+)
 
 
 # ret is modr; ret is displacement
@@ -5767,6 +5767,14 @@ class Lifter_X86_16(Lifter):
     def mod_pc(self, instr, instr_ir, extra_ir):
         pass
 
+    def lift_cache_key(self, instr):
+        key = Lifter.lift_cache_key(self, instr)
+        if key is None:
+            return None
+        # Segmentation settings change the memory accesses
+        return key + (self.do_stk_segm, self.do_ds_segm, self.do_str_segm,
+                      self.do_all_segm, self.addrsize)
+
     def ExprMem(self, ptr, size):
         """Generate a memory access to @ptr
         The ptr is resized to a fixed size self.addrsize
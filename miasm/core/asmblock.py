@@ -2,12 +2,20 @@
 
 from builtins import map
 from builtins import range
+import array
+import bisect
 import logging
+import multiprocessing
+import os
+import pickle
+import traceback
 import warnings
+import weakref
 from collections import namedtuple
 from builtins import int as int_types
 
-from future.utils import viewitems, viewvalues
+from future.utils import viewitems, viewvalues, PY3
+from future.moves.queue import Queue
 
 from miasm.expression.expression import ExprId, ExprInt, get_expr_locs
 from miasm.expression.expression import LocKey
@@ -315,6 +323,14 @@ class AsmCFG(DiGraph):
         self._pendings = {}
         # Loc_Key2block built on the fly
         self._loc_key_to_block = {}
+        # Blocks offsets index: sorted start offsets, start offset -> list of
+        # LocKeys of blocks starting there, indexed LocKey -> start offset
+        self._block_starts = []
+        self._start_to_loc_keys = {}
+        self._loc_key_to_start = {}
+        # Size of the largest indexed block, bounding the search of the blocks
+        # containing an offset
+        self._max_block_size = 0
         # loc_db
         self.loc_db = loc_db
 
@@ -379,9 +395,105 @@ class AsmCFG(DiGraph):
         del self.edges2constraint[(src, dst)]
         super(AsmCFG, self).del_edge(src, dst)
 
+    def del_edges(self, edges):
+        """Delete the @edges and their associated constraints at once
+        @edges: iterable of (src, dst) edges of the instance"""
+        edges = set(edges)
+        for src, dst in edges:
+            src_blk = self.loc_key_to_block(src)
+            assert src_blk is not None
+            to_remove = [cons for cons in src_blk.bto if cons.loc_key == dst]
+            if to_remove:
+                assert len(to_remove) == 1
+                src_blk.bto.remove(to_remove[0])
+            del self.edges2constraint[(src, dst)]
+        super(AsmCFG, self).del_edges(edges)
+
     def del_block(self, block):
         super(AsmCFG, self).del_node(block.loc_key)
         del self._loc_key_to_block[block.loc_key]
+        self._unindex_block(block.loc_key)
+
+    def _index_block(self, block):
+        """Add or update @block in the blocks offsets index"""
+        self._unindex_block(block.loc_key)
+        if not block.lines or block.lines[0].offset is None:
+            return
+        start, stop = block.get_range()
+        loc_keys = self._start_to_loc_keys.get(start)
+        if loc_keys is None:
+            bisect.insort(self._block_starts, start)
+            loc_keys = self._start_to_loc_keys[start] = []
+        loc_keys.append(block.loc_key)
+        self._loc_key_to_start[block.loc_key] = start
+        self._max_block_size = max(self._max_block_size, stop - start)
+
+    def _unindex_block(self, loc_key):
+        """Remove the block @loc_key from the blocks offsets index"""
+        start = self._loc_key_to_start.pop(loc_key, None)
+        if start is None:
+            return
+        loc_keys = self._start_to_loc_keys[start]
+        loc_keys.remove(loc_key)
+        if not loc_keys:
+            del self._start_to_loc_keys[start]
+            del self._block_starts[bisect.bisect_left(self._block_starts, start)]
+
+    def _reindex_blocks(self):
+        """Build the blocks offsets index from scratch"""
+        self._start_to_loc_keys = {}
+        self._loc_key_to_start = {}
+        self._max_block_size = 0
+        for block in self.blocks:
+            if not block.lines or block.lines[0].offset is None:
+                continue
+            start, stop = block.get_range()
+            self._start_to_loc_keys.setdefault(start, []).append(block.loc_key)
+            self._loc_key_to_start[block.loc_key] = start
+            self._max_block_size = max(self._max_block_size, stop - start)
+        self._block_starts = sorted(self._start_to_loc_keys)
+
+    def blocks_containing(self, offset):
+        """Iterate on the blocks whose range contains @offset, nearest start
+        first (blocks may overlap)
+        @offset: integer
+        """
+        starts = self._block_starts
+        index = bisect.bisect_right(starts, offset) - 1
+        while index >= 0 and starts[index] > offset - self._max_block_size:
+            start = starts[index]
+            for loc_key in list(self._start_to_loc_keys.get(start, [])):
+                block = self._loc_key_to_block[loc_key]
+                if not block.lines or block.lines[0].offset != start:
+                    # Block modified without notifying this instance
+                    continue
+                if offset < block.get_range()[1]:
+                    yield block
+            index -= 1
+
+    def split_block(self, block, offset):
+        """Split @block at @offset (see AsmBlock.split) and add the created
+        block to the current instance. Edges are not updated: rebuild_edges
+        must be called once blocks are split.
+        Return the created block, or None if there is no instruction at
+        @offset in @block
+        @block: AsmBlock instance in the current instance
+        @offset: integer
+        """
+        if offset not in set(line.offset for line in block.lines):
+            return None
+        new_block = block.split(offset)
+        self._index_block(block)
+        # Destinations moved to the created block are no more waited by @block
+        for constraint in new_block.bto:
+            pendings = self._pendings.get(constraint.loc_key)
+            if pendings is None:
+                continue
+            self._pendings[constraint.loc_key] = set(
+                pending for pending in pendings if pending.waiter != block
+            )
+        self.add_block(new_block)
+        return new_block
 
 
     def add_node(self, node):
@@ -390,7 +502,8 @@ class AsmCFG(DiGraph):
 
     def add_block(self, block):
         """
-        Add the block @block to the current instance, if it is not already in
+        Add the block @block to the current instance, if it is not already in.
+        If @block is already in, its offsets index is updated.
         @block: AsmBlock instance
 
         Edges will be created for @block.bto, if destinations are already in
@@ -402,6 +515,9 @@ class AsmCFG(DiGraph):
         status = super(AsmCFG, self).add_node(block.loc_key)
 
         if not status:
+            if self._loc_key_to_block.get(block.loc_key) is block:
+                # Its lines may have been modified
+                self._index_block(block)
             return status
 
         # Update waiters
@@ -412,6 +528,7 @@ class AsmCFG(DiGraph):
 
         # Synchronize edges with block destinations
         self._loc_key_to_block[block.loc_key] = block
+        self._index_block(block)
 
         for constraint in block.bto:
             dst = self._loc_key_to_block.get(constraint.loc_key,
@@ -514,12 +631,15 @@ class AsmCFG(DiGraph):
         - add missing edge
         - remove no more used edge
 
-        This method should be called if a block's '.bto' in nodes have been
-        modified without notifying this instance to resynchronize edges.
+        This method should be called if a block's '.bto' or '.lines' in nodes
+        have been modified without notifying this instance to resynchronize
+        edges and blocks offsets.
         """
+        self._reindex_blocks()
         self._pendings = {}
+        useless_edges = set()
         for block in self.blocks:
-            edges = []
+            edges = set()
             # Rebuild edges from bto
             for constraint in block.bto:
                 dst = self._loc_key_to_block.get(constraint.loc_key,
@@ -537,19 +657,22 @@ class AsmCFG(DiGraph):
                     )
                     continue
                 edge = (block.loc_key, dst.loc_key)
-                edges.append(edge)
-                if edge in self._edges:
+                edges.add(edge)
+                if edge in self.edges2constraint:
                     # Already known edge, constraint may have changed
                     self.edges2constraint[edge] = constraint.c_t
                 else:
                     # An edge is missing
                     self.add_edge(edge[0], edge[1], constraint.c_t)
 
-            # Remove useless edges
-            for succ in self.successors(block.loc_key):
+            # Useless edges
+            for succ in self.successors_iter(block.loc_key):
                 edge = (block.loc_key, succ)
                 if edge not in edges:
-                    self.del_edge(*edge)
+                    useless_edges.add(edge)
+
+        # Remove useless edges at once
+        self.del_edges(useless_edges)
 
     def get_bad_blocks(self):
         """Iterator on AsmBlockBad elements"""
@@ -578,10 +701,8 @@ class AsmCFG(DiGraph):
 
     def getby_offset(self, offset):
         """Return asmblock containing @offset"""
-        for block in self.blocks:
-            if block.lines[0].offset <= offset < \
-                    (block.lines[-1].offset + block.lines[-1].l):
-                return block
+        for block in self.blocks_containing(offset):
+            return block
         return None
 
     def loc_key_to_block(self, loc_key):
@@ -632,10 +753,11 @@ class AsmCFG(DiGraph):
                                    "(%s)" % (loc_key,
                                              pred_next))
 
-    def guess_blocks_size(self, mnemo):
+    def guess_blocks_size(self, mnemo, cache=None):
         """Asm and compute max block size
         Add a 'size' and 'max_size' attribute on each block
-        @mnemo: metamn instance"""
+        @mnemo: metamn instance
+        @cache: (optional) encodings cache, see cls_mn.asm"""
         for block in self.blocks:
             size = 0
             for instr in block.lines:
@@ -660,7 +782,7 @@ class AsmCFG(DiGraph):
                     # If the instruction uses symbol it will fail
                     # In this case, the max_instruction_len is used
                     try:
-                        candidates = mnemo.asm(instr)
+                        candidates = mnemo.asm(instr, cache=cache)
                         l = len(candidates[-1])
                     except:
                         l = mnemo.max_instruction_len
@@ -732,6 +854,8 @@ def _merge_blocks(dg, graph):
             graph.add_edge(lbl_block, nextb, graph.edges2constraint[(lbl_succ, nextb)])
 
         graph.del_block(succ)
+        # Update the offsets index of the merged block
+        graph.add_block(block)
         to_ignore.add(lbl_succ)
 
 
@@ -739,12 +863,13 @@ bbl_simplifier = DiGraphSimplifier()
 bbl_simplifier.enable_passes([_merge_blocks])
 
 
-def conservative_asm(mnemo, instr, symbols, conservative):
+def conservative_asm(mnemo, instr, symbols, conservative, cache=None):
     """
     Asm instruction;
     Try to keep original instruction bytes if it exists
+    @cache: (optional) encodings cache, see cls_mn.asm
     """
-    candidates = mnemo.asm(instr, symbols)
+    candidates = mnemo.asm(instr, symbols, cache=cache)
     if not candidates:
         raise ValueError('cannot asm:%s' % str(instr))
     if not hasattr(instr, "b"):
@@ -1023,9 +1148,10 @@ def get_block_loc_keys(block):
     return symbols
 
 
-def assemble_block(mnemo, block, conservative=False):
+def assemble_block(mnemo, block, conservative=False, cache=None):
     """Assemble a @block
     @conservative: (optional) use original bytes when possible
+    @cache: (optional) encodings cache, see cls_mn.asm
     """
     offset_i = 0
 
@@ -1056,7 +1182,7 @@ def assemble_block(mnemo, block, conservative=False):
         old_l = instr.l
         cached_candidate, _ = conservative_asm(
             mnemo, instr, block.loc_db,
-            conservative
+            conservative, cache
         )
         if len(cached_candidate) != instr.l:
             # The output instruction length is different from the one we guessed
@@ -1068,7 +1194,7 @@ def assemble_block(mnemo, block, conservative=False):
                 instr.fixDstOffset()
             cached_candidate, _ = conservative_asm(
                 mnemo, instr, block.loc_db,
-                conservative
+                conservative, cache
             )
             assert len(cached_candidate) == instr.l
 
@@ -1083,12 +1209,21 @@ def assemble_block(mnemo, block, conservative=False):
         offset_i += instr.l
 
 
-def asmblock_final(mnemo, asmcfg, blockChains, conservative=False):
+def asmblock_final(mnemo, asmcfg, blockChains, conservative=False, cache=None):
     """Resolve and assemble @blockChains until fixed point is
-    reached"""
+    reached
+    @cache: (optional) encodings cache, see cls_mn.asm
+
+    Only the blocks which moved, or referencing a moved loc_key, are assembled
+    again on each iteration. The encodings are cached across iterations: an
+    instruction is encoded again only if its resolved arguments changed.
+    """
 
     log_asmblock.debug("asmbloc_final")
 
+    if cache is None and mnemo.asm_cache is None:
+        cache = {}
+
     # Init structures
     blocks_using_loc_key = {}
     for block in asmcfg.blocks:
@@ -1131,7 +1266,7 @@ def asmblock_final(mnemo, asmcfg, blockChains, conservative=False):
 
         while blocks_to_rework:
             block = blocks_to_rework.pop()
-            assemble_block(mnemo, block, conservative)
+            assemble_block(mnemo, block, conservative, cache)
 
 
 def asm_resolve_final(mnemo, asmcfg, dst_interval=None):
@@ -1140,10 +1275,12 @@ def asm_resolve_final(mnemo, asmcfg, dst_interval=None):
 
     asmcfg.sanity_check()
 
-    asmcfg.guess_blocks_size(mnemo)
+    # Encodings cache shared by the size guessing and the assembly
+    cache = {} if mnemo.asm_cache is None else None
+    asmcfg.guess_blocks_size(mnemo, cache)
     blockChains = group_constrained_blocks(asmcfg)
     resolved_blockChains = resolve_symbol(blockChains, asmcfg.loc_db, dst_interval)
-    asmblock_final(mnemo, asmcfg, resolved_blockChains)
+    asmblock_final(mnemo, asmcfg, resolved_blockChains, cache=cache)
     patches = {}
     output_interval = interval()
 
@@ -1164,6 +1301,268 @@ def asm_resolve_final(mnemo, asmcfg, dst_interval=None):
     return patches
 
 
+# Event of dis_multiblock_iter: @block has been disassembled. If @split_from
+# is not None, @block holds instructions already yielded in the block starting
+# at the offset @split_from, which ends at the start of @block from now on
+StreamedBlock = namedtuple("StreamedBlock", ["block", "split_from"])
+
+
+class _TailJobDone(object):
+    """View of a set of disassembled offsets, used to disassemble again the
+    instructions from @start to @stop of a block: offsets in this range are
+    not considered as disassembled, and the disassembly stops at @stop"""
+
+    def __init__(self, job_done, start, stop):
+        self.job_done = job_done
+        self.start = start
+        self.stop = stop
+
+    def __contains__(self, offset):
+        if offset == self.stop:
+            return True
+        if self.start <= offset < self.stop:
+            return False
+        return offset in self.job_done
+
+    def add(self, offset):
+        self.job_done.add(offset)
+
+
+class _BlockRanges(object):
+    """Ranges of the blocks disassembled by dis_multiblock_iter, with the
+    offsets of their instructions
+
+    It is also used as the set of disassembled offsets of the engine, so that
+    forgetting a range forgets the offsets of its instructions.
+    """
+
+    def __init__(self, loc_db, job_done=None, forget_dropped=False):
+        """
+        @loc_db: LocationDB instance of the blocks
+        @job_done: (optional) set of offsets disassembled by the caller
+        @forget_dropped: forget the range of a block once it is dropped
+        """
+        self.loc_db = loc_db
+        self.job_done = job_done
+        self.forget_dropped = forget_dropped
+        # Start offsets of every block, even forgotten ones, so that a
+        # destination is never disassembled twice
+        self.block_starts = set()
+        # Sorted start offsets of the ranges
+        self.starts = []
+        # start offset -> (stop offset, instructions offsets)
+        self.ranges = {}
+        # start offset -> weak reference to the block
+        self.blocks = {}
+        # Size of the largest block, bounding the search of a block holding
+        # an offset
+        self.max_size = 0
+
+    def add(self, offset):
+        """Instructions offsets are recorded with their block: see
+        add_block"""
+        pass
+
+    def add_block(self, block):
+        """Add or update the range of @block. Blocks without lines only
+        mark their start offset as disassembled"""
+        start = self.loc_db.get_location_offset(block.loc_key)
+        if block.lines:
+            stop = block.get_range()[1]
+            offsets = frozenset(line.offset for line in block.lines)
+        else:
+            stop = start
+            offsets = frozenset([start])
+        self.block_starts.add(start)
+        if start not in self.ranges:
+            bisect.insort(self.starts, start)
+        self.ranges[start] = stop, offsets
+        self.max_size = max(self.max_size, stop - start)
+        if self.forget_dropped:
+            self.blocks[start] = weakref.ref(
+                block, lambda _, start=start: self._dropped(start)
+            )
+
+    def _dropped(self, start):
+        """Forget the range starting at @start, whose block has been
+        dropped"""
+        block_ref = self.blocks.get(start)
+        if block_ref is None or block_ref() is not None:
+            # Range taken over by another block
+            return
+        del self.blocks[start]
+        del self.ranges[start]
+        del self.starts[bisect.bisect_left(self.starts, start)]
+
+    def truncate(self, start, stop):
+        """Set the stop offset of the range starting at @start to @stop"""
+        _, offsets = self.ranges[start]
+        self.ranges[start] = stop, frozenset(
+            offset for offset in offsets if offset < stop
+        )
+
+    def containing(self, offset):
+        """Iterate on the (start, stop) of the ranges holding an instruction
+        at @offset, nearest start first. Ranges may overlap."""
+        index = bisect.bisect_right(self.starts, offset) - 1
+        while index >= 0:
+            start = self.starts[index]
+            if start < offset - self.max_size:
+                break
+            stop, offsets = self.ranges[start]
+            if offset in offsets:
+                yield start, stop
+            index -= 1
+
+    def __contains__(self, offset):
+        if offset in self.block_starts:
+            return True
+        if self.job_done is not None and offset in self.job_done:
+            return True
+        for _ in self.containing(offset):
+            return True
+        return False
+
+
+# Disassembly engine of a prefetch worker process
+_worker_engine = None
+
+
+def _prefetch_worker_init(engine):
+    """Initialize a prefetch worker process with a copy of @engine"""
+    global _worker_engine
+    _worker_engine = engine
+    # User callbacks are only run by the parent process, on the final blocks
+    engine.dis_block_callback = None
+    # Decoding errors are reported by the parent process
+    log_asmblock.setLevel(logging.ERROR)
+
+
+def _prefetch_worker_explore(offsets):
+    """Explore blocks from @offsets using the worker engine, recording the
+    decoded instructions
+    Return the tuple (error, result)"""
+    try:
+        region = offsets[0] // _worker_engine.region_size
+        result = (region, _worker_engine._explore(offsets))
+        # Pickled here, so that pickling errors are reported
+        return False, pickle.dumps(result, pickle.HIGHEST_PROTOCOL)
+    except Exception:
+        return True, traceback.format_exc()
+
+
+# Typecode of the offsets arrays
+try:
+    OFFSET_TYPECODE = 'Q'
+    array.array(OFFSET_TYPECODE)
+except ValueError:
+    # Python 2
+    OFFSET_TYPECODE = 'L'
+
+
+class LinearDisasm(object):
+
+    """Result of a linear sweep disassembly (see disasmEngine.dis_linear).
+
+    Instructions are stored in columns:
+     - offsets: array of the instructions offsets
+     - lengths: array of the instructions lengths
+     - mnemonics: array of the instructions mnemonics ids, index in `names`,
+       or INVALID for bytes which cannot be disassembled
+    Instructions objects (and their operands) are only built on demand, by
+    decoding the instruction again.
+    """
+
+    INVALID = -1
+
+    def __init__(self, mdis):
+        """
+        @mdis: disasmEngine instance used for the sweep
+        """
+        self.mdis = mdis
+        self.offsets = array.array(OFFSET_TYPECODE)
+        self.lengths = array.array('I')
+        self.mnemonics = array.array('h')
+        self.names = []
+        self._name_to_id = {}
+
+    def __len__(self):
+        return len(self.offsets)
+
+    def __getitem__(self, index):
+        """Return the tuple (offset, length, mnemonic name or None) of the
+        instruction @index"""
+        mnemonic = self.mnemonics[index]
+        if mnemonic == self.INVALID:
+            name = None
+        else:
+            name = self.names[mnemonic]
+        return self.offsets[index], self.lengths[index], name
+
+    def __iter__(self):
+        for index in range(len(self)):
+            yield self[index]
+
+    def add_instr(self, offset, length, name):
+        """Append an instruction
+        @offset: instruction offset
+        @length: instruction length
+        @name: instruction mnemonic
+        """
+        mnemonic = self._name_to_id.get(name)
+        if mnemonic is None:
+            mnemonic = len(self.names)
+            self._name_to_id[name] = mnemonic
+            self.names.append(name)
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.mnemonics.append(mnemonic)
+
+    def add_invalid(self, offset, length):
+        """Mark @length bytes at @offset as invalid. Contiguous invalid bytes
+        are merged"""
+        if self.mnemonics and self.mnemonics[-1] == self.INVALID and \
+                self.offsets[-1] + self.lengths[-1] == offset:
+            self.lengths[-1] += length
+            return
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.mnemonics.append(self.INVALID)
+
+    def mnemonic_id(self, name):
+        """Return the id of the mnemonic @name, or None if it has not been
+        met"""
+        return self._name_to_id.get(name)
+
+    def instr(self, index):
+        """Return the instruction instance of the instruction @index (None for
+        invalid bytes), decoded again"""
+        if self.mnemonics[index] == self.INVALID:
+            return None
+        mdis = self.mdis
+        return mdis.arch.dis(
+            mdis.bin_stream, mdis.attrib, self.offsets[index],
+            cache=mdis.dis_cache
+        )
+
+    def invalid_ranges(self):
+        """Iterate on the (offset, length) of the invalid bytes ranges"""
+        invalid = self.INVALID
+        for index, mnemonic in enumerate(self.mnemonics):
+            if mnemonic == invalid:
+                yield self.offsets[index], self.lengths[index]
+
+    def to_numpy(self):
+        """Return the columns as NumPy arrays (offsets, lengths, mnemonics),
+        sharing their memory with the arrays of this instance"""
+        import numpy
+        return (
+            numpy.frombuffer(self.offsets, dtype=numpy.uint64),
+            numpy.frombuffer(self.lengths, dtype=numpy.uint32),
+            numpy.frombuffer(self.mnemonics, dtype=numpy.int16),
+        )
+
+
 class disasmEngine(object):
 
     """Disassembly engine, taking care of disassembler options and mutli-block
@@ -1186,6 +1585,15 @@ class disasmEngine(object):
     + Number
      - lines_wd: maximum block's size (in number of instruction)
      - blocs_wd: maximum number of distinct disassembled block
+     - processes: if set, number of worker processes prefetching the
+                  instructions decoded by dis_multiblock
+     - blocks_per_job: maximum number of blocks explored by a prefetch job
+     - region_size: size of the address space regions in which prefetch
+                    jobs follow the code
+
+    + LRUCache instance
+     - dis_cache: decoded instructions cache (default to the architecture
+                  one, see cls_mn.enable_dis_cache)
 
     + callback(mdis, cur_block, offsets_to_dis)
      - dis_block_callback: callback after each new disassembled block
@@ -1213,10 +1621,42 @@ class disasmEngine(object):
         self.dis_block_callback = None
         self.dont_dis_nulstart_bloc = False
         self.dont_dis_retcall_funcs = set()
+        self.processes = None
+        self.blocks_per_job = 64
+        self.region_size = 0x10000
+        self.dis_cache = None
 
         # Override options if needed
         self.__dict__.update(kwargs)
 
+        # Prefetched instructions: offset -> pickled instruction or decoding
+        # exception
+        self._prefetched = None
+        # Decoded instructions are recorded in it if not None
+        self._recorded = None
+
+    def _dis_instr(self, offset):
+        """Decode and return the instruction at @offset, using the prefetched
+        instructions if available"""
+        if self._prefetched is not None:
+            decoded = self._prefetched.get(offset)
+            if decoded is not None:
+                if isinstance(decoded, Exception):
+                    raise decoded
+                return pickle.loads(decoded)
+        try:
+            instr = self.arch.dis(
+                self.bin_stream, self.attrib, offset, cache=self.dis_cache
+            )
+        except (Disasm_Exception, IOError) as error:
+            if self._recorded is not None:
+                self._recorded[offset] = error
+            raise
+        if self._recorded is not None:
+            # Record the instruction before its modification by dstflow2label
+            self._recorded[offset] = pickle.dumps(instr, pickle.HIGHEST_PROTOCOL)
+        return instr
+
     def _dis_block(self, offset, job_done=None):
         """Disassemble the block at offset @offset
         @job_done: a set of already disassembled addresses
@@ -1268,7 +1708,7 @@ class disasmEngine(object):
             off_i = offset
             error = None
             try:
-                instr = self.arch.dis(self.bin_stream, self.attrib, offset)
+                instr = self._dis_instr(offset)
             except Disasm_Exception as e:
                 log_asmblock.warning(e)
                 instr = None
@@ -1369,12 +1809,31 @@ class disasmEngine(object):
         @offset: starting offset
         @blocks: (optional) AsmCFG instance of already disassembled blocks to
                 merge with
+
+        If the `processes` option is set, the instructions are prefetched: the
+        reachable code is first explored by worker processes, which decode
+        instructions in parallel. Only these instructions are kept; the blocks
+        are then built by this process, as in a single process disassembly,
+        without decoding the prefetched instructions again. The result is the
+        same as without prefetching.
         """
         log_asmblock.info("dis block all")
         if job_done is None:
             job_done = set()
         if blocks is None:
             blocks = AsmCFG(self.loc_db)
+        if self.processes:
+            self._prefetched = self._prefetch_instructions(offset, job_done)
+        try:
+            self._dis_multiblock(offset, blocks, job_done)
+        finally:
+            self._prefetched = None
+
+        self.apply_splitting(blocks)
+        return blocks
+
+    def _dis_multiblock(self, offset, blocks, job_done):
+        """Disassemble every block reachable from @offset in @blocks"""
         todo = [offset]
 
         bloc_cpt = 0
@@ -1392,8 +1851,190 @@ class disasmEngine(object):
             todo += nexts
             blocks.add_block(cur_block)
 
-        self.apply_splitting(blocks)
-        return blocks
+    def dis_multiblock_iter(self, offset, job_done=None,
+                            forget_dropped=False):
+        """Generator disassembling every block reachable from @offset, as
+        dis_multiblock, and yielding a StreamedBlock event for each block as
+        soon as it is disassembled. Consumers can process and drop blocks
+        while the next ones are discovered. Yielded blocks are never modified.
+
+        A destination may later be found inside an already yielded block. Its
+        instructions from the destination are then disassembled again in a
+        new block, yielded in an event whose `split_from` is the start offset
+        of the already yielded block. A consumer keeping the blocks gets the
+        result of dis_multiblock by splitting its blocks on these events (see
+        AsmCFG.split_block) instead of adding the new blocks.
+
+        The engine keeps the range and the instructions offsets of each
+        block, but not the blocks. If @forget_dropped is set, the ranges of
+        the blocks dropped by the consumer are forgotten, and only their start
+        offsets are kept: the engine memory then scales with the blocks kept
+        by the consumer and the pending destinations, plus one offset per
+        block. A destination later found inside a dropped block is
+        disassembled again in a new block overlapping it, instead of splitting
+        it.
+
+        @offset: starting offset
+        @job_done: (optional) set of offsets considered as already
+        disassembled. It is not modified, so that the caller can bound it.
+        @forget_dropped: (optional) forget the ranges of the dropped blocks
+        """
+        ranges = _BlockRanges(self.loc_db, job_done, forget_dropped)
+        todo = [offset]
+
+        bloc_cpt = 0
+        while todo:
+            bloc_cpt += 1
+            if self.blocs_wd is not None and bloc_cpt > self.blocs_wd:
+                log_asmblock.debug("blocks watchdog reached at %X", int(offset))
+                break
+
+            target_offset = int(todo.pop(0))
+            if target_offset in ranges:
+                event = self._split_block_at(target_offset, ranges)
+            else:
+                cur_block, nexts = self._dis_block(target_offset, ranges)
+                todo += nexts
+                ranges.add_block(cur_block)
+                event = StreamedBlock(cur_block, None)
+                cur_block = None
+            if event is not None:
+                yield event
+                # Let the block be dropped by the consumer
+                event = None
+
+    def _split_block_at(self, offset, ranges):
+        """Disassemble again the instructions from @offset of the block
+        holding the already disassembled instruction at @offset, if @offset
+        is not a block start (see dis_multiblock_iter)
+        Return a StreamedBlock event, or None"""
+        if offset in ranges.block_starts:
+            return None
+        for start, stop in ranges.containing(offset):
+            log_asmblock.debug("Disassemble again block tail %x", offset)
+            new_block, _ = self._dis_block(
+                offset, _TailJobDone(ranges, offset, stop)
+            )
+            ranges.truncate(start, offset)
+            ranges.add_block(new_block)
+            return StreamedBlock(new_block, start)
+        if ranges.job_done is None or offset not in ranges.job_done:
+            log_asmblock.error("Cannot split %x!!", offset)
+        return None
+
+    def _explore(self, offsets):
+        """Disassemble blocks from @offsets and their successors, and record
+        the decoded instructions (prefetch worker side). Only successors in the region of @offsets
+        are followed, up to blocks_per_job blocks.
+        Return the tuple (recorded instructions, explored blocks offsets,
+        offsets left to explore)
+        @offsets: list of offsets of the same region
+        """
+        region = offsets[0] // self.region_size
+        self._recorded = {}
+        todo = list(offsets)
+        left = []
+        job_done = set()
+        explored = []
+        try:
+            while todo and len(explored) < self.blocks_per_job:
+                offset = todo.pop(0)
+                if offset is None or offset in job_done:
+                    continue
+                if offset // self.region_size != region:
+                    left.append(offset)
+                    continue
+                explored.append(offset)
+                _, nexts = self._dis_block(offset, job_done)
+                todo += nexts
+            left += [
+                offset for offset in todo
+                if offset is not None and offset not in job_done
+            ]
+            return self._recorded, explored, left
+        finally:
+            self._recorded = None
+
+    def _prefetch_instructions(self, offset, job_done):
+        """Prefetch the instructions of the code reachable from @offset,
+        decoded by worker processes exploring it.
+        Return the prefetched instructions, as used by _dis_instr
+
+        Offsets are sharded by region: a region is explored by one job at a
+        time, so that workers do not decode the same code.
+
+        Workers inherit the engine and its bin_stream by forking: without
+        fork, nothing is prefetched (return None).
+        @job_done: offsets to skip
+        """
+        if not hasattr(os, "fork"):
+            log_asmblock.warning(
+                "Worker processes need fork, instructions are not prefetched"
+            )
+            return None
+        try:
+            context = multiprocessing.get_context("fork")
+        except AttributeError:
+            # Python 2: always forks
+            context = multiprocessing
+        decoded = {}
+        explored = set(job_done)
+        # region -> offsets to explore
+        waiting = {}
+        busy = set()
+        results = Queue()
+        if PY3:
+            error_callback = {
+                "error_callback":
+                lambda error: results.put((True, repr(error)))
+            }
+        else:
+            # Python 2 pools report errors through results only
+            error_callback = {}
+        todo = [offset]
+        pool = context.Pool(
+            self.processes,
+            initializer=_prefetch_worker_init,
+            initargs=(self,)
+        )
+        try:
+            while True:
+                for target_offset in todo:
+                    region = target_offset // self.region_size
+                    waiting.setdefault(region, set()).add(target_offset)
+                for region in list(waiting):
+                    if region in busy:
+                        continue
+                    offsets = sorted(
+                        target_offset for target_offset in waiting.pop(region)
+                        if not (target_offset in explored or
+                                target_offset in decoded)
+                    )
+                    if not offsets:
+                        continue
+                    busy.add(region)
+                    pool.apply_async(
+                        _prefetch_worker_explore,
+                        (offsets,),
+                        callback=results.put,
+                        # Pool failures (unpicklable result, ...)
+                        **error_callback
+                    )
+                if not busy:
+                    break
+                error, result = results.get()
+                if error:
+                    raise RuntimeError(
+                        "Prefetch worker failed:\n%s" % result
+                    )
+                region, (recorded, block_offsets, todo) = pickle.loads(result)
+                busy.remove(region)
+                decoded.update(recorded)
+                explored.update(block_offsets)
+        finally:
+            pool.terminate()
+            pool.join()
+        return decoded
 
     def apply_splitting(self, blocks):
         """Consider @blocks' bto destinations and split block in @blocks if one
@@ -1404,39 +2045,26 @@ class disasmEngine(object):
         """
         # Get all possible destinations not yet resolved, with a resolved
         # offset
-        block_dst = []
+        block_dst = set()
         for loc_key in blocks.pendings:
             offset = self.loc_db.get_location_offset(loc_key)
             if offset is not None:
-                block_dst.append(offset)
+                block_dst.add(offset)
 
-        todo = set(blocks.blocks)
         rebuild_needed = False
 
-        while todo:
-            # Find a block with a destination inside another one
-            cur_block = todo.pop()
-            range_start, range_stop = cur_block.get_range()
-
-            for off in block_dst:
-                if not (off > range_start and off < range_stop):
-                    continue
-
-                # `cur_block` must be split at offset `off`from miasm.core.locationdb import LocationDB
-
-                new_b = cur_block.split(off)
-                log_asmblock.debug("Split block %x", off)
+        # Blocks are found through the AsmCFG offsets index; blocks created by
+        # a split are indexed too, and may be split again by next offsets
+        for off in sorted(block_dst):
+            for cur_block in list(blocks.blocks_containing(off)):
+                if cur_block.lines[0].offset == off:
+                    # Destination already at a block start
+                    break
+                new_b = blocks.split_block(cur_block, off)
                 if new_b is None:
-                    log_asmblock.error("Cannot split %x!!", off)
+                    # Overlapping block, without instruction at `off`
                     continue
-
-                # Remove pending from cur_block
-                # Links from new_b will be generated in rebuild_edges
-                for dst in new_b.bto:
-                    if dst.loc_key not in blocks.pendings:
-                        continue
-                    blocks.pendings[dst.loc_key] = set(pending for pending in blocks.pendings[dst.loc_key]
-                                                     if pending.waiter != cur_block)
+                log_asmblock.debug("Split block %x", off)
 
                 # The new block destinations may need to be disassembled
                 if self.dis_block_callback:
@@ -1446,18 +2074,53 @@ class disasmEngine(object):
                     )
                     self.dis_block_callback(self, new_b, offsets_to_dis)
 
-                # Update structure
                 rebuild_needed = True
-                blocks.add_block(new_b)
-
-                # The new block must be considered
-                todo.add(new_b)
-                range_start, range_stop = cur_block.get_range()
+                break
+            else:
+                if any(True for _ in blocks.blocks_containing(off)):
+                    log_asmblock.error("Cannot split %x!!", off)
 
         # Rebuild edges to match new blocks'bto
         if rebuild_needed:
             blocks.rebuild_edges()
 
+    def dis_linear(self, start, stop=None, resync_step=None):
+        """Linear sweep disassembly of the bin_stream from @start to @stop:
+        instructions are decoded one after the other, regardless of the
+        control flow. Bytes which cannot be disassembled are skipped by
+        @resync_step bytes, and the disassembly resumes after them.
+
+        Return a LinearDisasm instance.
+
+        @start: first offset to disassemble
+        @stop: (optional) offset where the disassembly stops (an instruction
+        starting before it may end after it), default to the bin_stream end
+        @resync_step: (optional) number of bytes skipped on decoding failure,
+        default to the architecture alignment
+        """
+        if stop is None:
+            stop = self.bin_stream.getlen()
+        if resync_step is None:
+            resync_step = self.arch.alignment
+        result = LinearDisasm(self)
+        dis = self.arch.dis
+        bin_stream = self.bin_stream
+        attrib = self.attrib
+        cache = self.dis_cache
+        offset = start
+        while offset < stop:
+            try:
+                instr = dis(bin_stream, attrib, offset, cache=cache)
+            except (Disasm_Exception, IOError) as error:
+                step = min(resync_step, stop - offset)
+                log_asmblock.debug("cannot disasm at %X: %r", offset, error)
+                result.add_invalid(offset, step)
+                offset += step
+                continue
+            result.add_instr(offset, instr.l, instr.name)
+            offset += instr.l
+        return result
+
     def dis_instr(self, offset):
         """Disassemble one instruction at offset @offset and return the
         corresponding instruction instance
@@ -16,6 +16,10 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 
+from binascii import hexlify
+import mmap
+import threading
+
 from builtins import str
 from future.utils import PY3
 
@@ -23,14 +27,40 @@ from miasm.core.utils import BIG_ENDIAN, LITTLE_ENDIAN
 from miasm.core.utils import upck8le, upck16le, upck32le, upck64le
 from miasm.core.utils import upck8be, upck16be, upck32be, upck64be
 
+# Protects the lazy initialization of bin_stream atomic states
+_atomic_state_lock = threading.Lock()
+
+
+if PY3:
+    def bytes_to_int(data):
+        """Return the big endian integer encoded by the bytes-like @data"""
+        try:
+            return int.from_bytes(data, "big")
+        except TypeError:
+            # Stream built on a str of bytes values
+            return int.from_bytes(data.encode("latin-1"), "big")
+else:
+    def bytes_to_int(data):
+        """Return the big endian integer encoded by the bytes-like @data"""
+        return int(hexlify(data) or b"0", 16)
+
+
+class AtomicState(threading.local):
+    """Atomic mode state of a bin_stream, local to each thread"""
+    # Bytes read since entering atomic mode, as a single window of contiguous
+    # bytes starting at window_start. window is None outside of atomic mode
+    window = None
+    window_start = 0
+
 
 class bin_stream(object):
 
-    # Cache must be initialized by entering atomic mode
-    _cache = None
+    # Per thread atomic mode state, initialized on first use
+    _atomic_state = None
     CACHE_SIZE = 10000
-    # By default, no atomic mode
-    _atomic_mode = False
+    # In atomic mode, number of bytes read at once when reading outside of the
+    # bytes already read (0 to read only the requested bytes)
+    atomic_window = 32
 
     def __init__(self, *args, **kargs):
         self.endianness = LITTLE_ENDIAN
@@ -46,17 +76,42 @@ class bin_stream(object):
     def hexdump(self, offset, l):
         return
 
+    def _get_atomic_state(self):
+        """Return the atomic mode state of the current thread"""
+        state = self._atomic_state
+        if state is None:
+            with _atomic_state_lock:
+                state = self.__dict__.get('_atomic_state')
+                if state is None:
+                    state = AtomicState()
+                    self._atomic_state = state
+        return state
+
+    @property
+    def _atomic_mode(self):
+        return self._get_atomic_state().window is not None
+
+    @_atomic_mode.setter
+    def _atomic_mode(self, value):
+        # Force the atomic mode of the current thread
+        state = self._get_atomic_state()
+        state.window = b"" if value else None
+        state.window_start = 0
+
     def enter_atomic_mode(self):
-        """Enter atomic mode. In this mode, read may be cached"""
-        assert not self._atomic_mode
-        self._atomic_mode = True
-        self._cache = {}
+        """Enter atomic mode. In this mode, read may be cached.
+        Atomic mode is local to the calling thread, so several threads may
+        read the same stream at once"""
+        state = self._get_atomic_state()
+        assert state.window is None
+        state.window = b""
+        state.window_start = 0
 
     def leave_atomic_mode(self):
         """Leave atomic mode"""
-        assert self._atomic_mode
-        self._atomic_mode = False
-        self._cache = None
+        state = self._get_atomic_state()
+        assert state.window is not None
+        state.window = None
 
     def _getbytes(self, start, length):
         return self.bin[start:start + length]
@@ -68,14 +123,57 @@ class bin_stream(object):
 
         Wrapper on _getbytes, with atomic mode handling.
         """
-        if self._atomic_mode:
-            val = self._cache.get((start,l), None)
-            if val is None:
-                val = self._getbytes(start, l)
-                self._cache[(start,l)] = val
+        state = self._atomic_state
+        if state is None or state.window is None:
+            return self._getbytes(start, l)
+        # Atomic mode: serve the bytes from the window of already read bytes
+        window = state.window
+        pos = start - state.window_start
+        if 0 <= pos and pos + l <= len(window):
+            return window[pos:pos + l]
+        return self._getbytes_window(state, start, l)
+
+    def _getbytes_window(self, state, start, l):
+        """Return the @l bytes at @start, which are not (all) in the atomic
+        mode window of @state, and update the window with them.
+
+        Decoders read the bytes of an instruction next to each other: the
+        window is extended with the missing bytes if the read touches it,
+        otherwise it is replaced by the next atomic_window bytes (or only the
+        requested ones, if they cannot be read)."""
+        window, window_start = state.window, state.window_start
+        stop = start + l
+        window_stop = window_start + len(window)
+        if window and start <= window_stop and stop >= window_start:
+            if start < window_start:
+                head = self._getbytes(start, window_start - start)
+                if len(head) != window_start - start:
+                    return self._getbytes(start, l)
+                window = head + window
+                window_start = start
+            if stop > window_stop:
+                tail = self._getbytes(window_stop, stop - window_stop)
+                if len(tail) != stop - window_stop:
+                    return self._getbytes(start, l)
+                window = window + tail
         else:
-            val = self._getbytes(start, l)
-        return val
+            window = None
+            if self.atomic_window > l:
+                try:
+                    window = self._getbytes(start, self.atomic_window)
+                except IOError:
+                    pass
+                else:
+                    if len(window) != self.atomic_window:
+                        window = None
+            if window is None:
+                window = self._getbytes(start, l)
+                if len(window) != l:
+                    return window
+            window_start = start
+        state.window, state.window_start = window, window_start
+        pos = start - window_start
+        return window[pos:pos + l]
 
     def getbits(self, start, n):
         """Return the bits from the bit stream
@@ -92,29 +190,40 @@ class bin_stream(object):
         byte_start = start // 8
         byte_stop = (start + n + 7) // 8
         temp = self.getbytes(byte_start, byte_stop - byte_start)
-        if not temp:
+        if len(temp) != byte_stop - byte_start:
             raise IOError('cannot get bytes')
 
-        # Init
-        start = start % 8
-        out = 0
-        while n:
-            # Get needed bits, working on maximum 8 bits at a time
-            cur_byte_idx = start // 8
-            new_bits = ord(temp[cur_byte_idx:cur_byte_idx + 1])
-            to_keep = 8 - start % 8
-            new_bits &= (1 << to_keep) - 1
-            cur_len = min(to_keep, n)
-            new_bits >>= (to_keep - cur_len)
-
-            # Update output
-            out <<= cur_len
-            out |= new_bits
-
-            # Update counters
-            n -= cur_len
-            start += cur_len
-        return out
+        # Drop the bits after the requested ones, then the ones before
+        out = bytes_to_int(temp) >> (byte_stop * 8 - start - n)
+        return out & ((1 << n) - 1)
+
+    def getbits_swapped(self, start, n, word_len):
+        """Return the bits from the bit stream, the stream being made of
+        words of @word_len bytes stored in little endian: bits are numbered
+        from the most significant bit of the first word
+        @start: the offset in bits
+        @n: number of bits to read
+        @word_len: words length in bytes
+        """
+        if n == 0:
+            return 0
+        byte_start = start // 8
+        byte_stop = (start + n + 7) // 8
+        # Read the words covering the bits
+        word_start = byte_start - byte_start % word_len
+        word_stop = byte_stop + (-byte_stop) % word_len
+        temp = self.getbytes(word_start, word_stop - word_start)
+        if len(temp) != word_stop - word_start:
+            raise IOError('cannot get bytes')
+        if len(temp) == word_len:
+            out = bytes_to_int(temp[::-1])
+        else:
+            out = 0
+            for index in range(0, len(temp), word_len):
+                out <<= 8 * word_len
+                out |= bytes_to_int(temp[index:index + word_len][::-1])
+        out >>= word_stop * 8 - start - n
+        return out & ((1 << n) - 1)
 
     def get_u8(self, addr, endianness=None):
         """
@@ -236,6 +345,107 @@ class bin_stream_file(bin_stream):
         return self.l - (self.offset - self.base_address)
 
 
+class bin_stream_mmap(bin_stream):
+    """bin_stream on a file mapped read-only in memory.
+
+    The file is not read at once: the system loads the pages when they are
+    accessed, and getbits works on memoryview slices of the mapping, without
+    copy. As the content cannot change, reads are never cached.
+    """
+
+    def __init__(self, binary, offset=0, base_address=0):
+        """
+        @binary: path or (binary mode) file object of the file to map
+        @offset: (optional) current offset
+        @base_address: (optional) address of the first byte of the file
+        """
+        bin_stream.__init__(self)
+        if isinstance(binary, (bytes, str)):
+            with open(binary, "rb") as fdesc:
+                self._mmap = self._map(fdesc)
+        else:
+            self._mmap = self._map(binary)
+        self.bin = self._mmap
+        if PY3:
+            self._view = memoryview(self._mmap)
+        else:
+            # No memoryview on mmap objects, slices are copied
+            self._view = self._mmap
+        self.base_address = base_address
+        self.l = len(self._mmap)
+        self.offset = offset
+
+    @staticmethod
+    def _map(fdesc):
+        """Map the file @fdesc read-only"""
+        try:
+            return mmap.mmap(fdesc.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # Empty files cannot be mapped
+            return b""
+
+    def close(self):
+        """Unmap the file. The stream must not be used anymore"""
+        if isinstance(self._mmap, mmap.mmap):
+            if PY3:
+                self._view.release()
+            self._mmap.close()
+
+    def _check_range(self, start, l):
+        if start + l - self.base_address > self.l:
+            raise IOError("not enough bytes in file")
+        if start - self.base_address < 0:
+            raise IOError("Negative offset")
+
+    def _getbytes(self, start, l=1):
+        self._check_range(start, l)
+        start -= self.base_address
+        return self._mmap[start:start + l]
+
+    def getbytes(self, start, l=1):
+        """Return the bytes from the bit stream
+        @start: starting offset (in byte)
+        @l: (optional) number of bytes to read
+        """
+        return self._getbytes(start, l)
+
+    def getview(self, start, l=1):
+        """Return a view on the bytes of the file, without copy
+        @start: starting offset (in byte)
+        @l: (optional) number of bytes
+        """
+        self._check_range(start, l)
+        start -= self.base_address
+        return self._view[start:start + l]
+
+    def getbits(self, start, n):
+        """Return the bits from the bit stream
+        @start: the offset in bits
+        @n: number of bits to read
+        """
+        if n == 0:
+            return 0
+        byte_start = start // 8
+        byte_stop = (start + n + 7) // 8
+        temp = self.getview(byte_start, byte_stop - byte_start)
+        out = bytes_to_int(temp) >> (byte_stop * 8 - start - n)
+        return out & ((1 << n) - 1)
+
+    def readbs(self, l=1):
+        data = self._getbytes(self.offset, l)
+        self.offset += l
+        return data
+
+    def __bytes__(self):
+        return self._mmap[self.offset - self.base_address:]
+
+    def setoffset(self, val):
+        self.offset = val
+
+    def getlen(self):
+        return self.l - (self.offset - self.base_address)
+
+
 class bin_stream_container(bin_stream):
 
     def __init__(self, binary, offset=0):
@@ -285,6 +495,10 @@ class bin_stream_elf(bin_stream_container):
 
 class bin_stream_vm(bin_stream):
 
+    # Reading unmapped memory raises an access violation in the VmMngr: only
+    # read the requested bytes
+    atomic_window = 0
+
     def __init__(self, vm, offset=0, base_offset=0):
         self.offset = offset
         self.base_offset = base_offset
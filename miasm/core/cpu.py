@@ -1,9 +1,12 @@
 #-*- coding:utf-8 -*-
 
 from builtins import range
+import copy
 import re
 import struct
+import sys
 import logging
+import threading
 from collections import defaultdict
 
 
@@ -14,7 +17,8 @@ import pyparsing
 from miasm.core.utils import decode_hex
 import miasm.expression.expression as m2_expr
 from miasm.core.bin_stream import bin_stream, bin_stream_str
-from miasm.core.utils import Disasm_Exception
+from miasm.core.utils import Disasm_Exception, LRUCache
+from miasm.core.table_cache import cached_table
 from miasm.expression.simplifications import expr_simp
 
 
@@ -898,8 +902,14 @@ def add_candidate_to_tree(tree, c):
     branch['mn'].add(c)
 
 
+# Protect the lazy creation of the decoding templates
+templates_lock = threading.Lock()
+
+
 def add_candidate(bases, c):
     add_candidate_to_tree(bases[0].bintree, c)
+    # The dispatch table is rebuilt on next use
+    bases[0].dispatch_table = None
 
 
 def getfieldby_name(fields, fname):
@@ -959,21 +969,29 @@ class metamn(type):
             mode = dct['mode']
             bases[0].all_mn_mode[mode].append(c)
             bases[0].all_mn_name[c.name].append(c)
-            i = c()
-            i.init_class()
-            bases[0].all_mn_inst[c].append(i)
+            # Decoding templates (all_mn_inst) are built on first use, see
+            # cls_mn.get_template
             add_candidate(bases, c)
-            # gen byte lookup
-            o = ""
-            for f in i.fields_order:
-                if not isinstance(f, bsi):
-                    raise ValueError('f is not bsi')
-                if f.l == 0:
-                    continue
-                o += f.strbits
         return c
 
 
+def additional_info_key(info):
+    """Return a hashable summary of the instruction additional information
+    @info, to be used in caches keys. Raise TypeError if it cannot be hashed
+    @info: instruction additional information (or None)
+    """
+    if info is None:
+        return None
+    items = []
+    for name, value in sorted(viewitems(vars(info))):
+        if hasattr(value, "__dict__"):
+            value = tuple(sorted(viewitems(vars(value))))
+        items.append((name, value))
+    key = tuple(items)
+    hash(key)
+    return key
+
+
 class instruction(object):
     __slots__ = ["name", "mode", "args",
                  "l", "b", "offset", "data",
@@ -1071,24 +1089,219 @@ class instruction(object):
     def get_info(self, c):
         return
 
+    def clone(self):
+        """Return a copy of the instruction, which can be modified without
+        altering the original one (arguments and additional information are
+        copied)"""
+        new = copy.copy(self)
+        new.args = list(self.args)
+        new.additional_info = copy.copy(self.additional_info)
+        return new
+
 
 class cls_mn(with_metaclass(metamn, object)):
     args_symb = []
     instruction = instruction
     # Block's offset alignment
     alignment = 1
+    # Bytes are fetched by words of this size (endianness swapping): decoding
+    # an instruction reads the whole words it overlaps
+    dis_word_len = 1
+    # Number of leading bits indexing the decoding dispatch table (0 to walk
+    # the whole bintree on each decoding)
+    dispatch_bits = 8
+    # Built on first use, see get_dispatch_table
+    dispatch_table = None
+    # Decoded instructions cache (LRUCache), shared by the users of the
+    # architecture. See enable_dis_cache
+    dis_cache = None
+    # Instructions encodings cache (LRUCache). See enable_asm_cache
+    asm_cache = None
 
     @classmethod
-    def guess_mnemo(cls, bs, attrib, pre_dis_info, offset):
-        candidates = []
+    def dispatch_fingerprint(cls):
+        """Return the tuple (fnames, fingerprint) describing the bintree of
+        the architecture:
+         - fnames: list of the fields names of the candidates. Unnamed fields
+           get an arbitrary name which changes between processes, so fields
+           names are identified by their index in this list in the picklable
+           form of the dispatch table
+         - fingerprint: the candidates fields, from which the bintree is built
+        """
+        fnames = []
+        fname_index = {}
+        fingerprint = []
+        for c in cls.all_mn:
+            fields = []
+            for f in c.fields:
+                index = fname_index.get(f.fname)
+                if index is None:
+                    index = len(fnames)
+                    fname_index[f.fname] = index
+                    fnames.append(f.fname)
+                fields.append((f.l, f.fmask, f.fbits, index))
+            fingerprint.append((c.__name__, fields))
+        return fnames, fingerprint
+
+    @classmethod
+    def build_dispatch_table(cls, fnames):
+        """Return the decoding dispatch table of the architecture, in a
+        form which can be saved in the table cache (see get_dispatch_table).
+
+        The table is indexed by the value of the dispatch_bits leading bits of
+        an instruction (as returned by getbits). It is returned as the tuple
+        (paths, entries):
+         - paths: list of bintree branches, as their keys from the root. The
+           flen function of a key is replaced by True if it is set
+         - entries: list of (candidates, pending) tuples, candidates being the
+           indexes in all_mn of the candidates fully identified by the leading
+           bits, and pending the bintree branches left to walk, as
+           (fields values, index in paths, bit position) tuples. Fields values
+           are tuples of (fname, value) decoded in the leading bits.
+        Fields names are replaced by their index in @fnames.
+        Fields of variable length (flen) stop the walk: they depend on the
+        mode and on the pre_dis information.
+
+        @fnames: fields names, as returned by dispatch_fingerprint
+        """
+        bits = cls.dispatch_bits
+        candidate_index = dict((c, i) for i, c in enumerate(cls.all_mn))
+        fname_index = dict((fname, i) for i, fname in enumerate(fnames))
+        paths = []
+        path_index = {}
+
+        def add_pending(pending, fname_values, path, pos):
+            index = path_index.get(path)
+            if index is None:
+                index = len(paths)
+                path_index[path] = index
+                paths.append(path)
+            pending.append((fname_values, index, pos))
+
+        entries = []
+        for value in range(1 << bits):
+            candidates = set()
+            pending = []
+            todo = [((), branch, 0, ()) for branch in viewitems(cls.bintree)]
+            for fname_values, branch, pos, path in todo:
+                (l, fmask, fbits, fname, flen), vals = branch
+                if fname is not None:
+                    fname = fname_index[fname]
+                path += ((l, fmask, fbits, fname, flen is not None),)
+                if flen is not None:
+                    add_pending(pending, fname_values, path, pos)
+                    continue
+                if pos + l > bits:
+                    # Field partially in the leading bits: check the known
+                    # ones and finish at decoding time
+                    shift = pos + l - bits
+                    v = value & ((1 << (bits - pos)) - 1)
+                    if v & (fmask >> shift) == fbits >> shift:
+                        add_pending(pending, fname_values, path, pos)
+                    continue
+                v = (value >> (bits - pos - l)) & ((1 << l) - 1)
+                if v & fmask != fbits:
+                    continue
+                if fname is not None:
+                    fname_values += ((fname, v),)
+                for nb, v in viewitems(vals):
+                    if 'mn' in nb:
+                        candidates.update(candidate_index[c] for c in v)
+                    else:
+                        todo.append((fname_values, (nb, v), pos + l, path))
+            entries.append((tuple(sorted(candidates)), tuple(pending)))
+        return paths, entries
 
+    @classmethod
+    def get_dispatch_table(cls):
+        """Return the decoding dispatch table of the architecture, indexed by
+        the value of the dispatch_bits leading bits of an instruction. Each
+        entry is a tuple:
+         - candidates fully identified by those bits
+         - bintree branches left to walk, as (fields values, branch, bit
+           position) tuples
+
+        The table is built on first use, or loaded from the on-disk table
+        cache (see miasm.core.table_cache).
+        """
+        table = cls.dispatch_table
+        if table is not None:
+            return table
+        fnames, fingerprint = cls.dispatch_fingerprint()
+        paths, entries = cached_table(
+            "dispatch_%s_%s_%d" % (
+                cls.__module__, cls.__name__, cls.dispatch_bits
+            ),
+            lambda: cls.build_dispatch_table(fnames),
+            [__file__, sys.modules[cls.__module__].__file__],
+            fingerprint
+        )
+        # Keys of the bintree nodes, without their flen function
+        node_keys = {}
+        branches = []
+        for path in paths:
+            node = cls.bintree
+            for l, fmask, fbits, fname, has_flen in path:
+                if fname is not None:
+                    fname = fnames[fname]
+                keys = node_keys.get(id(node))
+                if keys is None:
+                    keys = node_keys[id(node)] = dict(
+                        (key[:4] + (key[4] is not None,), key)
+                        for key in node if key != "mn"
+                    )
+                key = keys[(l, fmask, fbits, fname, has_flen)]
+                branch = key, node[key]
+                node = branch[1]
+            branches.append(branch)
+        all_mn = cls.all_mn
+        table = [
+            (
+                frozenset(all_mn[index] for index in candidates),
+                [
+                    (
+                        tuple((fnames[fname], v) for fname, v in fname_values),
+                        branches[index],
+                        pos
+                    )
+                    for fname_values, index, pos in pending
+                ]
+            )
+            for candidates, pending in entries
+        ]
+        cls.dispatch_table = table
+        return table
+
+    @classmethod
+    def guess_mnemo(cls, bs, attrib, pre_dis_info, offset):
         candidates = set()
 
         fname_values = pre_dis_info
-        todo = [
-            (dict(fname_values), branch, offset * 8)
-            for branch in list(viewitems(cls.bintree))
-        ]
+        todo = None
+        if cls.dispatch_bits:
+            table = cls.dispatch_table
+            if table is None:
+                table = cls.get_dispatch_table()
+            try:
+                value = cls.getbits(bs, attrib, offset * 8, cls.dispatch_bits)
+            except (IOError, ValueError):
+                # Not enough bytes for the table: walk the whole tree
+                value = None
+            if value is not None:
+                candidates_found, pending = table[value]
+                candidates.update(candidates_found)
+                todo = []
+                for values, branch, pos in pending:
+                    branch_values = dict(fname_values)
+                    for fname, v in values:
+                        if fname not in branch_values:
+                            branch_values[fname] = v
+                    todo.append((branch_values, branch, offset * 8 + pos))
+        if todo is None:
+            todo = [
+                (dict(fname_values), branch, offset * 8)
+                for branch in list(viewitems(cls.bintree))
+            ]
         for fname_values, branch, offset_b in todo:
             (l, fmask, fbits, fname, flen), vals = branch
 
@@ -1146,9 +1359,57 @@ class cls_mn(with_metaclass(metamn, object)):
         to_decode.sort(key=lambda x: (x[1].order, x[0]))
         to_decode = [fields_order.index(f[1]) for f in to_decode]
         self.args = args
+        # Used by copy_template
+        self.args_index = [fields_order.index(arg) for arg in args]
+        self.fnames_index = [
+            (f.fname, index) for index, f in enumerate(fields_order) if f.fname
+        ]
         self.fields_order = fields_order
         self.to_decode = to_decode
 
+    @classmethod
+    def get_template(cls, candidate):
+        """Return the decoding / encoding template of @candidate (stored in
+        all_mn_inst), built on first use
+        @candidate: class of the instruction
+        """
+        templates = cls.all_mn_inst.get(candidate)
+        if templates:
+            return templates[0]
+        with templates_lock:
+            templates = cls.all_mn_inst[candidate]
+            if not templates:
+                template = candidate()
+                template.init_class()
+                for f in template.fields_order:
+                    if not isinstance(f, bsi):
+                        raise ValueError('f is not bsi')
+                templates.append(template)
+        return templates[0]
+
+    def copy_template(self):
+        """Return a copy of @self, with its own fields, holding the state of
+        one decoding / encoding.
+
+        Instances stored in all_mn_inst are templates: they are never modified,
+        so several threads can disassemble at once.
+        """
+        new = object.__new__(self.__class__)
+        state = self.__dict__.copy()
+        fields_order = []
+        for f in self.fields_order:
+            new_f = object.__new__(f.__class__)
+            f_state = f.__dict__.copy()
+            f_state['parent'] = new
+            new_f.__dict__ = f_state
+            fields_order.append(new_f)
+        for fname, index in self.fnames_index:
+            state[fname] = fields_order[index]
+        state['fields_order'] = fields_order
+        state['args'] = [fields_order[index] for index in self.args_index]
+        new.__dict__ = state
+        return new
+
     def add_pre_dis_info(self, prefix=None):
         return True
 
@@ -1176,22 +1437,98 @@ class cls_mn(with_metaclass(metamn, object)):
         return fields
 
     @classmethod
-    def dis(cls, bs_o, mode_o = None, offset=0):
+    def enable_dis_cache(cls, max_size=10000):
+        """Cache the instructions decoded by cls.dis
+        Return the LRUCache instance, whose stats() method gives the cache
+        hit rate
+        @max_size: maximum number of instructions kept in the cache
+        """
+        cls.dis_cache = LRUCache(max_size)
+        return cls.dis_cache
+
+    @classmethod
+    def disable_dis_cache(cls):
+        """Stop caching the instructions decoded by cls.dis"""
+        cls.dis_cache = None
+
+    @classmethod
+    def dis_cache_key(cls, bs, mode, offset):
+        """Return the key identifying the decoding of the instruction at
+        @offset in the decoded instructions cache, or None if it cannot be
+        cached.
+
+        Decoding does not depend on the instruction offset (relative
+        destinations are resolved later, see dstflow2label), so the key is made
+        of the architecture, the mode, and every bytes the decoding may read:
+        max_instruction_len bytes, extended to the words they overlap (see
+        dis_word_len).
+
+        @bs: bin_stream instance
+        @mode: architecture mode
+        @offset: instruction offset
+        """
+        max_len = getattr(cls, "max_instruction_len", None)
+        if max_len is None:
+            return None
+        shift = offset % cls.dis_word_len
+        if shift:
+            max_len += cls.dis_word_len
+        start = offset - shift
+        try:
+            window = bs.getbytes(start, max_len)
+        except IOError:
+            # End of the stream: decoding depends on its length
+            return None
+        if len(window) != max_len:
+            return None
+        return cls, mode, shift, window
+
+    @classmethod
+    def dis(cls, bs_o, mode_o = None, offset=0, cache=None):
+        """Disassemble the instruction at @offset of @bs_o
+        Return an instruction instance
+
+        @bs_o: bin_stream instance or bytes
+        @mode_o: architecture mode
+        @offset: offset of the instruction in @bs_o
+        @cache: (optional) LRUCache instance of decoded instructions, default
+        to cls.dis_cache
+        """
         if not isinstance(bs_o, bin_stream):
             bs_o = bin_stream_str(bs_o)
+        if cache is None:
+            cache = cls.dis_cache
 
         bs_o.enter_atomic_mode()
-
-        offset_o = offset
         try:
-            pre_dis_info, bs, mode, offset, prefix_len = cls.pre_dis(
-                bs_o, mode_o, offset)
-        except:
+            if cache is None:
+                return cls._dis(bs_o, mode_o, offset)
+            key = cls.dis_cache_key(bs_o, mode_o, offset)
+            if key is None:
+                return cls._dis(bs_o, mode_o, offset)
+            instr = cache.get(key)
+            if instr is not None:
+                instr = instr.clone()
+                instr.offset = offset
+                return instr
+            instr = cls._dis(bs_o, mode_o, offset)
+            if instr.l <= len(key[-1]) - key[-2]:
+                # Keep a private copy, as the caller may modify the instruction
+                cache[key] = instr.clone()
+            return instr
+        finally:
             bs_o.leave_atomic_mode()
-            raise
+
+    @classmethod
+    def _dis(cls, bs_o, mode_o, offset):
+        """Disassemble the instruction at @offset of the bin_stream @bs_o,
+        without using the decoded instructions cache. @bs_o must be in atomic
+        mode"""
+        offset_o = offset
+        pre_dis_info, bs, mode, offset, prefix_len = cls.pre_dis(
+            bs_o, mode_o, offset)
         candidates = cls.guess_mnemo(bs, mode, pre_dis_info, offset)
         if not candidates:
-            bs_o.leave_atomic_mode()
             raise Disasm_Exception('cannot disasm (guess) at %X' % offset)
 
         out = []
@@ -1206,7 +1543,8 @@ class cls_mn(with_metaclass(metamn, object)):
             log.debug("*" * 40, mode, c.mode)
             log.debug(c.fields)
 
-            c = cls.all_mn_inst[c][0]
+            # Work on a copy: the template must stay untouched
+            c = cls.get_template(c).copy_template()
 
             c.reset_class()
             c.mode = mode
@@ -1234,11 +1572,7 @@ class cls_mn(with_metaclass(metamn, object)):
                     if bs_l * 8 - offset_b < l:
                         getok = False
                         break
-                    try:
-                        bv = cls.getbits(bs, mode, offset_b, l)
-                    except:
-                        bs_o.leave_atomic_mode()
-                        raise
+                    bv = cls.getbits(bs, mode, offset_b, l)
                     offset_b += l
                     if not f.fname in fname_values:
                         fname_values[f.fname] = bv
@@ -1281,8 +1615,6 @@ class cls_mn(with_metaclass(metamn, object)):
             out.append(instr)
             out_c.append(c)
 
-        bs_o.leave_atomic_mode()
-
         if not out:
             raise Disasm_Exception('cannot disasm at %X' % offset_o)
         if len(out) != 1:
@@ -1381,7 +1713,7 @@ class cls_mn(with_metaclass(metamn, object)):
 
     @classmethod
     def get_cls_instance(cls, cc, mode, infos=None):
-        c = cls.all_mn_inst[cc][0]
+        c = cls.get_template(cc).copy_template()
 
         c.reset_class()
         c.add_pre_dis_info()
@@ -1391,16 +1723,73 @@ class cls_mn(with_metaclass(metamn, object)):
         yield c
 
     @classmethod
-    def asm(cls, instr, loc_db=None):
+    def enable_asm_cache(cls, max_size=10000):
+        """Cache the encodings computed by cls.asm
+        Return the LRUCache instance, whose stats() method gives the cache
+        hit rate
+        @max_size: maximum number of instructions encodings kept in the cache
+        """
+        cls.asm_cache = LRUCache(max_size)
+        return cls.asm_cache
+
+    @classmethod
+    def disable_asm_cache(cls):
+        """Stop caching the encodings computed by cls.asm"""
+        cls.asm_cache = None
+
+    @classmethod
+    def asm_cache_key(cls, instr, args):
+        """Return the key identifying the encodings of @instr in the encodings
+        cache, or None if they cannot be cached.
+
+        Encodings only depend on the instruction name, mode, additional
+        information and arguments, once resolved (relative destinations are
+        already fixed by fixDstOffset).
+
+        @instr: instruction instance
+        @args: @instr arguments, resolved with the symbols offsets
+        """
+        try:
+            info = additional_info_key(instr.additional_info)
+            key = (cls, instr.name, instr.mode, tuple(instr.args), tuple(args),
+                   info)
+            hash(key)
+        except TypeError:
+            # Unhashable additional information
+            return None
+        return key
+
+    @classmethod
+    def asm(cls, instr, loc_db=None, cache=None):
         """
         Re asm instruction by searching mnemo using name and args. We then
         can modify args and get the hex of a modified instruction
+
+        @cache: (optional) LRUCache (or dict) of the encodings, default to
+        cls.asm_cache
         """
+        args = instr.resolve_args_with_symbols(loc_db)
+        if cache is None:
+            cache = cls.asm_cache
+        if cache is None:
+            return cls._asm(instr, args)
+        key = cls.asm_cache_key(instr, args)
+        if key is None:
+            return cls._asm(instr, args)
+        vals = cache.get(key)
+        if vals is None:
+            vals = tuple(cls._asm(instr, args))
+            cache[key] = vals
+        return list(vals)
+
+    @classmethod
+    def _asm(cls, instr, args):
+        """Return the encodings of @instr, whose arguments resolved with the
+        symbols offsets are @args, without using the encodings cache"""
         clist = cls.all_mn_name[instr.name]
         clist = [x for x in clist]
         vals = []
         candidates = []
-        args = instr.resolve_args_with_symbols(loc_db)
 
         for cc in clist:
 
@@ -109,6 +109,24 @@ class DiGraph(object):
         self._nodes_succ[src].remove(dst)
         self._nodes_pred[dst].remove(src)
 
+    def del_edges(self, edges):
+        """Delete the @edges of the graph at once, instead of one list removal
+        per edge. As del_edge, only one occurrence of each edge is deleted
+        @edges: iterable of distinct (src, dst) edges of the graph"""
+        edges = set(edges)
+        if not edges:
+            return
+        for src, dst in edges:
+            self._nodes_succ[src].remove(dst)
+            self._nodes_pred[dst].remove(src)
+        kept = []
+        for edge in self._edges:
+            if edge in edges:
+                edges.remove(edge)
+                continue
+            kept.append(edge)
+        self._edges = kept
+
     def discard_edge(self, src, dst):
         """Remove edge between @src and @dst if it exits"""
         if (src, dst) in self._edges:
@@ -0,0 +1,165 @@
+"""
+On-disk cache of precomputed architecture tables
+
+Some architecture tables (decoding dispatch tables, x86 ModR/M forms, ...) are
+costly to build and are needed by every process using the architecture. If
+the cache is enabled, they are saved on first build in the cache directory,
+and loaded by later processes.
+
+The cache is disabled by default, as importing an architecture should not
+write to the user home directory. It is enabled if MIASM_TABLE_CACHE is set
+in the environment, or by setting the module variable `enabled` to True.
+
+Tables are stored with marshal, so that loading a table cannot run code
+(unlike pickle). They may only hold None, booleans, integers, strings, bytes,
+tuples, lists, sets and dictionaries.
+
+A cached table is identified by its name and by a fingerprint of what it is
+built from: the source files it depends on, the Python version, and any
+additional data given by the caller. A change in one of them makes a new
+table to be built.
+
+The cache directory is MIASM_CACHE_DIR if set in the environment, or the
+per-user directory <XDG_CACHE_HOME or ~/.cache>/miasm. It is created
+private to the user (mode 0700), and cached files are only loaded from
+directories owned by the current user and not writable by other users, as
+marshal is not robust against malformed data.
+"""
+
+import hashlib
+import logging
+import marshal
+import os
+import sys
+import tempfile
+
+log = logging.getLogger("table_cache")
+console_handler = logging.StreamHandler()
+console_handler.setFormatter(logging.Formatter("[%(levelname)-8s]: %(message)s"))
+log.addHandler(console_handler)
+log.setLevel(logging.WARN)
+
+# Bump to invalidate every cached table
+FORMAT_VERSION = 2
+
+enabled = bool(os.environ.get("MIASM_TABLE_CACHE"))
+cache_dir = os.environ.get("MIASM_CACHE_DIR")
+if not cache_dir:
+    cache_dir = os.path.join(
+        os.environ.get("XDG_CACHE_HOME") or
+        os.path.join(os.path.expanduser("~"), ".cache"),
+        "miasm"
+    )
+
+# Source file path -> digest of its content
+_sources_digests = {}
+
+
+def source_digest(path):
+    """Return the digest of the content of the file @path"""
+    digest = _sources_digests.get(path)
+    if digest is None:
+        source = path
+        if source.endswith((".pyc", ".pyo")):
+            source = source[:-1]
+        with open(source, "rb") as fdesc:
+            digest = hashlib.sha256(fdesc.read()).hexdigest()
+        _sources_digests[path] = digest
+    return digest
+
+
+def table_path(name, sources, extra=None):
+    """Return the path of the cache file of the table @name
+    @name: table name
+    @sources: paths of the source files the table is built from
+    @extra: (optional) additional data identifying the table, whose repr is
+    hashed
+    """
+    fingerprint = hashlib.sha256()
+    fingerprint.update(
+        repr((FORMAT_VERSION, sys.version_info[:2], name, extra)).encode()
+    )
+    for path in sources:
+        fingerprint.update(source_digest(path).encode())
+    return os.path.join(
+        cache_dir,
+        "%s-%s.marshal" % (name, fingerprint.hexdigest()[:32])
+    )
+
+
+def is_safe_directory(directory):
+    """Return True if the files of @directory can only have been written by
+    the current user: @directory is owned by the current user, and is not
+    writable by its group or by other users"""
+    try:
+        stat = os.stat(directory)
+    except OSError:
+        return False
+    if not hasattr(os, "getuid"):
+        # Windows: no POSIX ownership
+        return True
+    return stat.st_uid == os.getuid() and not stat.st_mode & 0o022
+
+
+def make_directory(directory):
+    """Create @directory (and its parents), private to the current user"""
+    if not os.path.isdir(directory):
+        os.makedirs(directory, 0o700)
+
+
+def atomic_write(path, data):
+    """Write the bytes @data to @path. The file is written at once, so that
+    concurrent processes do not read a partial file"""
+    directory = os.path.dirname(path)
+    make_directory(directory)
+    if not is_safe_directory(directory):
+        raise IOError("Unsafe cache directory %s" % directory)
+    fdesc, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp")
+    try:
+        with os.fdopen(fdesc, "wb") as tmp_file:
+            tmp_file.write(data)
+        os.rename(tmp_path, path)
+    except Exception:
+        os.remove(tmp_path)
+        raise
+
+
+def save_table(path, table):
+    """Save @table to @path"""
+    atomic_write(path, marshal.dumps(table))
+
+
+def cached_table(name, builder, sources, extra=None):
+    """Return the table @name, loaded from the cache if available, else built
+    by @builder (and then saved in the cache)
+
+    @name: table name
+    @builder: function returning the table, made of the types supported by
+    marshal
+    @sources: paths of the source files the table is built from
+    @extra: (optional) additional data identifying the table, whose repr is
+    hashed
+    """
+    if not enabled:
+        return builder()
+    try:
+        path = table_path(name, sources, extra)
+    except (IOError, OSError):
+        # Sources not available (frozen application, ...)
+        return builder()
+    if is_safe_directory(os.path.dirname(path)):
+        try:
+            with open(path, "rb") as fdesc:
+                return marshal.loads(fdesc.read())
+        except (IOError, OSError):
+            pass
+        except Exception as error:
+            log.warning("Cannot load cached table %s: %r", path, error)
+    elif os.path.exists(path):
+        log.warning("Cached table %s ignored: unsafe directory", path)
+    table = builder()
+    try:
+        save_table(path, table)
+    except Exception as error:
+        log.debug("Cannot save table %s: %r", path, error)
+    return table
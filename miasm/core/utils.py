@@ -285,3 +285,107 @@ class BoundedDict(DictMixin):
     def __iter__(self):
         return iter(self._data)
 
+
+# Marker of missing values
+_MISSING = object()
+
+
+class LRUCache(DictMixin):
+
+    """Limited in size dictionary, discarding the least recently used elements.
+
+    Cache hits, misses and evictions are counted, so that the cache can be
+    shared between several users and tuned. The cache can be used from several
+    threads (counters are then approximate).
+    """
+
+    def __init__(self, max_size):
+        """Create a LRUCache
+        @max_size: maximum number of elements kept in the cache
+        """
+        assert max_size > 0
+        self._data = collections.OrderedDict()
+        self._max_size = max_size
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    max_size = property(lambda self: self._max_size)
+
+    def __getitem__(self, key):
+        try:
+            value = self._data.pop(key)
+        except KeyError:
+            self.misses += 1
+            raise
+        # Mark as most recently used
+        self._data[key] = value
+        self.hits += 1
+        return value
+
+    def get(self, key, default=None):
+        # Avoid the exception overhead of the DictMixin implementation
+        data = self._data
+        if key not in data:
+            self.misses += 1
+            return default
+        # The key may have been removed by another thread in the meantime
+        value = data.pop(key, _MISSING)
+        if value is _MISSING:
+            self.misses += 1
+            return default
+        data[key] = value
+        self.hits += 1
+        return value
+
+    def __setitem__(self, key, value):
+        data = self._data
+        if data.pop(key, _MISSING) is _MISSING and \
+                len(data) >= self._max_size:
+            try:
+                data.popitem(last=False)
+            except KeyError:
+                # Emptied by another thread
+                pass
+            else:
+                self.evictions += 1
+        data[key] = value
+
+    def __contains__(self, key):
+        return key in self._data
+
+    def __delitem__(self, key):
+        del self._data[key]
+
+    def __len__(self):
+        return len(self._data)
+
+    def __iter__(self):
+        return iter(self._data)
+
+    def items(self):
+        # Elements are not marked as used
+        return list(self._data.items())
+
+    def values(self):
+        # Elements are not marked as used
+        return list(self._data.values())
+
+    def clear(self):
+        self._data.clear()
+
+    def reset_stats(self):
+        "Reset hits, misses and evictions counters"
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stats(self):
+        "Return a dictionary of the cache usage counters"
+        return {
+            "size": len(self._data),
+            "max_size": self._max_size,
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+        }
@@ -31,7 +31,10 @@
 
 from builtins import zip
 from builtins import range
+import sys
+import threading
 import warnings
+import weakref
 import itertools
 from builtins import int as int_types
 from functools import cmp_to_key, total_ordering
@@ -409,7 +412,238 @@ class ExprVisitorCallbackBottomToTop(ExprVisitorBase):
         return ret
 
 
-class ExprVisitorCanonize(ExprVisitorCallbackBottomToTop):
+def expr_sons(expr):
+    """Return the tuple of direct sub-expressions of @expr
+    @expr: Expr instance
+    """
+    cls = expr.__class__
+    if cls is ExprOp or cls is ExprCompose:
+        return expr._args
+    elif cls is ExprInt or cls is ExprId or cls is ExprLoc:
+        return ()
+    elif cls is ExprSlice:
+        return (expr._arg,)
+    elif cls is ExprMem:
+        return (expr._ptr,)
+    elif cls is ExprCond:
+        return (expr._cond, expr._src1, expr._src2)
+    elif cls is ExprAssign:
+        return (expr._dst, expr._src)
+    raise TypeError("Visitor can only take Expr")
+
+
+def expr_bloom_bits(expr):
+    """Return the bits set by @expr in structural bloom filters (see
+    Expr.may_contain)
+    @expr: ExprId or ExprMem instance
+    """
+    value = hash(expr)
+    return (1 << (value & 63)) | (1 << ((value >> 6) & 63))
+
+
+def expr_rebuild(expr, sons):
+    """Return @expr with its direct sub-expressions replaced by @sons
+    @expr: Expr instance
+    @sons: sub-expressions, in the expr_sons order
+    """
+    cls = expr.__class__
+    if cls is ExprOp:
+        return ExprOp(expr._op, *sons)
+    elif cls is ExprCompose:
+        return ExprCompose(*sons)
+    elif cls is ExprSlice:
+        return ExprSlice(sons[0], expr._start, expr._stop)
+    elif cls is ExprMem:
+        return ExprMem(sons[0], expr._size)
+    elif cls is ExprCond:
+        return ExprCond(*sons)
+    elif cls is ExprAssign:
+        return ExprAssign(*sons)
+    raise TypeError("Visitor can only take Expr")
+
+
+class ExprWalkBaseIterative(object):
+    """
+    Walk through sub-expressions, call @callback on them, from leaves to root.
+    If @callback returns a non None value, stop walk and return this value
+
+    Same behavior as ExprWalkBase, using an explicit stack instead of
+    recursion: deep expressions do not reach the Python recursion limit.
+    Sub-classes can skip already walked sub-expressions by overriding
+    is_walked and set_walked.
+    """
+
+    def __init__(self, callback):
+        self.callback = callback
+
+    def is_walked(self, expr, *args, **kwargs):
+        """Return True if @expr and its sub-expressions have already been
+        walked without stopping the walk"""
+        return False
+
+    def set_walked(self, expr, *args, **kwargs):
+        """Mark @expr and its sub-expressions as walked"""
+        pass
+
+    def visit(self, expr, *args, **kwargs):
+        ret = None
+        # (expression, sons already pushed)
+        todo = [(expr, False)]
+        while todo:
+            node, expanded = todo.pop()
+            if not expanded:
+                if self.is_walked(node, *args, **kwargs):
+                    continue
+                todo.append((node, True))
+                sons = expr_sons(node)
+                for son in reversed(sons):
+                    todo.append((son, False))
+                continue
+            ret = self.callback(node, *args, **kwargs)
+            if ret:
+                return ret
+            self.set_walked(node, *args, **kwargs)
+        return ret
+
+
+class ExprWalkIterative(ExprWalkBaseIterative):
+    """
+    Walk through sub-expressions, call @callback on them.
+    If @callback returns a non None value, stop walk and return this value
+    Use cache mechanism.
+
+    Explicit stack version of ExprWalk.
+    """
+    def __init__(self, callback):
+        super(ExprWalkIterative, self).__init__(callback)
+        self.cache = set()
+
+    def is_walked(self, expr, *args, **kwargs):
+        return expr in self.cache
+
+    def set_walked(self, expr, *args, **kwargs):
+        self.cache.add(expr)
+
+    def visit(self, expr, *args, **kwargs):
+        ret = super(ExprWalkIterative, self).visit(expr, *args, **kwargs)
+        if ret:
+            return ret
+        return None
+
+
+class ExprGetRIterative(ExprGetR):
+    """
+    Return ExprId/ExprMem used by a given expression
+
+    Explicit stack version of ExprGetR.
+    """
+
+    def visit(self, expr, *args, **kwargs):
+        cache = self.cache
+        cache_key = (self.mem_read, self.cst_read)
+        todo = [expr]
+        if expr.is_assign():
+            todo = [expr.src]
+            if expr.dst.is_mem() and self.mem_read:
+                todo.append(expr.dst.ptr)
+        while todo:
+            node = todo.pop()
+            if (node, cache_key) in cache:
+                continue
+            cache[(node, cache_key)] = None
+            self.get_r_leaves(node)
+            if node.is_mem() and not self.mem_read:
+                # Don't visit memory sons
+                continue
+            todo += expr_sons(node)
+        return None
+
+
+class ExprVisitorBaseIterative(object):
+    """
+    Rebuild expression by visiting sub-expressions
+
+    Same behavior as ExprVisitorBase, using an explicit stack instead of
+    recursion: deep expressions do not reach the Python recursion limit.
+    Sub-classes hook the visit with:
+    - cache_get / cache_set: results of already visited sub-expressions
+    - visit_node: compute the result of a node from its rebuilt version
+    """
+
+    def cache_get(self, expr):
+        """Return the result of a previous visit of @expr, None if unknown"""
+        return None
+
+    def cache_set(self, expr, result):
+        """Store @result as the result of the visit of @expr"""
+        pass
+
+    def visit_node(self, expr):
+        """Return the result of the visit of @expr, whose sub-expressions are
+        already visited"""
+        return expr
+
+    def visit(self, expr, *args, **kwargs):
+        ret = self.cache_get(expr)
+        if ret is not None:
+            return ret
+        cache_get = self.cache_get
+        cache_set = self.cache_set
+        visit_node = self.visit_node
+        # (expression, sons) where sons is None if not already pushed
+        todo = [(expr, None)]
+        # Results of visited sub-expressions
+        results = []
+        while todo:
+            node, sons = todo.pop()
+            if sons is None:
+                ret = cache_get(node)
+                if ret is not None:
+                    results.append(ret)
+                    continue
+                sons = expr_sons(node)
+                if sons:
+                    todo.append((node, sons))
+                    for son in reversed(sons):
+                        todo.append((son, None))
+                    continue
+                new_node = node
+            else:
+                new_sons = results[-len(sons):]
+                del results[-len(sons):]
+                if all(son is new_son for son, new_son in zip(sons, new_sons)):
+                    new_node = node
+                else:
+                    new_node = expr_rebuild(node, new_sons)
+            ret = visit_node(new_node)
+            cache_set(node, ret)
+            results.append(ret)
+        return results[0]
+
+
+class ExprVisitorCallbackBottomToTopIterative(ExprVisitorBaseIterative):
+    """
+    Rebuild expression by visiting sub-expressions
+    Call @callback from leaves to root expressions
+
+    Explicit stack version of ExprVisitorCallbackBottomToTop.
+    """
+    def __init__(self, callback):
+        super(ExprVisitorCallbackBottomToTopIterative, self).__init__()
+        self.cache = dict()
+        self.callback = callback
+
+    def cache_get(self, expr):
+        return self.cache.get(expr)
+
+    def cache_set(self, expr, result):
+        self.cache[expr] = result
+
+    def visit_node(self, expr):
+        return self.callback(expr)
+
+
+class ExprVisitorCanonize(ExprVisitorCallbackBottomToTopIterative):
     def __init__(self):
         super(ExprVisitorCanonize, self).__init__(self.canonize)
 
@@ -431,7 +665,7 @@ class ExprVisitorCanonize(ExprVisitorCallbackBottomToTop):
         return new_expr
 
 
-class ExprVisitorContains(ExprWalkBase):
+class ExprVisitorContains(ExprWalkBaseIterative):
     """
     Visitor to test if a needle is in an Expression
     Cache results
@@ -445,13 +679,18 @@ class ExprVisitorContains(ExprWalkBase):
             return True
         return None
 
+    def is_walked(self, expr, needle, *args, **kwargs):
+        if not expr.may_contain(needle):
+            return True
+        return (expr, needle) in self.cache
+
+    def set_walked(self, expr, needle, *args, **kwargs):
+        self.cache.add((expr, needle))
+
     def visit(self, expr, needle,  *args, **kwargs):
-        if (expr, needle) in self.cache:
-            return None
         ret = super(ExprVisitorContains, self).visit(expr, needle, *args, **kwargs)
         if ret:
             return ret
-        self.cache.add((expr, needle))
         return None
 
 
@@ -467,10 +706,20 @@ class Expr(object):
 
     "Parent class for Miasm Expressions"
 
-    __slots__ = ["_hash", "_repr", "_size"]
-
-    args2expr = {}
-    canon_exprs = set()
+    __slots__ = [
+        "_hash", "_repr", "_size",
+        # Structural metadata, computed on demand (see _set_metadata)
+        "_depth", "_node_count", "_bloom", "_reads",
+        "__weakref__"
+    ]
+
+    # Singletons are weakly referenced: an expression is released as soon as
+    # nobody holds it anymore. Generations can be used to keep alive every
+    # expression built during an analysis, and release them in one shot.
+    args2expr = weakref.WeakValueDictionary()
+    args2expr_lock = threading.Lock()
+    canon_exprs = weakref.WeakSet()
+    generations = []
     use_singleton = True
 
     def set_size(self, _):
@@ -492,14 +741,144 @@ class Expr(object):
     @staticmethod
     def get_object(expr_cls, args):
         if not expr_cls.use_singleton:
-            return object.__new__(expr_cls)
+            expr = object.__new__(expr_cls)
+            expr._depth = expr._reads = None
+            return expr
 
         expr = Expr.args2expr.get((expr_cls, args))
         if expr is None:
-            expr = object.__new__(expr_cls)
-            Expr.args2expr[(expr_cls, args)] = expr
+            # Two threads must not create the same singleton
+            with Expr.args2expr_lock:
+                expr = Expr.args2expr.get((expr_cls, args))
+                if expr is None:
+                    expr = object.__new__(expr_cls)
+                    expr._depth = expr._reads = None
+                    Expr.args2expr[(expr_cls, args)] = expr
+                    if Expr.generations:
+                        Expr.generations[-1].append(expr)
         return expr
 
+    def _set_metadata(self):
+        """Compute the structural metadata of @self and of its
+        sub-expressions:
+         - depth
+         - node count (of the expression tree)
+         - bloom filter of the ExprId / ExprMem it contains (a 64 bits
+           integer)
+        """
+        todo = [self]
+        while todo:
+            expr = todo[-1]
+            if expr._depth is not None:
+                todo.pop()
+                continue
+            sons = expr_sons(expr)
+            missing = [son for son in sons if son._depth is None]
+            if missing:
+                todo += missing
+                continue
+            todo.pop()
+            depth = 0
+            node_count = 1
+            bloom = 0
+            for son in sons:
+                if son._depth > depth:
+                    depth = son._depth
+                node_count += son._node_count
+                bloom |= son._bloom
+            if expr.__class__ is ExprId or expr.__class__ is ExprMem:
+                bloom |= expr_bloom_bits(expr)
+            expr._node_count = node_count
+            expr._bloom = bloom
+            # Set last: marks metadata as available
+            expr._depth = depth + 1
+
+    def depth(self):
+        """Return the depth of the expression tree (1 for leaves)"""
+        if self._depth is None:
+            self._set_metadata()
+        return self._depth
+
+    def node_count(self):
+        """Return the number of nodes of the expression tree (shared
+        sub-expressions are counted each time they appear)"""
+        if self._depth is None:
+            self._set_metadata()
+        return self._node_count
+
+    def may_contain(self, expr):
+        """Return False if @expr is surely not a sub-expression of @self. A
+        True result must be confirmed by a real search.
+        @expr: Expr instance
+        """
+        if self._depth is None:
+            self._set_metadata()
+        if expr._depth is None:
+            expr._set_metadata()
+        if expr._bloom & ~self._bloom:
+            return False
+        return (
+            expr._depth <= self._depth and
+            expr._node_count <= self._node_count
+        )
+
+    @staticmethod
+    def new_generation():
+        """Start a new generation of expressions.
+        Every expression created from now on is kept alive until the
+        generation is dropped.
+        Return the generation, to be given to drop_generation"""
+        generation = []
+        Expr.generations.append(generation)
+        return generation
+
+    @staticmethod
+    def drop_generation(generation=None):
+        """Release expressions kept alive by @generation (default: the last
+        one). Expressions still referenced elsewhere stay interned.
+        Return the number of released references.
+        @generation: object returned by new_generation"""
+        if generation is None:
+            if not Expr.generations:
+                raise ValueError("Unknown expression generation")
+            generation = Expr.generations[-1]
+        for index, candidate in enumerate(Expr.generations):
+            if candidate is generation:
+                break
+        else:
+            raise ValueError("Unknown expression generation")
+        del Expr.generations[index]
+        released = len(generation)
+        del generation[:]
+        # Global visitors caches may hold references to dropped expressions
+        contains_visitor.cache.clear()
+        canonize_visitor.cache.clear()
+        return released
+
+    @staticmethod
+    def interning_stats():
+        """Return a dictionary describing the singleton table:
+         - exprs: number of live interned expressions
+         - canon: number of expressions flagged as canonical
+         - generations: number of expressions kept alive by generations
+         - bytes: approximate number of bytes retained by interned expressions
+        """
+        table = Expr.args2expr
+        size = 0
+        for key, expr in list(table.items()):
+            size += sys.getsizeof(expr) + sys.getsizeof(key)
+            args = key[1]
+            if isinstance(args, tuple):
+                size += sys.getsizeof(args)
+            # Weak reference kept by the table
+            size += sys.getsizeof(weakref.ref(expr))
+        return {
+            "exprs": len(table),
+            "canon": len(Expr.canon_exprs),
+            "generations": sum(len(generation) for generation in Expr.generations),
+            "bytes": size,
+        }
+
     def get_is_canon(self):
         return self in Expr.canon_exprs
 
@@ -725,13 +1104,20 @@ class Expr(object):
 
         @callback: fn(Expr) -> Expr
         """
-        visitor = ExprVisitorCallbackBottomToTop(callback)
+        visitor = ExprVisitorCallbackBottomToTopIterative(callback)
         return visitor.visit(self)
 
     def get_r(self, mem_read=False, cst_read=False):
-        visitor = ExprGetR(mem_read, cst_read)
-        visitor.visit(self)
-        return visitor.elements
+        key = (mem_read, cst_read)
+        if self._reads is None:
+            self._reads = {}
+        elements = self._reads.get(key)
+        if elements is None:
+            visitor = ExprGetRIterative(mem_read, cst_read)
+            visitor.visit(self)
+            elements = frozenset(visitor.elements)
+            self._reads[key] = elements
+        return set(elements)
 
 
     def get_w(self, mem_read=False, cst_read=False):
@@ -749,7 +1135,7 @@ class ExprInt(Expr):
      - Constant 0x12345678 on 32bits
      """
 
-    __slots__ = Expr.__slots__ + ["_arg"]
+    __slots__ = ["_arg"]
 
 
     def __init__(self, arg, size):
@@ -795,9 +1181,6 @@ class ExprInt(Expr):
     def copy(self):
         return ExprInt(self._arg, self._size)
 
-    def depth(self):
-        return 1
-
     def graph_recursive(self, graph):
         graph.add_node(self)
 
@@ -823,7 +1206,7 @@ class ExprId(Expr):
      - variable v1
      """
 
-    __slots__ = Expr.__slots__ + ["_name"]
+    __slots__ = ["_name"]
 
     def __init__(self, name, size=None):
         """Create an identifier
@@ -864,9 +1247,6 @@ class ExprId(Expr):
     def copy(self):
         return ExprId(self._name, self._size)
 
-    def depth(self):
-        return 1
-
     def graph_recursive(self, graph):
         graph.add_node(self)
 
@@ -881,7 +1261,7 @@ class ExprLoc(Expr):
     """An ExprLoc represent a Label in Miasm IR.
     """
 
-    __slots__ = Expr.__slots__ + ["_loc_key"]
+    __slots__ = ["_loc_key"]
 
     def __init__(self, loc_key, size):
         """Create an identifier
@@ -916,9 +1296,6 @@ class ExprLoc(Expr):
     def copy(self):
         return ExprLoc(self._loc_key, self._size)
 
-    def depth(self):
-        return 1
-
     def graph_recursive(self, graph):
         graph.add_node(self)
 
@@ -936,7 +1313,7 @@ class ExprAssign(Expr):
      - var1 <- 2
     """
 
-    __slots__ = Expr.__slots__ + ["_dst", "_src"]
+    __slots__ = ["_dst", "_src"]
 
     def __init__(self, dst, src):
         """Create an ExprAssign for dst <- src
@@ -998,9 +1375,6 @@ class ExprAssign(Expr):
     def copy(self):
         return ExprAssign(self._dst.copy(), self._src.copy())
 
-    def depth(self):
-        return max(self._src.depth(), self._dst.depth()) + 1
-
     def graph_recursive(self, graph):
         graph.add_node(self)
         for arg in [self._src, self._dst]:
@@ -1037,7 +1411,7 @@ class ExprCond(Expr):
      - if (cond) then ... else ...
     """
 
-    __slots__ = Expr.__slots__ + ["_cond", "_src1", "_src2"]
+    __slots__ = ["_cond", "_src1", "_src2"]
 
     def __init__(self, cond, src1, src2):
         """Create an ExprCond
@@ -1085,11 +1459,6 @@ class ExprCond(Expr):
                         self._src1.copy(),
                         self._src2.copy())
 
-    def depth(self):
-        return max(self._cond.depth(),
-                   self._src1.depth(),
-                   self._src2.depth()) + 1
-
     def graph_recursive(self, graph):
         graph.add_node(self)
         for arg in [self._cond, self._src1, self._src2]:
@@ -1109,7 +1478,7 @@ class ExprMem(Expr):
      - Memory write
     """
 
-    __slots__ = Expr.__slots__ + ["_ptr"]
+    __slots__ = ["_ptr"]
 
     def __init__(self, ptr, size=None):
         """Create an ExprMem
@@ -1175,9 +1544,6 @@ class ExprMem(Expr):
         warnings.warn('DEPRECATION WARNING: use is_mem_segm(expr)')
         raise RuntimeError("Moved api")
 
-    def depth(self):
-        return self._ptr.depth() + 1
-
     def graph_recursive(self, graph):
         graph.add_node(self)
         self._ptr.graph_recursive(graph)
@@ -1197,7 +1563,7 @@ class ExprOp(Expr):
      - parity bit(var1)
     """
 
-    __slots__ = Expr.__slots__ + ["_op", "_args"]
+    __slots__ = ["_op", "_args"]
 
     def __init__(self, op, *args):
         """Create an ExprOp
@@ -1333,10 +1699,6 @@ class ExprOp(Expr):
         args = [arg.copy() for arg in self._args]
         return ExprOp(self._op, *args)
 
-    def depth(self):
-        depth = [arg.depth() for arg in self._args]
-        return max(depth) + 1
-
     def graph_recursive(self, graph):
         graph.add_node(self)
         for arg in self._args:
@@ -1355,7 +1717,7 @@ class ExprOp(Expr):
 
 class ExprSlice(Expr):
 
-    __slots__ = Expr.__slots__ + ["_arg", "_start", "_stop"]
+    __slots__ = ["_arg", "_start", "_stop"]
 
     def __init__(self, arg, start, stop):
 
@@ -1395,9 +1757,6 @@ class ExprSlice(Expr):
     def copy(self):
         return ExprSlice(self._arg.copy(), self._start, self._stop)
 
-    def depth(self):
-        return self._arg.depth() + 1
-
     def slice_rest(self):
         "Return the completion of the current slice"
         size = self._arg.size
@@ -1435,7 +1794,7 @@ class ExprCompose(Expr):
     Compose is like a hamburger. It concatenate Expressions
     """
 
-    __slots__ = Expr.__slots__ + ["_args"]
+    __slots__ = ["_args"]
 
     def __init__(self, *args):
         """Create an ExprCompose
@@ -1479,10 +1838,6 @@ class ExprCompose(Expr):
         args = [arg.copy() for arg in self._args]
         return ExprCompose(*args)
 
-    def depth(self):
-        depth = [arg.depth() for arg in self._args]
-        return max(depth) + 1
-
     def graph_recursive(self, graph):
         graph.add_node(self)
         for arg in self.args:
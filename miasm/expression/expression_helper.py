@@ -132,6 +132,50 @@ def fast_unify(seq, idfun=None):
         result.append(item)
     return result
 
+
+def declare_ops(ops=None, prefixes=None, min_args=None, max_args=None):
+    """Decorator declaring the ExprOp handled by a simplification pass.
+    The pass will only be called on ExprOp whose operator is in @ops or starts
+    with one of @prefixes, and whose number of arguments is in
+    [@min_args, @max_args]. Passes without declaration are called on every
+    ExprOp.
+
+    The pass must return the expression unchanged for other ExprOp.
+
+    @ops: (optional) list of operator names
+    @prefixes: (optional) list of operator names prefixes
+    @min_args: (optional) minimum number of arguments
+    @max_args: (optional) maximum number of arguments
+    """
+    def decorator(simp_func):
+        simp_func.simp_ops = frozenset(ops if ops else [])
+        simp_func.simp_ops_prefixes = tuple(prefixes if prefixes else [])
+        simp_func.simp_ops_nargs = (min_args, max_args)
+        return simp_func
+    return decorator
+
+
+def pass_handles_op(simp_func, op, nargs):
+    """Return True if the simplification pass @simp_func may modify an ExprOp
+    with operator @op and @nargs arguments (see declare_ops)
+    @simp_func: simplification callback
+    @op: operator name
+    @nargs: number of arguments
+    """
+    ops = getattr(simp_func, "simp_ops", None)
+    if ops is None:
+        # Generic pass
+        return True
+    if op not in ops and not op.startswith(simp_func.simp_ops_prefixes):
+        return False
+    min_args, max_args = simp_func.simp_ops_nargs
+    if min_args is not None and nargs < min_args:
+        return False
+    if max_args is not None and nargs > max_args:
+        return False
+    return True
+
+
 def get_missing_interval(all_intervals, i_min=0, i_max=32):
     """Return a list of missing interval in all_interval
     @all_interval: list of (int, int)
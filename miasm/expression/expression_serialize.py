@@ -0,0 +1,356 @@
+"""
+Compact binary serialization of expressions
+
+Expressions are stored as a DAG: each sub-expression is encoded once, in a
+node table, and referenced by its index. Integers are varint encoded, and
+strings (identifiers names, operators) are stored once.
+
+Serialized data layout:
+ - magic, format version
+ - node table (varint length, then nodes)
+ - payload: sequence of varints / strings / node indexes, written by the
+   user of ExprSerializer
+
+On load, expressions are rebuilt using their constructors, so they are
+re-interned as singletons.
+"""
+
+from miasm.expression.expression import ExprInt, ExprId, ExprLoc, ExprOp, \
+    ExprSlice, ExprCompose, ExprMem, ExprCond, ExprAssign, LocKey, expr_sons
+
+MAGIC = b"MIASMEXP"
+VERSION = 1
+
+# Nodes tags
+NODE_INT = 0
+NODE_ID = 1
+NODE_ID_BYTES = 2
+NODE_LOC = 3
+NODE_MEM = 4
+NODE_OP = 5
+NODE_SLICE = 6
+NODE_COMPOSE = 7
+NODE_COND = 8
+NODE_ASSIGN = 9
+
+
+def write_varint(out, value):
+    """Append the unsigned LEB128 encoding of @value to @out
+    @out: bytearray
+    @value: positive integer
+    """
+    if value < 0:
+        raise ValueError("Cannot encode negative value %d" % value)
+    while value > 0x7F:
+        out.append((value & 0x7F) | 0x80)
+        value >>= 7
+    out.append(value)
+
+
+def read_varint(data, offset):
+    """Decode an unsigned LEB128 integer from @data at @offset
+    Return the tuple (value, next offset)
+    @data: bytearray
+    @offset: int
+    """
+    value = 0
+    shift = 0
+    while True:
+        byte = data[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+class StringTable(object):
+    """Strings encoder / decoder: a string is written once, then referenced
+    by its index"""
+
+    def __init__(self):
+        self.strings = []
+        self.string_to_index = {}
+
+    def write(self, out, string):
+        """Append the encoding of @string to @out
+        @string: bytes
+        """
+        index = self.string_to_index.get(string)
+        if index is not None:
+            write_varint(out, index << 1)
+            return
+        self.string_to_index[string] = len(self.strings)
+        self.strings.append(string)
+        write_varint(out, (len(string) << 1) | 1)
+        out += string
+
+    def read(self, data, offset):
+        """Decode a string from @data at @offset
+        Return the tuple (bytes, next offset)
+        """
+        value, offset = read_varint(data, offset)
+        if not value & 1:
+            return self.strings[value >> 1], offset
+        length = value >> 1
+        string = bytes(data[offset:offset + length])
+        self.strings.append(string)
+        return string, offset + length
+
+
+class ExprSerializer(object):
+    """Serialize expressions and associated data
+
+    Sub-expressions shared between serialized expressions are only stored
+    once.
+    """
+
+    def __init__(self):
+        self.nodes = bytearray()
+        self.payload = bytearray()
+        self.expr_to_index = {}
+        self.node_strings = StringTable()
+        self.payload_strings = StringTable()
+        # LocKeys referenced by the serialized data
+        self.loc_keys = set()
+
+    def _write_node(self, expr):
+        """Append @expr to the node table, its sub-expressions must already be
+        stored"""
+        out = self.nodes
+        indexes = self.expr_to_index
+        if expr.is_int():
+            out.append(NODE_INT)
+            write_varint(out, expr.size)
+            write_varint(out, int(expr))
+        elif expr.is_id():
+            name = expr.name
+            if isinstance(name, bytes):
+                out.append(NODE_ID_BYTES)
+            else:
+                out.append(NODE_ID)
+                name = name.encode("utf8")
+            write_varint(out, expr.size)
+            self.node_strings.write(out, name)
+        elif expr.is_loc():
+            out.append(NODE_LOC)
+            write_varint(out, expr.size)
+            write_varint(out, expr.loc_key.key)
+            self.loc_keys.add(expr.loc_key)
+        elif expr.is_mem():
+            out.append(NODE_MEM)
+            write_varint(out, expr.size)
+            write_varint(out, indexes[expr.ptr])
+        elif expr.is_op():
+            out.append(NODE_OP)
+            self.node_strings.write(out, expr.op.encode("utf8"))
+            write_varint(out, len(expr.args))
+            for arg in expr.args:
+                write_varint(out, indexes[arg])
+        elif expr.is_slice():
+            out.append(NODE_SLICE)
+            write_varint(out, indexes[expr.arg])
+            write_varint(out, expr.start)
+            write_varint(out, expr.stop)
+        elif expr.is_compose():
+            out.append(NODE_COMPOSE)
+            write_varint(out, len(expr.args))
+            for arg in expr.args:
+                write_varint(out, indexes[arg])
+        elif expr.is_cond():
+            out.append(NODE_COND)
+            write_varint(out, indexes[expr.cond])
+            write_varint(out, indexes[expr.src1])
+            write_varint(out, indexes[expr.src2])
+        elif expr.is_assign():
+            out.append(NODE_ASSIGN)
+            write_varint(out, indexes[expr.dst])
+            write_varint(out, indexes[expr.src])
+        else:
+            raise TypeError("Cannot serialize %r" % expr)
+
+    def add_expr(self, expr):
+        """Store @expr (and its sub-expressions) in the node table
+        Return its index"""
+        indexes = self.expr_to_index
+        index = indexes.get(expr)
+        if index is not None:
+            return index
+        # (expression, sons already pushed)
+        todo = [(expr, False)]
+        while todo:
+            node, expanded = todo.pop()
+            if node in indexes:
+                continue
+            if not expanded:
+                todo.append((node, True))
+                for son in expr_sons(node):
+                    if son not in indexes:
+                        todo.append((son, False))
+                continue
+            self._write_node(node)
+            indexes[node] = len(indexes)
+        return indexes[expr]
+
+    def write_expr(self, expr):
+        """Append a reference to @expr to the payload"""
+        write_varint(self.payload, self.add_expr(expr))
+
+    def write_uint(self, value):
+        """Append the positive integer @value to the payload"""
+        write_varint(self.payload, value)
+
+    def write_loc_key(self, loc_key):
+        """Append the LocKey @loc_key to the payload"""
+        write_varint(self.payload, loc_key.key)
+        self.loc_keys.add(loc_key)
+
+    def write_str(self, string):
+        """Append the str @string to the payload"""
+        self.payload_strings.write(self.payload, string.encode("utf8"))
+
+    def write_bytes(self, data):
+        """Append the bytes @data to the payload"""
+        self.payload_strings.write(self.payload, bytes(data))
+
+    def get_bytes(self):
+        """Return the serialized data"""
+        out = bytearray(MAGIC)
+        write_varint(out, VERSION)
+        write_varint(out, len(self.nodes))
+        out += self.nodes
+        out += self.payload
+        return bytes(out)
+
+
+class ExprDeserializer(object):
+    """Deserialize data generated by ExprSerializer
+
+    The payload must be read in the order it has been written.
+    """
+
+    def __init__(self, data, loc_key_map=None):
+        """
+        @data: bytes generated by ExprSerializer.get_bytes
+        @loc_key_map: (optional) function returning the LocKey to use for a
+        serialized LocKey value, to load the data in another LocationDB
+        """
+        self.loc_key_map = loc_key_map
+        data = bytearray(data)
+        if data[:len(MAGIC)] != MAGIC:
+            raise ValueError("Not a serialized expression stream")
+        version, offset = read_varint(data, len(MAGIC))
+        if version != VERSION:
+            raise ValueError("Unsupported serialization version %d" % version)
+        length, offset = read_varint(data, offset)
+        self.data = data
+        self.exprs = []
+        self.node_strings = StringTable()
+        self.payload_strings = StringTable()
+        self._read_nodes(offset, offset + length)
+        self.offset = offset + length
+
+    def _read_nodes(self, offset, end):
+        """Rebuild the expressions of the node table"""
+        data = self.data
+        exprs = self.exprs
+        strings = self.node_strings
+        while offset < end:
+            tag = data[offset]
+            offset += 1
+            if tag == NODE_INT:
+                size, offset = read_varint(data, offset)
+                value, offset = read_varint(data, offset)
+                expr = ExprInt(value, size)
+            elif tag in (NODE_ID, NODE_ID_BYTES):
+                size, offset = read_varint(data, offset)
+                name, offset = strings.read(data, offset)
+                if tag == NODE_ID:
+                    name = name.decode("utf8")
+                expr = ExprId(name, size)
+            elif tag == NODE_LOC:
+                size, offset = read_varint(data, offset)
+                key, offset = read_varint(data, offset)
+                expr = ExprLoc(self._loc_key(key), size)
+            elif tag == NODE_MEM:
+                size, offset = read_varint(data, offset)
+                ptr, offset = read_varint(data, offset)
+                expr = ExprMem(exprs[ptr], size)
+            elif tag == NODE_OP:
+                op, offset = strings.read(data, offset)
+                args, offset = self._read_indexes(offset)
+                expr = ExprOp(op.decode("utf8"), *args)
+            elif tag == NODE_SLICE:
+                arg, offset = read_varint(data, offset)
+                start, offset = read_varint(data, offset)
+                stop, offset = read_varint(data, offset)
+                expr = ExprSlice(exprs[arg], start, stop)
+            elif tag == NODE_COMPOSE:
+                args, offset = self._read_indexes(offset)
+                expr = ExprCompose(*args)
+            elif tag == NODE_COND:
+                cond, offset = read_varint(data, offset)
+                src1, offset = read_varint(data, offset)
+                src2, offset = read_varint(data, offset)
+                expr = ExprCond(exprs[cond], exprs[src1], exprs[src2])
+            elif tag == NODE_ASSIGN:
+                dst, offset = read_varint(data, offset)
+                src, offset = read_varint(data, offset)
+                expr = ExprAssign(exprs[dst], exprs[src])
+            else:
+                raise ValueError("Unknown node tag %d" % tag)
+            exprs.append(expr)
+
+    def _read_indexes(self, offset):
+        """Read a list of node references, prefixed by its length"""
+        count, offset = read_varint(self.data, offset)
+        args = []
+        for _ in range(count):
+            index, offset = read_varint(self.data, offset)
+            args.append(self.exprs[index])
+        return args, offset
+
+    def read_expr(self):
+        """Read an expression reference from the payload"""
+        index, self.offset = read_varint(self.data, self.offset)
+        return self.exprs[index]
+
+    def read_uint(self):
+        """Read a positive integer from the payload"""
+        value, self.offset = read_varint(self.data, self.offset)
+        return value
+
+    def _loc_key(self, key):
+        if self.loc_key_map is None:
+            return LocKey(key)
+        return self.loc_key_map(key)
+
+    def read_loc_key(self):
+        """Read a LocKey from the payload"""
+        key, self.offset = read_varint(self.data, self.offset)
+        return self._loc_key(key)
+
+    def read_str(self):
+        """Read a str from the payload"""
+        return self.read_bytes().decode("utf8")
+
+    def read_bytes(self):
+        """Read bytes from the payload"""
+        data, self.offset = self.payload_strings.read(self.data, self.offset)
+        return data
+
+
+def expr_dumps(exprs):
+    """Serialize the list of expressions @exprs
+    Return bytes"""
+    serializer = ExprSerializer()
+    serializer.write_uint(len(exprs))
+    for expr in exprs:
+        serializer.write_expr(expr)
+    return serializer.get_bytes()
+
+
+def expr_loads(data):
+    """Return the list of expressions serialized in @data by expr_dumps"""
+    deserializer = ExprDeserializer(data)
+    return [deserializer.read_expr() for _ in range(deserializer.read_uint())]
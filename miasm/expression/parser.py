@@ -1,3 +1,5 @@
+import re
+
 import pyparsing
 from miasm.expression.expression import ExprInt, ExprId, ExprLoc, ExprSlice, \
     ExprMem, ExprCond, ExprCompose, ExprOp, ExprAssign, LocKey
@@ -72,8 +74,9 @@ expr_op.setParseAction(lambda t: ExprOp(*t))
 expr_aff.setParseAction(lambda t: ExprAssign(*t))
 
 
-def str_to_expr(str_in):
-    """Parse the @str_in and return the corresponding Expression
+def str_to_expr_pyparsing(str_in):
+    """Parse the @str_in and return the corresponding Expression, using the
+    pyparsing grammar
     @str_in: repr string of an Expression"""
 
     try:
@@ -82,3 +85,174 @@ def str_to_expr(str_in):
         raise RuntimeError("Cannot parse expression %s" % str_in)
     assert len(value) == 1
     return value[0]
+
+
+# Hand-written parser, accepting the same language as the pyparsing grammar
+
+def quoted_string_regexp(quote):
+    """Return the regular expression of a string quoted with @quote, as
+    matched by pyparsing.QuotedString(quote, escChar='\\', escQuote='\\')"""
+    return r"%s(?:[^%s\n\r\\]|(?:\\)|(?:\\.))*%s" % (quote, quote, quote)
+
+
+# Whitespaces skipped by pyparsing
+WHITESPACES = r"[ \t\n\r]*"
+
+# Tokens, each preceded by whitespaces. The last alternative catches
+# invalid characters, making the parser fail if it reaches them
+TOKENS = re.compile(
+    WHITESPACES +
+    r"("
+    r"ExprInt|ExprId|ExprLoc|ExprSlice|ExprMem|ExprCond|ExprCompose|ExprOp|"
+    r"ExprAssign|LocKey|"
+    r"(?:-" + WHITESPACES + r")?(?:0x[0-9a-fA-F]+|[0-9]+)|" +
+    quoted_string_regexp("'") + "|" +
+    quoted_string_regexp('"') + "|"
+    r"[(),<>]|"
+    r"[\s\S]"
+    r")"
+)
+
+INT_FIRST_CHARS = "-0123456789"
+STR_FIRST_CHARS = "'\""
+
+ESCAPED_CHAR = re.compile(r"\\(.)")
+
+WHITESPACE_ESCAPES = [
+    (r"\t", "\t"),
+    (r"\n", "\n"),
+    (r"\f", "\f"),
+    (r"\r", "\r"),
+]
+
+
+def unquote_string(token):
+    """Return the value of the quoted string @token, unescaped as
+    pyparsing.QuotedString does"""
+    value = token[1:-1]
+    if "\\" in value:
+        for escaped, char in WHITESPACE_ESCAPES:
+            value = value.replace(escaped, char)
+        value = ESCAPED_CHAR.sub(r"\g<1>", value)
+        value = value.replace("\\", token[0])
+    return value
+
+
+def parse_int(token):
+    """Return the value of the integer @token"""
+    negative = token.startswith("-")
+    if negative:
+        token = token[1:].lstrip(" \t\n\r")
+    if token.startswith("0x"):
+        value = int(token, 16)
+    else:
+        value = int(token)
+    if negative:
+        return -value
+    return value
+
+
+def build_loc(loc_key, size):
+    return ExprLoc(LocKey(loc_key), size)
+
+
+# Pattern items
+TOK_EXPR = 0
+TOK_EXPRS = 1
+TOK_INT = 2
+TOK_STR = 3
+
+# Keyword -> (builder, arguments pattern)
+EXPR_RULES = {
+    "ExprInt": (ExprInt, ("(", TOK_INT, ",", TOK_INT, ")")),
+    "ExprId": (ExprId, ("(", TOK_STR, ",", TOK_INT, ")")),
+    "ExprLoc": (build_loc, ("(", "<", "LocKey", TOK_INT, ">", ",", TOK_INT, ")")),
+    "ExprSlice": (ExprSlice, ("(", TOK_EXPR, ",", TOK_INT, ",", TOK_INT, ")")),
+    "ExprMem": (ExprMem, ("(", TOK_EXPR, ",", TOK_INT, ")")),
+    "ExprCond": (ExprCond, ("(", TOK_EXPR, ",", TOK_EXPR, ",", TOK_EXPR, ")")),
+    "ExprCompose": (ExprCompose, ("(", TOK_EXPR, TOK_EXPRS)),
+    "ExprOp": (ExprOp, ("(", TOK_STR, ",", TOK_EXPR, TOK_EXPRS)),
+    "ExprAssign": (ExprAssign, ("(", TOK_EXPR, ",", TOK_EXPR, ")")),
+}
+
+
+class ExprReprParser(object):
+    """Parse the repr of an expression, without recursion
+
+    Trailing characters after the expression are ignored, as with the
+    pyparsing grammar.
+    """
+
+    def __init__(self, str_in):
+        self.tokens = TOKENS.findall(str_in)
+        self.index = 0
+
+    def next_rule(self):
+        """Read an expression keyword, return its rule"""
+        token = self.tokens[self.index]
+        self.index += 1
+        rule = EXPR_RULES.get(token)
+        if rule is None:
+            raise ValueError("Expression expected at token %d" % self.index)
+        return rule
+
+    def parse(self):
+        """Return the parsed expression"""
+        tokens = self.tokens
+        # Stack of [rule, pattern index, arguments]
+        stack = [[self.next_rule(), 0, []]]
+        result = None
+        while True:
+            frame = stack[-1]
+            (builder, pattern), index, args = frame
+            item = pattern[index]
+            if item == TOK_EXPR:
+                if result is None:
+                    stack.append([self.next_rule(), 0, []])
+                    continue
+                args.append(result)
+                result = None
+                frame[1] += 1
+                continue
+            token = tokens[self.index]
+            self.index += 1
+            if item == TOK_EXPRS:
+                if result is not None:
+                    args.append(result)
+                    result = None
+                if token == ",":
+                    stack.append([self.next_rule(), 0, []])
+                    continue
+                if token != ")":
+                    raise ValueError("',' or ')' expected at token %d" % self.index)
+            elif item == TOK_INT:
+                if token[0] not in INT_FIRST_CHARS:
+                    raise ValueError("Integer expected at token %d" % self.index)
+                args.append(parse_int(token))
+            elif item == TOK_STR:
+                if token[0] not in STR_FIRST_CHARS or len(token) < 2:
+                    raise ValueError("String expected at token %d" % self.index)
+                args.append(unquote_string(token))
+            elif token != item:
+                raise ValueError("'%s' expected at token %d" % (item, self.index))
+            frame[1] += 1
+            if item != TOK_EXPRS and frame[1] != len(pattern):
+                continue
+            # Rule completed
+            stack.pop()
+            result = builder(*args)
+            if not stack:
+                return result
+
+
+def str_to_expr(str_in):
+    """Parse the @str_in and return the corresponding Expression
+    @str_in: repr string of an Expression"""
+
+    if "\t" in str_in:
+        # As pyparsing
+        str_in = str_in.expandtabs()
+    try:
+        return ExprReprParser(str_in).parse()
+    except Exception:
+        raise RuntimeError("Cannot parse expression %s" % str_in)
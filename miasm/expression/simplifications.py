@@ -3,15 +3,18 @@
 #                                                                              #
 
 import logging
+import time
 
 from future.utils import viewitems
 
 from miasm.expression import simplifications_common
 from miasm.expression import simplifications_cond
 from miasm.expression import simplifications_explicit
-from miasm.expression.expression_helper import fast_unify
+from miasm.expression.expression_helper import fast_unify, pass_handles_op
+from miasm.core.utils import LRUCache
 import miasm.expression.expression as m2_expr
-from miasm.expression.expression import ExprVisitorCallbackBottomToTop
+from miasm.expression.expression import \
+    ExprVisitorCallbackBottomToTopIterative
 
 # Expression Simplifier
 # ---------------------
@@ -22,8 +25,106 @@ console_handler.setFormatter(logging.Formatter("[%(levelname)-8s]: %(message)s")
 log_exprsimp.addHandler(console_handler)
 log_exprsimp.setLevel(logging.WARNING)
 
+try:
+    timer = time.perf_counter
+except AttributeError:
+    # Python 2
+    timer = time.time
 
-class ExpressionSimplifier(ExprVisitorCallbackBottomToTop):
+
+class SimplifierProfile(object):
+
+    """Statistics on simplification passes calls.
+
+    For each pass, record:
+     - calls: number of calls
+     - rewrites: number of calls returning a different expression
+     - time: cumulative time spent in the pass, including the nested
+       simplifications it triggers
+     - own_time: time spent in the pass, excluding nested passes
+    """
+
+    def __init__(self):
+        # pass -> [calls, rewrites, time, own_time]
+        self.passes = {}
+        # Time spent in nested passes, for each running pass
+        self._nested = []
+
+    def reset(self):
+        "Reset statistics"
+        self.passes.clear()
+
+    def call(self, simp_func, simplifier, expression):
+        """Call the pass @simp_func on @expression and record its statistics
+        Return the pass result"""
+        nested = self._nested
+        nested.append(0)
+        start = timer()
+        try:
+            result = simp_func(simplifier, expression)
+        finally:
+            elapsed = timer() - start
+            own_time = elapsed - nested.pop()
+            if nested:
+                nested[-1] += elapsed
+        stats = self.passes.get(simp_func)
+        if stats is None:
+            stats = self.passes[simp_func] = [0, 0, 0, 0]
+        stats[0] += 1
+        if result != expression:
+            stats[1] += 1
+        stats[2] += elapsed
+        stats[3] += own_time
+        return result
+
+    @staticmethod
+    def pass_name(simp_func):
+        "Return a readable name for @simp_func"
+        module = getattr(simp_func, "__module__", None)
+        name = getattr(simp_func, "__name__", repr(simp_func))
+        if module:
+            name = "%s.%s" % (module.split(".")[-1], name)
+        return name
+
+    def as_dict(self):
+        """Return statistics as a dictionary:
+        pass name -> {"calls", "rewrites", "time", "own_time"}"""
+        return dict(
+            (
+                self.pass_name(simp_func),
+                {
+                    "calls": calls,
+                    "rewrites": rewrites,
+                    "time": cumulative,
+                    "own_time": own_time,
+                }
+            )
+            for simp_func, (calls, rewrites, cumulative, own_time)
+            in viewitems(self.passes)
+        )
+
+    def report(self):
+        "Return a textual report, ordered by decreasing own time"
+        stats = sorted(
+            viewitems(self.as_dict()),
+            key=lambda name_stats: name_stats[1]["own_time"],
+            reverse=True
+        )
+        lines = ["%-50s %10s %10s %10s %10s" % (
+            "pass", "calls", "rewrites", "time", "own_time"
+        )]
+        for name, stat in stats:
+            lines.append("%-50s %10d %10d %10.4f %10.4f" % (
+                name,
+                stat["calls"],
+                stat["rewrites"],
+                stat["time"],
+                stat["own_time"],
+            ))
+        return "\n".join(lines)
+
+
+class ExpressionSimplifier(ExprVisitorCallbackBottomToTopIterative):
 
     """Wrapper on expression simplification passes.
 
@@ -32,8 +133,18 @@ class ExpressionSimplifier(ExprVisitorCallbackBottomToTop):
     Available passes lists are:
      - commons: common passes such as constant folding
      - heavy  : rare passes (for instance, in case of obfuscation)
+
+    Simplified expressions are stored in a size-bounded LRU cache, keyed by
+    the enabled passes fingerprint and the expression. This cache can be
+    shared between several simplifiers.
     """
 
+    # Default number of simplified expressions kept by a simplifier
+    CACHE_SIZE = 0x20000
+
+    # Fingerprints of enabled passes sets: passes set -> small identifier
+    _passes_fingerprints = {}
+
     # Common passes
     PASS_COMMONS = {
         m2_expr.ExprOp: [
@@ -125,9 +236,36 @@ class ExpressionSimplifier(ExprVisitorCallbackBottomToTop):
     }
 
 
-    def __init__(self):
+    def __init__(self, cache=None):
+        """
+        @cache: (optional) LRUCache instance, shared between simplifiers
+        """
         super(ExpressionSimplifier, self).__init__(self.expr_simp_inner)
         self.expr_simp_cb = {}
+        # (operator, number of arguments) -> [(pass index, ExprOp pass), ...]
+        self.op_dispatch = {}
+        if cache is None:
+            cache = LRUCache(self.CACHE_SIZE)
+        self.cache = cache
+        self.passes_fingerprint = self._get_passes_fingerprint()
+        # SimplifierProfile instance, if profiling is enabled
+        self.profile = None
+
+    def _get_passes_fingerprint(self):
+        """Return a small identifier standing for the enabled passes, used to
+        distinguish cache entries of simplifiers sharing the same cache"""
+        passes = tuple(
+            sorted(
+                (
+                    (cls.__name__, tuple(callbacks))
+                    for cls, callbacks in viewitems(self.expr_simp_cb)
+                    if callbacks
+                ),
+                key=lambda cls_callbacks: cls_callbacks[0]
+            )
+        )
+        fingerprints = ExpressionSimplifier._passes_fingerprints
+        return fingerprints.setdefault(passes, len(fingerprints))
 
     def enable_passes(self, passes):
         """Add passes from @passes
@@ -136,11 +274,94 @@ class ExpressionSimplifier(ExprVisitorCallbackBottomToTop):
         Callback signature: Expr callback(ExpressionSimplifier, Expr)
         """
 
-        # Clear cache of simplifiied expressions when adding a new pass
-        self.cache.clear()
-
         for k, v in viewitems(passes):
             self.expr_simp_cb[k] = fast_unify(self.expr_simp_cb.get(k, []) + v)
+        self.op_dispatch.clear()
+
+        # Previously simplified expressions are no longer reachable from the
+        # new fingerprint
+        self.passes_fingerprint = self._get_passes_fingerprint()
+
+    def enable_profiling(self, profile=None):
+        """Record statistics on passes calls. Only passes run on expressions
+        missing from the cache are recorded.
+        @profile: (optional) SimplifierProfile instance, shared between
+        simplifiers
+        Return the SimplifierProfile instance"""
+        if profile is None:
+            profile = SimplifierProfile()
+        self.profile = profile
+        return profile
+
+    def disable_profiling(self):
+        "Stop recording statistics on passes calls"
+        self.profile = None
+
+    def cache_stats(self):
+        "Return the usage counters of the simplification cache"
+        return self.cache.stats()
+
+    def cache_get(self, expr):
+        return self.cache.get((self.passes_fingerprint, expr))
+
+    def cache_set(self, expr, result):
+        self.cache[(self.passes_fingerprint, expr)] = result
+
+    def get_op_passes(self, expression):
+        """Return the list of (index, pass) which may simplify the ExprOp
+        @expression, ordered as enabled
+        @expression: ExprOp instance"""
+        key = (expression.op, len(expression.args))
+        passes = self.op_dispatch.get(key)
+        if passes is None:
+            passes = [
+                (index, simp_func)
+                for index, simp_func in enumerate(
+                        self.expr_simp_cb.get(m2_expr.ExprOp, [])
+                )
+                if pass_handles_op(simp_func, *key)
+            ]
+            self.op_dispatch[key] = passes
+        return passes
+
+    def apply_simp_op(self, expression):
+        """Apply enabled simplifications on ExprOp @expression, calling only
+        the passes handling its operator
+        @expression: ExprOp instance
+        Return an Expr instance"""
+
+        debug_level = log_exprsimp.isEnabledFor(logging.DEBUG)
+        profile = self.profile
+        passes = self.get_op_passes(expression)
+        position = 0
+        while position < len(passes):
+            index, simp_func = passes[position]
+            position += 1
+            # Apply simplifications
+            before = expression
+            if profile is None:
+                expression = simp_func(self, expression)
+            else:
+                expression = profile.call(simp_func, self, expression)
+            after = expression
+
+            if debug_level and before != after:
+                log_exprsimp.debug("[%s] %s => %s", simp_func, before, after)
+
+            # If class changes, stop to prevent wrong simplifications
+            if expression.__class__ is not m2_expr.ExprOp:
+                break
+
+            if (expression.op != before.op or
+                len(expression.args) != len(before.args)):
+                # Continue with the next passes handling the new operator
+                passes = [
+                    op_pass for op_pass in self.get_op_passes(expression)
+                    if op_pass[0] > index
+                ]
+                position = 0
+
+        return expression
 
     def apply_simp(self, expression):
         """Apply enabled simplifications on expression
@@ -148,11 +369,17 @@ class ExpressionSimplifier(ExprVisitorCallbackBottomToTop):
         Return an Expr instance"""
 
         cls = expression.__class__
-        debug_level = log_exprsimp.level >= logging.DEBUG
+        if cls is m2_expr.ExprOp:
+            return self.apply_simp_op(expression)
+        debug_level = log_exprsimp.isEnabledFor(logging.DEBUG)
+        profile = self.profile
         for simp_func in self.expr_simp_cb.get(cls, []):
             # Apply simplifications
             before = expression
-            expression = simp_func(self, expression)
+            if profile is None:
+                expression = simp_func(self, expression)
+            else:
+                expression = profile.call(simp_func, self, expression)
             after = expression
 
             if debug_level and before != after:
@@ -189,13 +416,16 @@ class ExpressionSimplifier(ExprVisitorCallbackBottomToTop):
         return self.visit(expression)
 
 
+# Simplification cache shared by public ExprSimplificationPass instances
+expr_simp_cache = LRUCache(ExpressionSimplifier.CACHE_SIZE)
+
 # Public ExprSimplificationPass instance with commons passes
-expr_simp = ExpressionSimplifier()
+expr_simp = ExpressionSimplifier(expr_simp_cache)
 expr_simp.enable_passes(ExpressionSimplifier.PASS_COMMONS)
 
-expr_simp_high_to_explicit = ExpressionSimplifier()
+expr_simp_high_to_explicit = ExpressionSimplifier(expr_simp_cache)
 expr_simp_high_to_explicit.enable_passes(ExpressionSimplifier.PASS_HIGH_TO_EXPLICIT)
 
-expr_simp_explicit = ExpressionSimplifier()
+expr_simp_explicit = ExpressionSimplifier(expr_simp_cache)
 expr_simp_explicit.enable_passes(ExpressionSimplifier.PASS_COMMONS)
 expr_simp_explicit.enable_passes(ExpressionSimplifier.PASS_HIGH_TO_EXPLICIT)
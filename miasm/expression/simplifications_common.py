@@ -9,7 +9,7 @@ from miasm.expression.expression import ExprInt, ExprSlice, ExprMem, \
     ExprCond, ExprOp, ExprCompose, TOK_INF_SIGNED, TOK_INF_UNSIGNED, \
     TOK_INF_EQUAL_SIGNED, TOK_INF_EQUAL_UNSIGNED, TOK_EQUAL
 from miasm.expression.expression_helper import parity, op_propag_cst, \
-    merge_sliceto_slice
+    merge_sliceto_slice, declare_ops
 from miasm.expression.simplifications_explicit import simp_flags
 
 def simp_cst_propagation(e_s, expr):
@@ -395,6 +395,7 @@ def simp_cst_propagation(e_s, expr):
     return ExprOp(op_name, *args)
 
 
+@declare_ops(ops=["+", "|", "^", "&", "*", '<<', '>>', 'a>>'], min_args=2)
 def simp_cond_op_int(_, expr):
     "Extract conditions from operations"
 
@@ -426,6 +427,7 @@ def simp_cond_op_int(_, expr):
                     ExprOp(expr.op, *args2))
 
 
+@declare_ops(ops=["+", "|", "^", "&", "*", '<<', '>>', 'a>>'], min_args=2)
 def simp_cond_factor(e_s, expr):
     "Merge similar conditions"
     if not expr.op in ["+", "|", "^", "&", "*", '<<', '>>', 'a>>']:
@@ -725,6 +727,10 @@ def test_cc_eq_args(expr, *sons_op):
     return len(all_args) == 1
 
 
+@declare_ops(ops=[
+    "CC_U<=", "CC_U>=", "CC_S<", "CC_S>", "CC_S<=", "CC_S>=", "CC_U>",
+    "CC_U<", "CC_NEG", "CC_EQ", "CC_NE", "CC_POS"
+])
 def simp_cc_conds(_, expr):
     """
     High level simplifications. Example:
@@ -936,6 +942,7 @@ def simp_cond_flag(_, expr):
     return expr
 
 
+@declare_ops(ops=["FLAG_SUB_CF"])
 def simp_sub_cf_zero(_, expr):
     """FLAG_SUB_CF(0, X) => (X)?1:0"""
     if not expr.is_op("FLAG_SUB_CF"):
@@ -977,6 +984,7 @@ def simp_cond_sub_cf(expr_simp, expr):
     return ExprCond(cond, expr.src1, expr.src2)
 
 
+@declare_ops(ops=[TOK_EQUAL])
 def simp_cmp_int(expr_simp, expr):
     """
     ({X, 0} == int) => X == int[:]
@@ -1076,6 +1084,7 @@ def simp_cmp_int_arg(_, expr):
 
 
 
+@declare_ops(ops=[TOK_EQUAL])
 def simp_cmp_bijective_op(expr_simp, expr):
     """
     A + B == A => A == 0
@@ -1152,6 +1161,7 @@ def simp_cmp_bijective_op(expr_simp, expr):
     return ExprOp(TOK_EQUAL, arg_a, arg_b)
 
 
+@declare_ops(ops=["FLAG_SUBWC_CF"])
 def simp_subwc_cf(_, expr):
     """SUBWC_CF(A, B, SUB_CF(C, D)) => SUB_CF({A, C}, {B, D})"""
     if not expr.is_op('FLAG_SUBWC_CF'):
@@ -1166,6 +1176,7 @@ def simp_subwc_cf(_, expr):
     return ExprOp("FLAG_SUB_CF", op1, op2)
 
 
+@declare_ops(ops=["FLAG_SUBWC_OF"])
 def simp_subwc_of(_, expr):
     """SUBWC_OF(A, B, SUB_CF(C, D)) => SUB_OF({A, C}, {B, D})"""
     if not expr.is_op('FLAG_SUBWC_OF'):
@@ -1180,6 +1191,7 @@ def simp_subwc_of(_, expr):
     return ExprOp("FLAG_SUB_OF", op1, op2)
 
 
+@declare_ops(ops=["FLAG_SIGN_SUBWC"])
 def simp_sign_subwc_cf(_, expr):
     """SIGN_SUBWC(A, B, SUB_CF(C, D)) => SIGN_SUB({A, C}, {B, D})"""
     if not expr.is_op('FLAG_SIGN_SUBWC'):
@@ -1193,6 +1205,7 @@ def simp_sign_subwc_cf(_, expr):
 
     return ExprOp("FLAG_SIGN_SUB", op1, op2)
 
+@declare_ops(prefixes=["zeroExt"])
 def simp_double_zeroext(_, expr):
     """A.zeroExt(X).zeroExt(Y) => A.zeroExt(Y)"""
     if not (expr.is_op() and expr.op.startswith("zeroExt")):
@@ -1203,6 +1216,7 @@ def simp_double_zeroext(_, expr):
     arg2 = arg1.args[0]
     return ExprOp(expr.op, arg2)
 
+@declare_ops(prefixes=["signExt"])
 def simp_double_signext(_, expr):
     """A.signExt(X).signExt(Y) => A.signExt(Y)"""
     if not (expr.is_op() and expr.op.startswith("signExt")):
@@ -1213,6 +1227,7 @@ def simp_double_signext(_, expr):
     arg2 = arg1.args[0]
     return ExprOp(expr.op, arg2)
 
+@declare_ops(ops=[TOK_EQUAL])
 def simp_zeroext_eq_cst(_, expr):
     """A.zeroExt(X) == int => A == int[:A.size]"""
     if not expr.is_op(TOK_EQUAL):
@@ -1245,6 +1260,7 @@ def simp_cond_zeroext(_, expr):
     ret = ExprCond(expr.cond.args[0], expr.src1, expr.src2)
     return ret
 
+@declare_ops(ops=[TOK_EQUAL])
 def simp_ext_eq_ext(_, expr):
     """
     A.zeroExt(X) == B.zeroExt(X) => A == B
@@ -1273,6 +1289,7 @@ def simp_cond_eq_zero(_, expr):
     new_expr = ExprCond(arg1, expr.src2, expr.src1)
     return new_expr
 
+@declare_ops(ops=[TOK_INF_SIGNED, TOK_INF_EQUAL_SIGNED])
 def simp_sign_inf_zeroext(expr_s, expr):
     """
     /!\ Ensure before: X.zeroExt(X.size) => X
@@ -1319,6 +1336,7 @@ def simp_sign_inf_zeroext(expr_s, expr):
     return ExprOp(TOK_INF_EQUAL_UNSIGNED, src, expr_s(arg2[:src.size]))
 
 
+@declare_ops(ops=[TOK_EQUAL])
 def simp_zeroext_and_cst_eq_cst(expr_s, expr):
     """
     A.zeroExt(X) & ... & int == int => A & ... & int[:A.size] == int[:A.size]
@@ -1381,6 +1399,11 @@ def simp_x_and_cst_eq_cst(_, expr):
     cond = ExprOp('&', *arg1.args)
     return ExprCond(cond, expr.src1, expr.src2)
 
+@declare_ops(ops=[
+    TOK_EQUAL,
+    TOK_INF_SIGNED, TOK_INF_UNSIGNED,
+    TOK_INF_EQUAL_SIGNED, TOK_INF_EQUAL_UNSIGNED,
+])
 def simp_cmp_int_int(_, expr):
     """
     IntA <s IntB => int
@@ -1422,6 +1445,7 @@ def simp_cmp_int_int(_, expr):
     return ExprInt(ret, 1)
 
 
+@declare_ops(prefixes=["zeroExt", "signExt"])
 def simp_ext_cst(_, expr):
     """
     Int.zeroExt(X) => Int
@@ -1441,6 +1465,7 @@ def simp_ext_cst(_, expr):
 
 
 
+@declare_ops(prefixes=["zeroExt", "signExt"])
 def simp_ext_cond_int(e_s, expr):
     """
     zeroExt(ExprCond(X, Int, Int)) => ExprCond(X, Int, Int)
@@ -1615,6 +1640,7 @@ def simp_cond_eq_1_0(expr_s, expr):
     return cond
 
 
+@declare_ops(ops=[TOK_INF_EQUAL_UNSIGNED])
 def simp_cond_inf_eq_unsigned_zero(expr_s, expr):
     """
     (a <=u 0) => a == 0
@@ -1626,6 +1652,7 @@ def simp_cond_inf_eq_unsigned_zero(expr_s, expr):
     return ExprOp(TOK_EQUAL, expr.args[0], expr.args[1])
 
 
+@declare_ops(ops=[TOK_INF_SIGNED, TOK_INF_EQUAL_SIGNED])
 def simp_test_signext_inf(expr_s, expr):
     """A.signExt() <s int => A <s int[:]"""
     if not (expr.is_op(TOK_INF_SIGNED) or expr.is_op(TOK_INF_EQUAL_SIGNED)):
@@ -1646,6 +1673,7 @@ def simp_test_signext_inf(expr_s, expr):
     return expr
 
 
+@declare_ops(ops=[TOK_INF_UNSIGNED, TOK_INF_EQUAL_UNSIGNED])
 def simp_test_zeroext_inf(expr_s, expr):
     """A.zeroExt() <u int => A <u int[:]"""
     if not (expr.is_op(TOK_INF_UNSIGNED) or expr.is_op(TOK_INF_EQUAL_UNSIGNED)):
@@ -1665,6 +1693,7 @@ def simp_test_zeroext_inf(expr_s, expr):
     return expr
 
 
+@declare_ops(ops=["+"])
 def simp_add_multiple(_, expr):
     """
     X + X => 2 * X
@@ -1736,6 +1765,7 @@ def simp_add_multiple(_, expr):
         return out[0]
     return ExprOp('+', *out)
 
+@declare_ops(ops=["&"], min_args=2, max_args=2)
 def simp_compose_and_mask(_, expr):
     """
     {X 0 8, Y 8 32} & 0xFF => zeroExt(X)
@@ -1767,6 +1797,7 @@ def simp_compose_and_mask(_, expr):
             out.append(arg)
     return expr
 
+@declare_ops(ops=["bcdadd_cf"])
 def simp_bcdadd_cf(_, expr):
     """bcdadd(const, const) => decimal"""
     if not(expr.is_op('bcdadd_cf')):
@@ -1792,6 +1823,7 @@ def simp_bcdadd_cf(_, expr):
             carry = 0
     return ExprInt(carry, 1)
 
+@declare_ops(ops=["bcdadd"])
 def simp_bcdadd(_, expr):
     """bcdadd(const, const) => decimal"""
     if not(expr.is_op('bcdadd')):
@@ -1819,6 +1851,7 @@ def simp_bcdadd(_, expr):
     return ExprInt(res, arg1.size)
 
 
+@declare_ops(ops=["smod"])
 def simp_smod_sext(expr_s, expr):
     """
     a.size == b.size
@@ -1852,6 +1885,14 @@ def simp_smod_sext(expr_s, expr):
     return expr
 
 # FLAG_SUB_OF(CST1, CST2) => CST
+@declare_ops(ops=[
+    "FLAG_EQ", "FLAG_EQ_AND", "FLAG_SIGN_SUB", "FLAG_EQ_CMP", "FLAG_ADD_CF",
+    "FLAG_SUB_CF", "FLAG_ADD_OF", "FLAG_SUB_OF", "FLAG_EQ_ADDWC", "FLAG_ADDWC_OF",
+    "FLAG_SUBWC_OF", "FLAG_ADDWC_CF", "FLAG_SUBWC_CF", "FLAG_SIGN_ADDWC",
+    "FLAG_SIGN_SUBWC", "FLAG_EQ_SUBWC",
+    "CC_U<=", "CC_U>=", "CC_S<", "CC_S>", "CC_S<=", "CC_S>=", "CC_U>",
+    "CC_U<", "CC_NEG", "CC_EQ", "CC_NE", "CC_POS"
+])
 def simp_flag_cst(expr_simp, expr):
     if expr.op not in [
             "FLAG_EQ", "FLAG_EQ_AND", "FLAG_SIGN_SUB", "FLAG_EQ_CMP", "FLAG_ADD_CF",
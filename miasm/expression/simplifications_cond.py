@@ -15,6 +15,7 @@
 ################################################################################
 
 import miasm.expression.expression as m2_expr
+from miasm.expression.expression_helper import declare_ops
 
 
 # Jokers for expression matching
@@ -123,6 +124,7 @@ def expr_simp_inf_unsigned_inversed(expr_simp, e):
     else:
         return e
 
+@declare_ops(ops=["^"], min_args=2, max_args=2)
 def expr_simp_inverse(expr_simp, e):
     """(x <u y) ^ ((x ^ y) [31:32]) == x <s y,
     (x <s y) ^ ((x ^ y) [31:32]) == x <u y"""
@@ -1,8 +1,10 @@
 from miasm.core.utils import size2mask
 from miasm.expression.expression import ExprInt, ExprCond, ExprCompose, \
     TOK_EQUAL
+from miasm.expression.expression_helper import declare_ops
 
 
+@declare_ops(prefixes=["zeroExt_", "signExt_"])
 def simp_ext(_, expr):
     if expr.op.startswith('zeroExt_'):
         arg = expr.args[0]
@@ -25,6 +27,14 @@ def simp_ext(_, expr):
     return expr
 
 
+@declare_ops(ops=[
+    "FLAG_EQ", "FLAG_EQ_AND", "FLAG_SIGN_SUB", "FLAG_EQ_CMP", "FLAG_ADD_CF",
+    "FLAG_SUB_CF", "FLAG_ADD_OF", "FLAG_SUB_OF", "FLAG_EQ_ADDWC", "FLAG_ADDWC_OF",
+    "FLAG_SUBWC_OF", "FLAG_ADDWC_CF", "FLAG_SUBWC_CF", "FLAG_SIGN_ADDWC",
+    "FLAG_SIGN_SUBWC", "FLAG_EQ_SUBWC",
+    "CC_U<=", "CC_U>=", "CC_S<", "CC_S>", "CC_S<=", "CC_S>=", "CC_U>",
+    "CC_U<", "CC_NEG", "CC_EQ", "CC_NE", "CC_POS"
+])
 def simp_flags(_, expr):
     args = expr.args
 
@@ -18,14 +18,22 @@
 # 51 Franklin Street, Fifth Floor, Boston, MA 02110-1301 USA.
 #
 from builtins import zip
+import multiprocessing
+import os
+import pickle
+import traceback
 import warnings
 
 from itertools import chain
-from future.utils import viewvalues, viewitems
+from future.utils import viewvalues, viewitems, PY3
+from future.moves.queue import Queue
 
 import miasm.expression.expression as m2_expr
 from miasm.expression.expression_helper import get_missing_interval
+from miasm.expression.expression_serialize import ExprSerializer, \
+    ExprDeserializer
 from miasm.core.asmblock import AsmBlock, AsmBlockBad, AsmConstraint
+from miasm.core.cpu import additional_info_key
 from miasm.core.graph import DiGraph
 from miasm.ir.translators import Translator
 from functools import reduce
@@ -181,8 +189,11 @@ class AssignBlock(object):
 
     Also provides common manipulation on this assignments.
 
+    Destinations and sources are stored in two tuples, in the same order, which
+    is more compact than a dictionary. As blocks have few assignments and
+    expressions are compared by identity, lookups stay cheap.
     """
-    __slots__ = ["_assigns", "_instr"]
+    __slots__ = ["_dsts", "_srcs", "_instr"]
 
     def __init__(self, irs=None, instr=None):
         """Create a new AssignBlock
@@ -194,23 +205,43 @@ class AssignBlock(object):
         if irs is None:
             irs = []
         self._instr = instr
-        self._assigns = {} # ExprAssign.dst -> ExprAssign.src
+        assigns = {} # ExprAssign.dst -> ExprAssign.src
 
         # Concurrent assignments are handled in _set
         if hasattr(irs, "items"):
             for dst, src in viewitems(irs):
-                self._set(dst, src)
+                self._set(assigns, dst, src)
         else:
             for expraff in irs:
-                self._set(expraff.dst, expraff.src)
+                self._set(assigns, expraff.dst, expraff.src)
+        self._dsts = tuple(assigns)
+        self._srcs = tuple(viewvalues(assigns))
+
+    @classmethod
+    def from_trusted(cls, irs, instr=None):
+        """Create a new AssignBlock from well-formed assignments, without
+        checking them
+        @irs: dictionary dst (ExprId or ExprMem) -> src (Expr of the same size)
+        @instr: (optional) associate an instruction with this AssignBlock
+
+        To be used by passes building assignments from the ones of existing
+        AssignBlocks, which are already checked and merged.
+        """
+        assignblk = cls.__new__(cls)
+        assignblk._instr = instr
+        assignblk._dsts = tuple(irs)
+        assignblk._srcs = tuple(viewvalues(irs))
+        return assignblk
 
     @property
     def instr(self):
         """Return the associated instruction, if any"""
         return self._instr
 
-    def _set(self, dst, src):
+    @staticmethod
+    def _set(assigns, dst, src):
         """
+        Add the assignment @dst = @src to the dictionary @assigns
         Special cases:
         * if dst is an ExprSlice, expand it to assign the full Expression
         * if dst already known, sources are merged
@@ -232,8 +263,8 @@ class AssignBlock(object):
         else:
             new_dst, new_src = dst, src
 
-        if new_dst in self._assigns and isinstance(new_src, m2_expr.ExprCompose):
-            if not isinstance(self[new_dst], m2_expr.ExprCompose):
+        if new_dst in assigns and isinstance(new_src, m2_expr.ExprCompose):
+            if not isinstance(assigns[new_dst], m2_expr.ExprCompose):
                 # prev_RAX = 0x1122334455667788
                 # input_RAX[0:8] = 0x89
                 # final_RAX -> ? (assignment are in parallel)
@@ -241,10 +272,10 @@ class AssignBlock(object):
 
             # Consider slice grouping
             expr_list = [(new_dst, new_src),
-                         (new_dst, self[new_dst])]
+                         (new_dst, assigns[new_dst])]
             # Find collision
             e_colision = reduce(lambda x, y: x.union(y),
-                                (self.get_modified_slice(dst, src)
+                                (AssignBlock.get_modified_slice(dst, src)
                                  for (dst, src) in expr_list),
                                 set())
 
@@ -275,37 +306,37 @@ class AssignBlock(object):
         if not isinstance(new_dst, (m2_expr.ExprId, m2_expr.ExprMem)):
             raise TypeError("Destination cannot be a %s" % type(new_dst))
 
-        self._assigns[new_dst] = new_src
+        assigns[new_dst] = new_src
 
     def __setitem__(self, dst, src):
         raise RuntimeError('AssignBlock is immutable')
 
     def __getitem__(self, key):
-        return self._assigns[key]
+        try:
+            return self._srcs[self._dsts.index(key)]
+        except ValueError:
+            raise KeyError(key)
 
     def __contains__(self, key):
-        return key in self._assigns
+        return key in self._dsts
 
     def iteritems(self):
-        for dst, src in viewitems(self._assigns):
-            yield dst, src
+        return zip(self._dsts, self._srcs)
 
     def items(self):
-        return [(dst, src) for dst, src in viewitems(self._assigns)]
+        return list(zip(self._dsts, self._srcs))
 
     def itervalues(self):
-        for src in viewvalues(self._assigns):
-            yield src
+        return iter(self._srcs)
 
     def keys(self):
-        return list(self._assigns)
+        return list(self._dsts)
 
     def values(self):
-        return list(viewvalues(self._assigns))
+        return list(self._srcs)
 
     def __iter__(self):
-        for dst in self._assigns:
-            yield dst
+        return iter(self._dsts)
 
     def __delitem__(self, _):
         raise RuntimeError('AssignBlock is immutable')
@@ -322,10 +353,12 @@ class AssignBlock(object):
         return not self == other
 
     def __len__(self):
-        return len(self._assigns)
+        return len(self._dsts)
 
     def get(self, key, default):
-        return self._assigns.get(key, default)
+        if key in self._dsts:
+            return self._srcs[self._dsts.index(key)]
+        return default
 
     @staticmethod
     def get_modified_slice(dst, src):
@@ -381,7 +414,7 @@ class AssignBlock(object):
 
     def __str__(self):
         out = []
-        for dst, src in sorted(viewitems(self._assigns)):
+        for dst, src in sorted(zip(self._dsts, self._srcs)):
             out.append("%s = %s" % (dst, src))
         return "\n".join(out)
 
@@ -392,18 +425,25 @@ class AssignBlock(object):
 
     def simplify(self, simplifier):
         """
-        Return a new AssignBlock with expression simplified
+        Return a new AssignBlock with expression simplified, or the current
+        one if it is unchanged
 
         @simplifier: ExpressionSimplifier instance
         """
         new_assignblk = {}
-        for dst, src in viewitems(self):
+        modified = False
+        for dst, src in zip(self._dsts, self._srcs):
             if dst == src:
+                modified = True
                 continue
             new_src = simplifier(src)
             new_dst = simplifier(dst)
+            if new_src != src or new_dst != dst:
+                modified = True
             new_assignblk[new_dst] = new_src
-        return AssignBlock(irs=new_assignblk, instr=self.instr)
+        if not modified and len(new_assignblk) == len(self._dsts):
+            return self
+        return AssignBlock.from_trusted(new_assignblk, self.instr)
 
     def to_string(self, loc_db=None):
         out = []
@@ -438,6 +478,21 @@ class IRBlock(object):
         self._dst = None
         self._dst_linenb = None
 
+    @classmethod
+    def from_trusted(cls, loc_db, loc_key, assignblks):
+        """Create a new IRBlock, without checking its arguments
+        @loc_db: LocationDB instance
+        @loc_key: LocKey of the IR basic block
+        @assignblks: tuple of AssignBlock
+        """
+        irblock = cls.__new__(cls)
+        irblock._loc_key = loc_key
+        irblock._loc_db = loc_db
+        irblock._assignblks = assignblks
+        irblock._dst = None
+        irblock._dst_linenb = None
+        return irblock
+
     def __eq__(self, other):
         if self.__class__ is not other.__class__:
             return False
@@ -571,16 +626,22 @@ class IRBlock(object):
     def simplify(self, simplifier):
         """
         Simplify expressions in each assignblock
+        Return the modification status, and the new IRBlock (the current one
+        if it is unchanged)
         @simplifier: ExpressionSimplifier instance
         """
         modified = False
         assignblks = []
         for assignblk in self:
             new_assignblk = assignblk.simplify(simplifier)
-            if assignblk != new_assignblk:
+            if assignblk is not new_assignblk:
                 modified = True
             assignblks.append(new_assignblk)
-        return modified, IRBlock(self.loc_db, self.loc_key, assignblks)
+        if not modified:
+            return False, self
+        return True, IRBlock.from_trusted(
+            self.loc_db, self.loc_key, tuple(assignblks)
+        )
 
 
 class irbloc(IRBlock):
@@ -742,20 +803,25 @@ class IRCFG(DiGraph):
         return out
 
 
-    def simplify(self, simplifier):
+    def simplify(self, simplifier, loc_keys=None):
         """
         Simplify expressions in each irblocks
+        Return True if at least an irblock has been modified
         @simplifier: ExpressionSimplifier instance
+        @loc_keys: (optional) LocKeys of the irblocks to simplify (default:
+        all)
         """
         modified = False
-        for loc_key, block in list(viewitems(self.blocks)):
-            assignblks = []
-            for assignblk in block:
-                new_assignblk = assignblk.simplify(simplifier)
-                if assignblk != new_assignblk:
-                    modified = True
-                assignblks.append(new_assignblk)
-            self.blocks[loc_key] = IRBlock(self.loc_db, loc_key, assignblks)
+        if loc_keys is None:
+            loc_keys = list(self.blocks)
+        for loc_key in loc_keys:
+            block = self.blocks.get(loc_key)
+            if block is None:
+                continue
+            block_modified, new_block = block.simplify(simplifier)
+            if block_modified:
+                modified = True
+                self.blocks[loc_key] = new_block
         return modified
 
     def _extract_dst(self, todo, done):
@@ -815,6 +881,221 @@ class DiGraphIR(IRCFG):
         raise NotImplementedError("Deprecated")
 
 
+# Lifter and blocks of a lifting worker process
+_lift_worker_state = None
+
+
+def _lift_worker_init(lifter, blocks):
+    """Initialize a lifting worker process with a copy of @lifter and of the
+    @blocks to lift"""
+    global _lift_worker_state
+    _lift_worker_state = (lifter, blocks)
+
+
+def _lift_worker_lift(job):
+    """Lift the worker blocks in the range @job (start, stop)
+    Return the tuple (error, result)"""
+    try:
+        lifter, blocks = _lift_worker_state
+        start, stop = job
+        locations, data = lifter._lift_blocks(blocks[start:stop])
+        return False, (start, locations, data)
+    except Exception:
+        return True, traceback.format_exc()
+
+
+class _NotTemplatable(Exception):
+    """Two liftings of an instruction do not only differ by its offset"""
+
+
+class _LiftTemplate(object):
+    """IR of an instruction, in which the expressions depending on the
+    instruction offset are replaced by placeholders.
+
+    The template is built by comparing the lifting of the instruction with the
+    lifting of the same instruction at another offset (the probe). Differing
+    expressions must be:
+    - integers, shifted by the offsets difference (ex: return address, PC
+      relative address);
+    - locations of offsets shifted by the offsets difference (ex: next
+      instruction);
+    - locations without offset nor name, created by the lifting (ex: internal
+      loops of x86 string instructions).
+    """
+
+    INT, OFFSET, FRESH = range(3)
+    KIND_NAMES = ["int", "offset", "fresh"]
+
+    def __init__(self, loc_db, offset, delta):
+        """
+        @loc_db: LocationDB instance
+        @offset: offset of the lifted instruction
+        @delta: offset of the probe - @offset
+        """
+        self.loc_db = loc_db
+        self.offset = offset
+        self.delta = delta
+        # placeholder (ExprId) -> (kind, value)
+        self.placeholders = {}
+        self._fresh = {}
+        self._fresh_probe = {}
+        # Instruction AssignBlock: list of (dst, src, depends on offset)
+        self.assignblk = None
+        # Additional IRBlocks: list of (ExprLoc of the block, list of
+        # AssignBlock)
+        self.extra = None
+        # Instruction arguments and additional information modified by the
+        # lifting
+        self.args = None
+        self.info = None
+
+    def _placeholder(self, kind, value, size):
+        expr = m2_expr.ExprId(
+            "lift_%s_%d" % (self.KIND_NAMES[kind], value), size
+        )
+        self.placeholders[expr] = (kind, value)
+        return expr
+
+    def _loc(self, expr1, expr2):
+        loc_key1, loc_key2 = expr1.loc_key, expr2.loc_key
+        offset1 = self.loc_db.get_location_offset(loc_key1)
+        offset2 = self.loc_db.get_location_offset(loc_key2)
+        if offset1 is not None and offset2 is not None:
+            if offset2 - offset1 != self.delta:
+                raise _NotTemplatable()
+            return self._placeholder(
+                self.OFFSET, offset1 - self.offset, expr1.size
+            )
+        if (offset1 is not None or offset2 is not None or
+                self.loc_db.get_location_names(loc_key1) or
+                self.loc_db.get_location_names(loc_key2)):
+            raise _NotTemplatable()
+        index = self._fresh.setdefault(loc_key1, len(self._fresh))
+        if self._fresh_probe.setdefault(loc_key2, index) != index:
+            raise _NotTemplatable()
+        return self._placeholder(self.FRESH, index, expr1.size)
+
+    def expr(self, expr1, expr2):
+        """Return the template of @expr1, lifted at the instruction offset, by
+        comparison with @expr2, lifted at the probe offset"""
+        if expr1 == expr2:
+            return expr1
+        if expr1.__class__ is not expr2.__class__ or expr1.size != expr2.size:
+            raise _NotTemplatable()
+        if expr1.is_int():
+            mask = (1 << expr1.size) - 1
+            if (int(expr2) - int(expr1)) & mask != self.delta & mask:
+                raise _NotTemplatable()
+            return self._placeholder(
+                self.INT, (int(expr1) - self.offset) & mask, expr1.size
+            )
+        if expr1.is_loc():
+            return self._loc(expr1, expr2)
+        if expr1.is_mem():
+            return m2_expr.ExprMem(self.expr(expr1.ptr, expr2.ptr), expr1.size)
+        if expr1.is_slice():
+            if (expr1.start, expr1.stop) != (expr2.start, expr2.stop):
+                raise _NotTemplatable()
+            return m2_expr.ExprSlice(
+                self.expr(expr1.arg, expr2.arg), expr1.start, expr1.stop
+            )
+        if expr1.is_cond():
+            return m2_expr.ExprCond(
+                self.expr(expr1.cond, expr2.cond),
+                self.expr(expr1.src1, expr2.src1),
+                self.expr(expr1.src2, expr2.src2),
+            )
+        if expr1.is_op():
+            if expr1.op != expr2.op or len(expr1.args) != len(expr2.args):
+                raise _NotTemplatable()
+            return m2_expr.ExprOp(expr1.op, *[
+                self.expr(arg1, arg2)
+                for arg1, arg2 in zip(expr1.args, expr2.args)
+            ])
+        if expr1.is_compose():
+            if len(expr1.args) != len(expr2.args):
+                raise _NotTemplatable()
+            return m2_expr.ExprCompose(*[
+                self.expr(arg1, arg2)
+                for arg1, arg2 in zip(expr1.args, expr2.args)
+            ])
+        # ExprId
+        raise _NotTemplatable()
+
+    def _assignblk(self, assignblk1, assignblk2):
+        if len(assignblk1) != len(assignblk2):
+            raise _NotTemplatable()
+        out = []
+        for (dst1, src1), (dst2, src2) in zip(viewitems(assignblk1),
+                                              viewitems(assignblk2)):
+            dst, src = self.expr(dst1, dst2), self.expr(src1, src2)
+            out.append((dst, src, dst != dst1 or src != src1))
+        return out
+
+    def build(self, result, probe_result):
+        """Build the template from the lifting @result of the instruction and
+        the lifting @probe_result of its probe (see Lifter.instr2ir)"""
+        (assignblk1, extra1), (assignblk2, extra2) = result, probe_result
+        self.assignblk = self._assignblk(assignblk1, assignblk2)
+        if len(extra1) != len(extra2):
+            raise _NotTemplatable()
+        self.extra = []
+        for irblock1, irblock2 in zip(extra1, extra2):
+            if len(irblock1) != len(irblock2):
+                raise _NotTemplatable()
+            loc = self.expr(
+                m2_expr.ExprLoc(irblock1.loc_key, 32),
+                m2_expr.ExprLoc(irblock2.loc_key, 32)
+            )
+            self.extra.append((loc, [
+                self._assignblk(assignblk1, assignblk2)
+                for assignblk1, assignblk2 in zip(irblock1, irblock2)
+            ]))
+
+    def instantiate(self, instr):
+        """Return the lifting of @instr (same as Lifter.instr2ir)"""
+        loc_db = self.loc_db
+        offset = instr.offset
+        replace = {}
+        fresh = {}
+        for expr, (kind, value) in viewitems(self.placeholders):
+            if kind == self.INT:
+                replace[expr] = m2_expr.ExprInt(
+                    (offset + value) & ((1 << expr.size) - 1), expr.size
+                )
+                continue
+            if kind == self.OFFSET:
+                loc_key = loc_db.get_or_create_offset_location(offset + value)
+            else:
+                loc_key = fresh.get(value)
+                if loc_key is None:
+                    loc_key = loc_db.add_location()
+                    fresh[value] = loc_key
+            replace[expr] = m2_expr.ExprLoc(loc_key, expr.size)
+
+        def assignblk(items):
+            assignments = {}
+            for dst, src, dynamic in items:
+                if dynamic:
+                    dst = dst.replace_expr(replace)
+                    src = src.replace_expr(replace)
+                assignments[dst] = src
+            return AssignBlock.from_trusted(assignments, instr)
+
+        extra = []
+        for loc, assignblks in self.extra:
+            loc = replace.get(loc, loc)
+            extra.append(IRBlock(loc_db, loc.loc_key, [
+                assignblk(items) for items in assignblks
+            ]))
+        if self.args is not None:
+            instr.args[:] = self.args
+        if self.info:
+            for name, value in viewitems(self.info):
+                setattr(instr.additional_info, name, value)
+        return assignblk(self.assignblk), extra
+
+
 class Lifter(object):
     """
     Intermediate representation object
@@ -822,6 +1103,11 @@ class Lifter(object):
     Allow native assembly to intermediate representation traduction
     """
 
+    # Offset difference between an instruction and its probe when building the
+    # lifting cache templates. Changes high bits of the offset, while keeping
+    # its alignment
+    lift_cache_delta = 0x12345000
+
     def __init__(self, arch, attrib, loc_db):
         self.pc = arch.getpc(attrib)
         self.sp = arch.getsp(attrib)
@@ -829,6 +1115,8 @@ class Lifter(object):
         self.attrib = attrib
         self.loc_db = loc_db
         self.IRDst = None
+        # Instructions liftings cache (LRUCache). See enable_lift_cache
+        self.lift_cache = None
 
     def get_ir(self, instr):
         raise NotImplementedError("Abstract Method")
@@ -843,14 +1131,352 @@ class Lifter(object):
         """
         Return a new instance of IRCFG from an @asmcfg
         @asmcfg: AsmCFG instance
+        @processes: (optional) number of worker processes lifting the blocks
+        @blocks_per_job: (optional) number of blocks lifted by a worker
+        process job (default: 64)
+
+        Other arguments are given to the IRCFG constructor.
+
+        Using worker processes, blocks are lifted in batches by the workers,
+        in a copy of the LocationDB. The LocKeys created by the lifting of each
+        batch are then created in the same order in the LocationDB, and the
+        IRBlocks are added to the IRCFG in the blocks order: the resulting
+        IRCFG and LocationDB are the same as with a single process lifting
+        (unless the lifting cache is enabled, as its templates creation
+        discards some LocKeys). Workers are forked: without fork, the blocks
+        are lifted in one process.
         """
-
+        processes = kwargs.pop("processes", None)
+        blocks_per_job = kwargs.pop("blocks_per_job", 64)
         ircfg = IRCFG(self.IRDst, self.loc_db, *args, **kwargs)
-        for block in asmcfg.blocks:
+        blocks = list(asmcfg.blocks)
+        if (processes and processes > 1 and len(blocks) > blocks_per_job and
+                self._lift_parallel(blocks, ircfg, processes, blocks_per_job)):
+            return ircfg
+        for block in blocks:
             self.add_asmblock_to_ircfg(block, ircfg)
         return ircfg
 
+    def _lift_parallel(self, blocks, ircfg, processes, blocks_per_job):
+        """Add the @blocks to @ircfg, lifted by @processes worker processes by
+        batches of @blocks_per_job blocks
+
+        Workers inherit the lifter and the blocks by forking: without fork,
+        nothing is lifted (return False).
+        """
+        if not hasattr(os, "fork"):
+            warnings.warn(
+                "Worker processes need fork, lifting in one process"
+            )
+            return False
+        try:
+            context = multiprocessing.get_context("fork")
+        except AttributeError:
+            # Python 2: always forks
+            context = multiprocessing
+        results = Queue()
+        if PY3:
+            error_callback = {
+                "error_callback":
+                lambda error: results.put((True, repr(error)))
+            }
+        else:
+            # Python 2 pools report errors through results only
+            error_callback = {}
+        pool = context.Pool(
+            processes,
+            initializer=_lift_worker_init,
+            initargs=(self, blocks)
+        )
+        try:
+            starts = list(range(0, len(blocks), blocks_per_job))
+            for start in starts:
+                pool.apply_async(
+                    _lift_worker_lift,
+                    ((start, min(start + blocks_per_job, len(blocks))),),
+                    callback=results.put,
+                    # Pool failures (unpicklable result, ...)
+                    **error_callback
+                )
+            # Results are merged in the blocks order
+            lifted = {}
+            for start in starts:
+                while start not in lifted:
+                    error, result = results.get()
+                    if error:
+                        raise RuntimeError(
+                            "Lifting worker failed:\n%s" % result
+                        )
+                    lifted[result[0]] = result[1:]
+                locations, data = lifted.pop(start)
+                self._merge_lifted_blocks(
+                    blocks[start:start + len(locations)],
+                    locations, data, ircfg
+                )
+        finally:
+            pool.terminate()
+            pool.join()
+        return True
+
+    def _lift_blocks(self, blocks):
+        """Lift @blocks in a scratch IRCFG (worker side of _lift_parallel)
+        Return the LocKeys created by the lifting of each block, as a list
+        (by block) of lists of (key, offset, names), and the serialized IR
+        blocks and instructions updates"""
+        from miasm.ir.serialize import write_assignblk
+
+        loc_db = self.loc_db
+        ircfg = self.new_ircfg()
+        serializer = ExprSerializer()
+        locations = []
+        for block in blocks:
+            # LocKeys created by the lifting are the ones after the marker
+            marker = loc_db.add_location()
+            loc_db.remove_location(marker)
+            states = []
+            for instr in block.lines:
+                info = instr.additional_info
+                states.append((
+                    list(instr.args),
+                    dict(vars(info)) if info is not None else None
+                ))
+
+            irblocks = self.add_asmblock_to_ircfg(block, ircfg)
+
+            marker_end = loc_db.add_location()
+            loc_db.remove_location(marker_end)
+            created = []
+            for key in range(marker.key + 1, marker_end.key):
+                loc_key = m2_expr.LocKey(key)
+                if loc_key in loc_db.loc_keys:
+                    created.append((
+                        key,
+                        loc_db.get_location_offset(loc_key),
+                        sorted(loc_db.get_location_names(loc_key))
+                    ))
+            locations.append(created)
+
+            instr_indexes = dict(
+                (id(instr), index) for index, instr in enumerate(block.lines)
+            )
+            serializer.write_uint(len(irblocks))
+            for irblock in irblocks:
+                serializer.write_loc_key(irblock.loc_key)
+                serializer.write_uint(len(irblock))
+                for assignblk in irblock:
+                    index = instr_indexes.get(id(assignblk.instr))
+                    serializer.write_uint(0 if index is None else index + 1)
+                    write_assignblk(serializer, assignblk)
+
+            # Instructions modified by the lifting
+            updates = []
+            for index, instr in enumerate(block.lines):
+                args, info_items = states[index]
+                info = instr.additional_info
+                changes = {}
+                if info_items is not None:
+                    changes = dict(
+                        (name, value) for name, value in viewitems(vars(info))
+                        if name not in info_items or
+                        info_items[name] is not value
+                    )
+                if instr.args != args or changes:
+                    updates.append((index, instr.args, changes))
+            serializer.write_uint(len(updates))
+            for index, args, changes in updates:
+                serializer.write_uint(index)
+                serializer.write_uint(len(args))
+                for arg in args:
+                    serializer.write_expr(arg)
+                serializer.write_bytes(
+                    pickle.dumps(changes, pickle.HIGHEST_PROTOCOL)
+                )
+        return locations, serializer.get_bytes()
+
+    def _merge_lifted_blocks(self, blocks, locations, data, ircfg):
+        """Add to @ircfg the lifting of @blocks by _lift_blocks
+        @locations, @data: _lift_blocks results"""
+        from miasm.ir.serialize import read_assignblk
+
+        # Create the LocKeys, in the order of a single process lifting
+        loc_db = self.loc_db
+        loc_keys = {}
+        for created in locations:
+            for key, offset, names in created:
+                if offset is not None:
+                    loc_key = loc_db.get_or_create_offset_location(offset)
+                else:
+                    loc_key = loc_db.add_location()
+                for name in names:
+                    if loc_db.get_name_location(name) is None:
+                        loc_db.add_location_name(loc_key, name)
+                loc_keys[key] = loc_key
+
+        def loc_key_map(key):
+            # LocKeys not created by the worker existed before its start
+            loc_key = loc_keys.get(key)
+            if loc_key is None:
+                loc_key = m2_expr.LocKey(key)
+            return loc_key
+
+        deserializer = ExprDeserializer(data, loc_key_map)
+        for block in blocks:
+            for _ in range(deserializer.read_uint()):
+                loc_key = deserializer.read_loc_key()
+                assignblks = []
+                for _ in range(deserializer.read_uint()):
+                    index = deserializer.read_uint()
+                    instr = block.lines[index - 1] if index else None
+                    assignblks.append(read_assignblk(deserializer, instr))
+                ircfg.add_irblock(IRBlock(loc_db, loc_key, assignblks))
+            for _ in range(deserializer.read_uint()):
+                instr = block.lines[deserializer.read_uint()]
+                instr.args = [
+                    deserializer.read_expr()
+                    for _ in range(deserializer.read_uint())
+                ]
+                changes = pickle.loads(deserializer.read_bytes())
+                for name, value in viewitems(changes):
+                    setattr(instr.additional_info, name, value)
+
+    def enable_lift_cache(self, max_size=10000):
+        """Cache the lifting of the instructions, see instr2ir
+        Return the LRUCache instance, whose stats() method gives the cache
+        hit rate
+        @max_size: maximum number of instructions liftings kept in the cache
+        """
+        self.lift_cache = utils.LRUCache(max_size)
+        return self.lift_cache
+
+    def disable_lift_cache(self):
+        """Stop caching the lifting of the instructions"""
+        self.lift_cache = None
+
+    def lift_cache_key(self, instr):
+        """Return the key identifying the lifting of @instr in the lifting
+        cache, or None if it cannot be cached.
+
+        The lifting only depends on the instruction name, mode, length,
+        arguments and additional information, apart from its offset (which is
+        handled by the cache templates). Destinations arguments are taken
+        relatively to the instruction offset. Lifters whose semantic depends
+        on other settings must add them to the key.
+
+        @instr: instruction instance
+        """
+        args = []
+        for arg in instr.args:
+            if arg.is_loc():
+                offset = self.loc_db.get_location_offset(arg.loc_key)
+                if offset is not None:
+                    arg = ("rel", offset - instr.offset, arg.size)
+            args.append(arg)
+        try:
+            key = (self.__class__, self.attrib, instr.name, instr.mode,
+                   instr.l, tuple(args),
+                   additional_info_key(instr.additional_info))
+            hash(key)
+        except TypeError:
+            # Unhashable arguments or additional information
+            return None
+        return key
+
     def instr2ir(self, instr):
+        """Return the IR of @instr: the AssignBlock of the instruction and the
+        additional IRBlocks (loops, conditional executions, ...)
+
+        If the lifting cache is enabled (see enable_lift_cache), instructions
+        already lifted are not lifted again: the cache stores a template of
+        their IR, in which the expressions depending on the instruction offset
+        are computed again for each instruction.
+
+        @instr: instruction instance
+        """
+        cache = self.lift_cache
+        if cache is None or instr.offset is None:
+            return self._instr2ir(instr)
+        key = self.lift_cache_key(instr)
+        if key is None:
+            return self._instr2ir(instr)
+        template = cache.get(key)
+        if template is None:
+            result, template = self._new_lift_template(instr)
+            cache[key] = template
+            return result
+        if template is False:
+            # Not cacheable
+            return self._instr2ir(instr)
+        return template.instantiate(instr)
+
+    def _new_lift_template(self, instr):
+        """Lift @instr, and build the template of its lifting by lifting it at
+        another offset
+        Return the lifting of @instr and its template (False if the lifting
+        cannot be cached)"""
+        probe = instr.clone()
+        args = list(instr.args)
+        info = instr.additional_info
+        info_items = dict(vars(info)) if info is not None else {}
+        result = self._instr2ir(instr)
+
+        probe.offset = instr.offset + self.lift_cache_delta
+        template = _LiftTemplate(
+            self.loc_db, instr.offset, self.lift_cache_delta
+        )
+        # Locations created by the probe are removed once the template is
+        # built
+        marker = self.loc_db.add_location()
+        self.loc_db.remove_location(marker)
+        try:
+            # Destinations are moved along with the probe
+            probe.args = self._lift_probe_args(probe.args)
+            template.build(result, self._instr2ir(probe))
+            if probe.args != self._lift_probe_args(instr.args):
+                raise _NotTemplatable()
+        except Exception:
+            # Offset dependent lifting, or probe not supported by the
+            # semantic
+            template = False
+        finally:
+            marker_end = self.loc_db.add_location()
+            for key in range(marker.key + 1, marker_end.key + 1):
+                loc_key = m2_expr.LocKey(key)
+                if loc_key in self.loc_db.loc_keys:
+                    self.loc_db.remove_location(loc_key)
+        if template is False:
+            return result, template
+
+        if instr.args != args:
+            if any(arg.is_loc() for arg in instr.args):
+                # Destinations would have to be moved too
+                return result, False
+            template.args = list(instr.args)
+        if info is not None:
+            template.info = dict(
+                (name, value) for name, value in viewitems(vars(info))
+                if name not in info_items or info_items[name] is not value
+            )
+        return result, template
+
+    def _lift_probe_args(self, args):
+        """Return the arguments @args of an instruction, in which destinations
+        are moved by self.lift_cache_delta"""
+        out = []
+        for arg in args:
+            if arg.is_loc():
+                offset = self.loc_db.get_location_offset(arg.loc_key)
+                if offset is not None:
+                    arg = m2_expr.ExprLoc(
+                        self.loc_db.get_or_create_offset_location(
+                            offset + self.lift_cache_delta
+                        ),
+                        arg.size
+                    )
+            out.append(arg)
+        return out
+
+    def _instr2ir(self, instr):
+        """Lift @instr, without using the lifting cache"""
         ir_bloc_cur, extra_irblocks = self.get_ir(instr)
         for index, irb in enumerate(extra_irblocks):
             irs = []
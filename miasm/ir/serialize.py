@@ -0,0 +1,178 @@
+"""
+Compact binary serialization of IR objects
+
+AssignBlock, IRBlock and IRCFG are serialized on top of the expression DAG
+serializer: expressions shared between assignments, blocks or graphs are
+only stored once.
+
+Instructions associated to AssignBlocks are not serialized. LocKeys are
+stored by value: deserialized IR must be used with the LocationDB of the
+original IR (or a copy of it), unless the ExprDeserializer is given a
+loc_key_map.
+"""
+
+from future.utils import viewitems
+
+from miasm.expression.expression import Expr
+from miasm.expression.expression_serialize import ExprSerializer, \
+    ExprDeserializer
+from miasm.ir.ir import AssignBlock, IRBlock, IRCFG
+
+# Objects tags
+OBJ_EXPR = 0
+OBJ_ASSIGNBLK = 1
+OBJ_IRBLOCK = 2
+OBJ_IRCFG = 3
+OBJ_LIST = 4
+
+
+def write_assignblk(serializer, assignblk):
+    """Serialize @assignblk
+    @serializer: ExprSerializer instance
+    @assignblk: AssignBlock instance
+    """
+    serializer.write_uint(len(assignblk))
+    for dst, src in viewitems(assignblk):
+        serializer.write_expr(dst)
+        serializer.write_expr(src)
+
+
+def read_assignblk(deserializer, instr=None):
+    """Return the AssignBlock read from @deserializer
+    @deserializer: ExprDeserializer instance
+    @instr: (optional) instruction associated to the AssignBlock
+    """
+    assigns = {}
+    for _ in range(deserializer.read_uint()):
+        dst = deserializer.read_expr()
+        assigns[dst] = deserializer.read_expr()
+    # Serialized assignments come from checked AssignBlocks
+    return AssignBlock.from_trusted(assigns, instr)
+
+
+def write_irblock(serializer, irblock):
+    """Serialize @irblock
+    @serializer: ExprSerializer instance
+    @irblock: IRBlock instance
+    """
+    serializer.write_loc_key(irblock.loc_key)
+    serializer.write_uint(len(irblock))
+    for assignblk in irblock:
+        write_assignblk(serializer, assignblk)
+
+
+def read_irblock(deserializer, loc_db):
+    """Return the IRBlock read from @deserializer
+    @deserializer: ExprDeserializer instance
+    @loc_db: LocationDB instance of the IRBlock
+    """
+    loc_key = deserializer.read_loc_key()
+    assignblks = [
+        read_assignblk(deserializer)
+        for _ in range(deserializer.read_uint())
+    ]
+    return IRBlock(loc_db, loc_key, assignblks)
+
+
+def write_ircfg(serializer, ircfg):
+    """Serialize @ircfg
+    @serializer: ExprSerializer instance
+    @ircfg: IRCFG instance
+    """
+    serializer.write_expr(ircfg.IRDst)
+    nodes = ircfg.nodes()
+    serializer.write_uint(len(nodes))
+    for node in nodes:
+        serializer.write_loc_key(node)
+    edges = ircfg.edges()
+    serializer.write_uint(len(edges))
+    for src, dst in edges:
+        serializer.write_loc_key(src)
+        serializer.write_loc_key(dst)
+    serializer.write_uint(len(ircfg.blocks))
+    for irblock in ircfg.blocks.values():
+        write_irblock(serializer, irblock)
+
+
+def read_ircfg(deserializer, loc_db):
+    """Return the IRCFG read from @deserializer
+    @deserializer: ExprDeserializer instance
+    @loc_db: LocationDB instance of the IRCFG
+    """
+    ircfg = IRCFG(deserializer.read_expr(), loc_db)
+    for _ in range(deserializer.read_uint()):
+        ircfg.add_node(deserializer.read_loc_key())
+    for _ in range(deserializer.read_uint()):
+        src = deserializer.read_loc_key()
+        ircfg.add_edge(src, deserializer.read_loc_key())
+    for _ in range(deserializer.read_uint()):
+        irblock = read_irblock(deserializer, loc_db)
+        ircfg.blocks[irblock.loc_key] = irblock
+    return ircfg
+
+
+def write_object(serializer, obj):
+    """Serialize @obj
+    @serializer: ExprSerializer instance
+    @obj: Expr, AssignBlock, IRBlock, IRCFG or list / tuple of them
+    """
+    if isinstance(obj, Expr):
+        serializer.write_uint(OBJ_EXPR)
+        serializer.write_expr(obj)
+    elif isinstance(obj, AssignBlock):
+        serializer.write_uint(OBJ_ASSIGNBLK)
+        write_assignblk(serializer, obj)
+    elif isinstance(obj, IRBlock):
+        serializer.write_uint(OBJ_IRBLOCK)
+        write_irblock(serializer, obj)
+    elif isinstance(obj, IRCFG):
+        serializer.write_uint(OBJ_IRCFG)
+        write_ircfg(serializer, obj)
+    elif isinstance(obj, (list, tuple)):
+        serializer.write_uint(OBJ_LIST)
+        serializer.write_uint(len(obj))
+        for element in obj:
+            write_object(serializer, element)
+    else:
+        raise TypeError("Cannot serialize %r" % obj)
+
+
+def read_object(deserializer, loc_db=None):
+    """Return the object read from @deserializer
+    @deserializer: ExprDeserializer instance
+    @loc_db: LocationDB instance of IRBlock / IRCFG
+    """
+    tag = deserializer.read_uint()
+    if tag == OBJ_EXPR:
+        return deserializer.read_expr()
+    elif tag == OBJ_ASSIGNBLK:
+        return read_assignblk(deserializer)
+    elif tag == OBJ_IRBLOCK:
+        return read_irblock(deserializer, loc_db)
+    elif tag == OBJ_IRCFG:
+        return read_ircfg(deserializer, loc_db)
+    elif tag == OBJ_LIST:
+        return [
+            read_object(deserializer, loc_db)
+            for _ in range(deserializer.read_uint())
+        ]
+    raise ValueError("Unknown object tag %d" % tag)
+
+
+def ir_dumps(obj):
+    """Serialize @obj
+    Return bytes
+    @obj: Expr, AssignBlock, IRBlock, IRCFG or list / tuple of them
+    """
+    serializer = ExprSerializer()
+    write_object(serializer, obj)
+    return serializer.get_bytes()
+
+
+def ir_loads(data, loc_db=None):
+    """Return the object serialized in @data by ir_dumps. Lists and tuples
+    are returned as lists
+    @data: bytes
+    @loc_db: LocationDB instance of IRBlock / IRCFG
+    """
+    return read_object(ExprDeserializer(data), loc_db)
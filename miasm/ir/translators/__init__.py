@@ -9,5 +9,10 @@ try:
 except ImportError:
     # Nothing to do, z3 not available
     pass
+try:
+    import miasm.ir.translators.numpy_ir
+except ImportError:
+    # Nothing to do, numpy not available
+    pass
 
 __all__ = ["Translator"]
@@ -0,0 +1,275 @@
+"""Batch evaluation of Miasm expressions over NumPy arrays
+
+Expressions are compiled to Python functions working on numpy.uint64 arrays,
+so an expression is evaluated on many inputs at once. Expressions (and their
+sub-expressions) are limited to 64 bits.
+"""
+from future.utils import viewitems
+
+# Raise an ImportError if numpy is not available
+import numpy
+
+from miasm.core.utils import LRUCache
+from miasm.expression.expression import TOK_EQUAL, TOK_INF_SIGNED, \
+    TOK_INF_UNSIGNED, TOK_INF_EQUAL_SIGNED, TOK_INF_EQUAL_UNSIGNED
+from miasm.ir.translators.translator import Translator
+from miasm.ir.translators.python import TranslatorPythonFunction, \
+    TOK_CMP_TO_PYTHON
+
+
+class TranslatorNumpy(TranslatorPythonFunction):
+    """Translate a Miasm expression to the body of a Python function working on
+    numpy.uint64 arrays.
+
+    Constants are turned into numpy.uint64 values (named "cstN"), to avoid
+    implicit casts to floating values. Both sources of ExprCond are
+    evaluated.
+
+    Memory is abstracted using the function:
+    array memory(array addresses, int size)
+    """
+
+    # Implemented language
+    __LANG__ = "Numpy"
+    # Maximum supported size
+    MAX_SIZE = 64
+    # Operations translation
+    op_no_translate = ["+", "-", "*", "&", "^", "|"]
+
+    def __init__(self, *args, **kwargs):
+        super(TranslatorNumpy, self).__init__(*args, **kwargs)
+        # Constant value -> variable name
+        self.constants = {}
+
+    def from_expr(self, expr):
+        if expr.size > self.MAX_SIZE:
+            raise ValueError(
+                "Expression larger than %d bits: %s" % (self.MAX_SIZE, expr)
+            )
+        return super(TranslatorNumpy, self).from_expr(expr)
+
+    def _cst(self, value):
+        """Return the name of the numpy.uint64 constant @value"""
+        name = self.constants.get(value)
+        if name is None:
+            name = "cst%d" % len(self.constants)
+            self.constants[value] = name
+        return name
+
+    def _mask(self, code, size):
+        """Return @code masked to @size bits"""
+        if size == self.MAX_SIZE:
+            return code
+        return "(%s & %s)" % (code, self._cst((1 << size) - 1))
+
+    def _signed(self, value, size):
+        """Return the numpy.int64 code of @value (a @size bits unsigned integer
+        code) interpreted as signed"""
+        sign = self._cst(1 << (size - 1))
+        return "((%s ^ %s) - %s).view(np.int64)" % (value, sign, sign)
+
+    def from_ExprInt(self, expr):
+        return self._cst(int(expr))
+
+    def from_ExprMem(self, expr):
+        return self._mask(
+            "np.asarray(memory(%s, 0x%x), dtype=np.uint64)" % (
+                self.from_expr(expr.ptr),
+                expr.size // 8
+            ),
+            expr.size
+        )
+
+    def from_ExprSlice(self, expr):
+        out = self.from_expr(expr.arg)
+        if expr.start != 0:
+            out = "(%s >> %s)" % (out, self._cst(expr.start))
+        return self._mask(out, expr.stop - expr.start)
+
+    def from_ExprCompose(self, expr):
+        out = []
+        for index, arg in expr.iter_args():
+            code = self.from_expr(arg)
+            if index != 0:
+                code = "(%s << %s)" % (code, self._cst(index))
+            out.append(code)
+        return "(%s)" % " | ".join(out)
+
+    def from_ExprCond(self, expr):
+        return "np.where(%s != %s, %s, %s)" % (
+            self.from_expr(expr.cond),
+            self._cst(0),
+            self.from_expr(expr.src1),
+            self.from_expr(expr.src2)
+        )
+
+    def _bool(self, code):
+        """Return the 1 bit integer code of the boolean array @code"""
+        return "(%s).astype(np.uint64)" % code
+
+    def from_ExprOp(self, expr):
+        size = expr.size
+        if expr.op in self.op_no_translate:
+            args = [self.from_expr(arg) for arg in expr.args]
+            if len(args) == 1:
+                return self._mask("(%s%s)" % (expr.op, args[0]), size)
+            code = "(%s)" % (" %s " % expr.op).join(args)
+            if expr.op in ["&", "^", "|"]:
+                # Arguments are already masked
+                return code
+            return self._mask(code, size)
+        elif expr.op in ["<<", ">>"]:
+            arg = self.from_expr(expr.args[0])
+            amount = self.from_expr(expr.args[1])
+            # Shifting a numpy.uint64 by 64 or more is undefined
+            return "np.where(%s < %s, %s, %s)" % (
+                amount,
+                self._cst(size),
+                self._mask(
+                    "(%s %s np.minimum(%s, %s))" % (
+                        arg, expr.op, amount, self._cst(size - 1)
+                    ),
+                    size
+                ),
+                self._cst(0)
+            )
+        elif expr.op == "a>>":
+            amount = self.from_expr(expr.args[1])
+            return self._mask(
+                "(%s >> np.minimum(%s, %s).view(np.int64)).view(np.uint64)" % (
+                    self._signed(self.from_expr(expr.args[0]), size),
+                    amount,
+                    self._cst(size - 1)
+                ),
+                size
+            )
+        elif expr.op in ["<<<", ">>>"]:
+            arg = self.from_expr(expr.args[0])
+            # A null amount gives (arg | arg)
+            if expr.args[1].is_int():
+                amount = int(expr.args[1]) % size
+                amount_inv = self._cst((size - amount) % size)
+                amount = self._cst(amount)
+            else:
+                amount = "(%s %% %s)" % (
+                    self.from_expr(expr.args[1]),
+                    self._cst(size)
+                )
+                amount_inv = "((%s - %s) %% %s)" % (
+                    self._cst(size),
+                    amount,
+                    self._cst(size)
+                )
+            if expr.op == ">>>":
+                amount, amount_inv = amount_inv, amount
+            return "(%s | (%s >> %s))" % (
+                self._mask("(%s << %s)" % (arg, amount), size),
+                arg,
+                amount_inv
+            )
+        elif expr.op == TOK_EQUAL:
+            return self._bool(
+                "%s == %s" % (
+                    self.from_expr(expr.args[0]),
+                    self.from_expr(expr.args[1])
+                )
+            )
+        elif expr.op in TOK_CMP_TO_PYTHON:
+            arg1, arg2 = expr.args
+            arg1_code = self.from_expr(arg1)
+            arg2_code = self.from_expr(arg2)
+            if expr.op in [TOK_INF_SIGNED, TOK_INF_EQUAL_SIGNED]:
+                arg1_code = self._signed(arg1_code, arg1.size)
+                arg2_code = self._signed(arg2_code, arg2.size)
+            return self._bool(
+                "%s %s %s" % (arg1_code, TOK_CMP_TO_PYTHON[expr.op], arg2_code)
+            )
+        elif expr.op.startswith("zeroExt_"):
+            return self.from_expr(expr.args[0])
+        elif expr.op.startswith("signExt_"):
+            arg = expr.args[0]
+            return self._mask(
+                "(%s).view(np.uint64)" % self._signed(
+                    self.from_expr(arg),
+                    arg.size
+                ),
+                size
+            )
+
+        raise NotImplementedError("Unknown operator: %s" % expr.op)
+
+
+# Cache of compiled expressions
+compiled_exprs = LRUCache(1000)
+
+
+def compile_expr_batch(expr):
+    """Compile @expr to a Python function computing its value on arrays.
+
+    The returned function has the signature:
+        numpy.ndarray func(values, memory=None)
+    with @values a mapping from each ExprId / ExprLoc of @expr to an integer or
+    an array of integers, and @memory a function
+    array memory(array addresses, int size) called on memory reads (@size in
+    bytes).
+    Values are broadcast together, and the result is a numpy.uint64 array
+    masked to @expr size.
+
+    Compiled functions are cached, so compiling the same expression again is
+    cheap.
+
+    @expr: Expr instance (not ExprAssign), up to 64 bits
+    """
+    func = compiled_exprs.get(expr)
+    if func is not None:
+        return func
+
+    translator = TranslatorNumpy(cache_size=0x10000)
+    code = translator.from_expr(expr)
+    lines = ["def compiled_expr(values, memory=None):"]
+    for leaf, name in viewitems(translator.leaves):
+        leaf_name = "_%s" % name
+        lines.append(
+            "    %s = np.asarray(values[%s], dtype=np.uint64)" % (
+                name,
+                leaf_name
+            )
+        )
+        if leaf.size < translator.MAX_SIZE:
+            lines.append(
+                "    %s = %s & %s" % (
+                    name, name, translator._cst(int(leaf.mask))
+                )
+            )
+    # Modular arithmetic is expected
+    lines.append("    with np.errstate(over='ignore'):")
+    lines += ["        %s" % line for line in translator.lines]
+    # Always return an array, even for constant expressions
+    lines.append("        return np.asarray(%s, dtype=np.uint64)" % code)
+
+    namespace = {"np": numpy}
+    for leaf, name in viewitems(translator.leaves):
+        namespace["_%s" % name] = leaf
+    for value, name in viewitems(translator.constants):
+        namespace[name] = numpy.uint64(value)
+    source = "\n".join(lines)
+    exec(compile(source, "<compiled_expr_batch>", "exec"), namespace)
+    func = namespace["compiled_expr"]
+    func.source = source
+    compiled_exprs[expr] = func
+    return func
+
+
+def batch_eval(expr, values, memory=None):
+    """Evaluate @expr on each element of the arrays in @values.
+
+    See compile_expr_batch for the arguments.
+    @expr: Expr instance, up to 64 bits
+    @values: dict ExprId / ExprLoc -> int or array of integers
+    @memory: (optional) function array memory(array addresses, int size)
+    """
+    return compile_expr_batch(expr)(values, memory)
+
+
+# Register the class
+Translator.register(TranslatorNumpy)
@@ -1,7 +1,20 @@
+import re
 from builtins import map
-from miasm.expression.expression import ExprInt
+from future.utils import viewitems
+
+from miasm.core.utils import LRUCache
 from miasm.ir.translators.translator import Translator
-from miasm.expression.expression import ExprCond, ExprInt
+from miasm.expression.expression import ExprCond, ExprInt, TOK_EQUAL, \
+    TOK_INF_SIGNED, TOK_INF_UNSIGNED, TOK_INF_EQUAL_SIGNED, \
+    TOK_INF_EQUAL_UNSIGNED
+
+
+TOK_CMP_TO_PYTHON = {
+    TOK_INF_SIGNED: "<",
+    TOK_INF_UNSIGNED: "<",
+    TOK_INF_EQUAL_SIGNED: "<=",
+    TOK_INF_EQUAL_UNSIGNED: "<=",
+}
 
 
 class TranslatorPython(Translator):
@@ -14,7 +27,7 @@ class TranslatorPython(Translator):
     # Implemented language
     __LANG__ = "Python"
     # Operations translation
-    op_no_translate = ["+", "-", "/", "%", ">>", "<<", "&", "^", "|", "*"]
+    op_no_translate = ["+", "-", "%", ">>", "&", "^", "|", "*"]
 
     def from_ExprInt(self, expr):
         return str(expr)
@@ -56,8 +69,25 @@ class TranslatorPython(Translator):
             self.from_expr(expr.src2)
         )
 
+    @staticmethod
+    def _signed(value, size):
+        """Return the Python code interpreting @value (a @size bits unsigned
+        integer code) as signed"""
+        sign = 1 << (size - 1)
+        return "((%s ^ 0x%x) - 0x%x)" % (value, sign, sign)
+
     def from_ExprOp(self, expr):
-        if expr.op in self.op_no_translate:
+        if expr.op == "<<":
+            # Avoid building huge integers on large shift amounts
+            amount = self.from_expr(expr.args[1])
+            return "(((%s << %s) & 0x%x) if %s < %d else 0)" % (
+                self.from_expr(expr.args[0]),
+                amount,
+                (1 << expr.size) - 1,
+                amount,
+                expr.size
+            )
+        elif expr.op in self.op_no_translate:
             args = list(map(self.from_expr, expr.args))
             if len(expr.args) == 1:
                 return "((%s %s) & 0x%x)" % (
@@ -70,12 +100,79 @@ class TranslatorPython(Translator):
                     (" %s " % expr.op).join(args),
                     (1 << expr.size) - 1
                 )
+        elif expr.op in ["/", "udiv"]:
+            return "((%s // %s) & 0x%x)" % (
+                self.from_expr(expr.args[0]),
+                self.from_expr(expr.args[1]),
+                (1 << expr.size) - 1
+            )
+        elif expr.op == "umod":
+            return "((%s %% %s) & 0x%x)" % (
+                self.from_expr(expr.args[0]),
+                self.from_expr(expr.args[1]),
+                (1 << expr.size) - 1
+            )
+        elif expr.op in ["sdiv", "smod"]:
+            # C-like signed division, rounding toward zero
+            arg1 = self._signed(self.from_expr(expr.args[0]), expr.args[0].size)
+            arg2 = self._signed(self.from_expr(expr.args[1]), expr.args[1].size)
+            if expr.op == "sdiv":
+                return "(((abs(%s) // abs(%s)) * (1 if (%s ^ %s) >= 0 else -1)) & 0x%x)" % (
+                    arg1, arg2, arg1, arg2, (1 << expr.size) - 1
+                )
+            return "(((abs(%s) %% abs(%s)) * (1 if %s >= 0 else -1)) & 0x%x)" % (
+                arg1, arg2, arg1, (1 << expr.size) - 1
+            )
+        elif expr.op == "a>>":
+            return "((%s >> %s) & 0x%x)" % (
+                self._signed(self.from_expr(expr.args[0]), expr.args[0].size),
+                self.from_expr(expr.args[1]),
+                (1 << expr.size) - 1
+            )
+        elif expr.op == "**":
+            return "pow(%s, %s, 0x%x)" % (
+                self.from_expr(expr.args[0]),
+                self.from_expr(expr.args[1]),
+                1 << expr.size
+            )
         elif expr.op == "parity":
-            return "(%s & 0x1)" % self.from_expr(expr.args[0])
-        elif expr.op == "==":
+            return "((bin(%s & 0xff).count('1') & 1) ^ 1)" % (
+                self.from_expr(expr.args[0])
+            )
+        elif expr.op == TOK_EQUAL:
             return self.from_expr(
                 ExprCond(expr.args[0] - expr.args[1], ExprInt(0, 1), ExprInt(1, 1))
             )
+        elif expr.op in TOK_CMP_TO_PYTHON:
+            arg1, arg2 = expr.args
+            arg1_code = self.from_expr(arg1)
+            arg2_code = self.from_expr(arg2)
+            if expr.op in [TOK_INF_SIGNED, TOK_INF_EQUAL_SIGNED]:
+                arg1_code = self._signed(arg1_code, arg1.size)
+                arg2_code = self._signed(arg2_code, arg2.size)
+            return "(1 if (%s %s %s) else 0)" % (
+                arg1_code,
+                TOK_CMP_TO_PYTHON[expr.op],
+                arg2_code
+            )
+        elif expr.op.startswith("zeroExt_"):
+            return self.from_expr(expr.args[0])
+        elif expr.op.startswith("signExt_"):
+            arg = expr.args[0]
+            return "(%s & 0x%x)" % (
+                self._signed(self.from_expr(arg), arg.size),
+                (1 << expr.size) - 1
+            )
+        elif expr.op == "cntleadzeros":
+            return "(%d - (%s).bit_length())" % (
+                expr.size,
+                self.from_expr(expr.args[0])
+            )
+        elif expr.op == "cnttrailzeros":
+            arg = self.from_expr(expr.args[0])
+            return "(((%s & -%s).bit_length() - 1) if %s else %d)" % (
+                arg, arg, arg, expr.size
+            )
 
         elif expr.op in ["<<<", ">>>"]:
             amount_raw = expr.args[1]
@@ -99,5 +196,115 @@ class TranslatorPython(Translator):
         )
 
 
+class TranslatorPythonFunction(TranslatorPython):
+    """Translate a Miasm expression to the code of a Python function body.
+
+    Leaves (ExprId and ExprLoc) are turned into local variables, loaded from
+    the function arguments. Sub-expressions are computed once in intermediate
+    variables, except in ExprCond sources which are only evaluated if needed.
+    Memory reads are masked to their size.
+    """
+
+    # Code which does not need an intermediate variable
+    ATOM = re.compile(r"^\w+$")
+
+    def __init__(self, *args, **kwargs):
+        super(TranslatorPythonFunction, self).__init__(*args, **kwargs)
+        # Leaf -> local variable name
+        self.leaves = {}
+        # Intermediate variables computation
+        self.lines = []
+        self._cond_depth = 0
+
+    def from_expr(self, expr):
+        if expr in self._cache:
+            return self._cache[expr]
+        code = super(TranslatorPythonFunction, self).from_expr(expr)
+        if self._cond_depth or self.ATOM.match(code):
+            return code
+        name = "var%d" % len(self.lines)
+        self.lines.append("%s = %s" % (name, code))
+        self._cache[expr] = name
+        return name
+
+    def _from_leaf(self, expr):
+        name = self.leaves.get(expr)
+        if name is None:
+            name = "leaf%d" % len(self.leaves)
+            self.leaves[expr] = name
+        return name
+
+    def from_ExprId(self, expr):
+        return self._from_leaf(expr)
+
+    def from_ExprLoc(self, expr):
+        return self._from_leaf(expr)
+
+    def from_ExprMem(self, expr):
+        return "(memory(%s, 0x%x) & 0x%x)" % (
+            self.from_expr(expr.ptr),
+            expr.size // 8,
+            (1 << expr.size) - 1
+        )
+
+    def from_ExprCond(self, expr):
+        cond = self.from_expr(expr.cond)
+        # Sources must only be computed if selected
+        self._cond_depth += 1
+        try:
+            src1 = self.from_expr(expr.src1)
+            src2 = self.from_expr(expr.src2)
+        finally:
+            self._cond_depth -= 1
+        return "(%s if (%s) else %s)" % (src1, cond, src2)
+
+    def from_ExprAssign(self, expr):
+        raise ValueError("Cannot compile an assignment: %s" % expr)
+
+
+# Cache of compiled expressions
+compiled_exprs = LRUCache(1000)
+
+
+def compile_expr(expr):
+    """Compile @expr to a Python function computing its value.
+
+    The returned function has the signature:
+        int func(values, memory=None)
+    with @values a mapping from each ExprId / ExprLoc of @expr to its integer
+    value, and @memory a function int memory(int address, int size) called on
+    memory reads (@size in bytes).
+    The result is masked to @expr size. Division by zero raises a
+    ZeroDivisionError.
+
+    Compiled functions are cached, so compiling the same expression again is
+    cheap.
+
+    @expr: Expr instance (not ExprAssign)
+    """
+    func = compiled_exprs.get(expr)
+    if func is not None:
+        return func
+
+    translator = TranslatorPythonFunction(cache_size=0x10000)
+    code = translator.from_expr(expr)
+    namespace = {}
+    lines = ["def compiled_expr(values, memory=None):"]
+    for leaf, name in viewitems(translator.leaves):
+        leaf_name = "_%s" % name
+        namespace[leaf_name] = leaf
+        lines.append(
+            "    %s = values[%s] & 0x%x" % (name, leaf_name, int(leaf.mask))
+        )
+    lines += ["    %s" % line for line in translator.lines]
+    lines.append("    return %s" % code)
+    source = "\n".join(lines)
+    exec(compile(source, "<compiled_expr>", "exec"), namespace)
+    func = namespace["compiled_expr"]
+    func.source = source
+    compiled_exprs[expr] = func
+    return func
+
+
 # Register the class
 Translator.register(TranslatorPython)
@@ -0,0 +1,168 @@
+from __future__ import print_function
+import os
+import shutil
+import tempfile
+import time
+
+from miasm.analysis import binary_cache
+from miasm.analysis.binary_cache import BinaryCache
+from miasm.core.cpu import additional_info_key
+from miasm.core.locationdb import LocationDB
+from miasm.core.utils import decode_hex
+from miasm.expression.expression import ExprId
+
+SAMPLES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "example",
+    "samples"
+)
+
+
+def loc_name(loc_db, loc_key):
+    """Return the offset and the names of @loc_key (the order of the names of a
+    location depends on the hash seed)"""
+    names = ",".join(sorted(loc_db.get_location_names(loc_key)))
+    offset = loc_db.get_location_offset(loc_key)
+    if offset is not None:
+        return "loc_%x(%s)" % (offset, names)
+    return "fresh(%s)" % names
+
+
+def asmcfg_summary(asmcfg):
+    """Return a LocationDB independent summary of @asmcfg"""
+    loc_db = asmcfg.loc_db
+
+    def fix_loc(expr):
+        if expr.is_loc():
+            return ExprId(loc_name(loc_db, expr.loc_key), expr.size)
+        return expr
+
+    out = []
+    for block in asmcfg.blocks:
+        out.append((
+            loc_name(loc_db, block.loc_key),
+            block.__class__.__name__,
+            [(instr.offset, instr.l, instr.b, instr.name, instr.mode,
+              [str(arg.visit(fix_loc)) for arg in instr.args],
+              additional_info_key(instr.additional_info))
+             for instr in block.lines],
+            sorted((constraint.c_t, loc_name(loc_db, constraint.loc_key))
+                   for constraint in block.bto),
+        ))
+    return sorted(out)
+
+
+def ircfg_summary(ircfg):
+    """Return a LocationDB independent summary of @ircfg"""
+    loc_db = ircfg.loc_db
+
+    def fix_loc(expr):
+        if expr.is_loc():
+            return ExprId(loc_name(loc_db, expr.loc_key), expr.size)
+        return expr
+
+    out = []
+    for loc_key, irblock in ircfg.blocks.items():
+        out.append((loc_name(loc_db, loc_key), [
+            (assignblk.instr.offset if assignblk.instr else None,
+             sorted((str(dst.visit(fix_loc)), str(src.visit(fix_loc)))
+                    for dst, src in assignblk.items()))
+            for assignblk in irblock
+        ]))
+    return sorted(out)
+
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    for sample, function in [("dse_crackme", "main"), ("md5_arm", "main")]:
+        data = open(os.path.join(SAMPLES, sample), "rb").read()
+
+        # First analysis: disassembly and lifting
+        loc_db = LocationDB()
+        cache = BinaryCache(data, loc_db, cache_dir=tmp_dir)
+        offset = loc_db.get_location_offset(
+            cache.container.loc_db.get_name_location(function)
+        )
+        start = time.time()
+        asmcfg = cache.get_asmcfg(offset, follow_call=True)
+        # (lifting may modify the instructions arguments)
+        ref_asmcfg = asmcfg_summary(asmcfg)
+        lifter = cache.machine.lifter_model_call(loc_db)
+        ircfg = cache.get_ircfg(offset, lifter, follow_call=True)
+        ref_time = time.time() - start
+        assert (cache.hits, cache.misses) == (0, 1)
+        ref_ircfg = ircfg_summary(ircfg)
+        # Same objects in the session
+        assert cache.get_asmcfg(offset, follow_call=True) is asmcfg
+        assert (cache.hits, cache.misses) == (0, 1)
+
+        # Second analysis, in a new LocationDB: the binary is not parsed
+        loc_db = LocationDB()
+        loc_db.add_location("unrelated")
+        cache = BinaryCache(data, loc_db, cache_dir=tmp_dir)
+        start = time.time()
+        asmcfg = cache.get_asmcfg(offset, follow_call=True)
+        lifter = cache.machine.lifter_model_call(loc_db)
+        ircfg = cache.get_ircfg(offset, lifter, follow_call=True)
+        cached_time = time.time() - start
+        assert (cache.hits, cache.misses) == (1, 0)
+        assert cache._container is None
+        assert asmcfg_summary(asmcfg) == ref_asmcfg
+        assert ircfg_summary(ircfg) == ref_ircfg
+        assert all(
+            assignblk.instr is not None
+            for irblock in ircfg.blocks.values()
+            for assignblk in irblock
+        )
+        # The cached IR can be analysed further
+        ircfg.simplify(lambda expr: expr)
+        print("%s: %d blocks, %d IR blocks, analysis %.3fs, cached %.3fs" % (
+            sample, len(asmcfg.blocks), len(ircfg.blocks),
+            ref_time, cached_time
+        ))
+
+        # Other disassembly options
+        asmcfg = cache.get_asmcfg(offset, follow_call=False)
+        assert cache.misses == 1
+        assert asmcfg_summary(asmcfg) != ref_asmcfg
+
+    # Corrupted function file: analysed again
+    for name in os.listdir(cache.directory):
+        if name.endswith(".bin"):
+            with open(os.path.join(cache.directory, name), "wb") as fdesc:
+                fdesc.write(b"garbage")
+    cache = BinaryCache(data, LocationDB(), cache_dir=tmp_dir)
+    asmcfg = cache.get_asmcfg(offset, follow_call=True)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert asmcfg_summary(asmcfg) == ref_asmcfg
+
+    # Version mismatch: cache discarded
+    binary_cache.FORMAT_VERSION += 1
+    cache = BinaryCache(data, LocationDB(), cache_dir=tmp_dir)
+    assert os.listdir(cache.directory) == ["info"]
+    cache.get_asmcfg(offset, follow_call=True)
+    assert (cache.hits, cache.misses) == (0, 1)
+    binary_cache.FORMAT_VERSION -= 1
+
+    # Raw code mapped at another address: another cache
+    # (mov eax, [0x1010]; jmp 0x1010)
+    data = decode_hex("a110100000e9f6ffffff") * 2
+    for addr, hits, misses in [(0, 0, 1), (0x1000, 0, 1), (0x1000, 1, 0)]:
+        cache = BinaryCache(data, LocationDB(), arch="x86_32",
+                            cache_dir=tmp_dir, addr=addr)
+        asmcfg = cache.get_asmcfg(addr + 10)
+        assert (cache.hits, cache.misses) == (hits, misses)
+        offsets = sorted(
+            instr.offset for block in asmcfg.blocks for instr in block.lines
+        )
+        assert offsets[0] == addr + 10
+
+    if hasattr(os, "getuid"):
+        # Cache writable by other users: not used
+        os.chmod(cache.directory, 0o777)
+        cache = BinaryCache(data, LocationDB(), arch="x86_32",
+                            cache_dir=tmp_dir, addr=0x1000)
+        assert not cache.enabled
+        cache.get_asmcfg(0x100a)
+        assert (cache.hits, cache.misses) == (0, 1)
+finally:
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,104 @@
+from __future__ import print_function
+import os
+from functools import partial
+
+from future.utils import viewitems
+
+from miasm.analysis.binary import Container
+from miasm.analysis.machine import Machine
+from miasm.analysis.simplifier import IRCFGSimplifier, \
+    IRCFGSimplifierCommon, IRCFGSimplifierSSA
+from miasm.core.locationdb import LocationDB
+
+SAMPLES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "example",
+    "samples"
+)
+
+
+class FullSimplifierCommon(IRCFGSimplifierCommon):
+    """Simplifier processing all the irblocks on each pass run"""
+
+    def get_dirty_blocks(self, name, ircfg, neighbours=False):
+        self.stats.add_blocks(name, len(ircfg.blocks), 0)
+        return set(ircfg.blocks)
+
+
+class FullSimplifierSSA(IRCFGSimplifierSSA):
+    """Simplifier processing all the irblocks on each pass run"""
+
+    def get_dirty_blocks(self, name, ircfg, neighbours=False):
+        self.stats.add_blocks(name, len(ircfg.blocks), 0)
+        return set(ircfg.blocks)
+
+
+def copy_ircfg(lifter, ircfg):
+    new_ircfg = lifter.new_ircfg()
+    for irblock in ircfg.blocks.values():
+        new_ircfg.add_irblock(irblock)
+    return new_ircfg
+
+
+def processed(stats):
+    return sum(values[3] for values in stats.passes.values())
+
+
+total = total_full = 0
+for sample, function in [
+        ("dse_crackme", "main"),
+        ("md5_arm", "main"),
+        ("md5_arm", "__udivsi3"),
+        ("md5_arm", "md5_update"),
+]:
+    loc_db = LocationDB()
+    data = open(os.path.join(SAMPLES, sample), "rb").read()
+    cont = Container.from_string(data, loc_db)
+    machine = Machine(cont.arch)
+    mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db)
+    head = loc_db.get_name_location(function)
+    asmcfg = mdis.dis_multiblock(loc_db.get_location_offset(head))
+    lifter = machine.lifter_model_call(loc_db)
+    ref_ircfg = lifter.new_ircfg_from_asmcfg(asmcfg)
+
+    for full_cls, incremental_cls in [
+            (FullSimplifierCommon, IRCFGSimplifierCommon),
+            (FullSimplifierSSA, IRCFGSimplifierSSA),
+    ]:
+        results = []
+        for cls in [full_cls, incremental_cls]:
+            ircfg = copy_ircfg(lifter, ref_ircfg)
+            simplifier = cls(lifter)
+            result = simplifier(ircfg, head)
+            if not isinstance(result, bool):
+                # SSA simplifiers return a new IRCFG
+                ircfg = result
+            results.append((ircfg, simplifier.stats))
+        (full, full_stats), (incremental, incremental_stats) = results
+        print(sample, function, incremental_cls.__name__)
+        print(incremental_stats)
+        print("processed irblocks: %d (full: %d)" % (
+            processed(incremental_stats), processed(full_stats)
+        ))
+
+        # Same result, fewer irblocks processed
+        assert set(full.blocks) == set(incremental.blocks)
+        for loc_key, irblock in viewitems(full.blocks):
+            assert incremental.blocks[loc_key] == irblock
+        assert full.edges() == incremental.edges()
+        assert processed(incremental_stats) <= processed(full_stats)
+        total += processed(incremental_stats)
+        total_full += processed(full_stats)
+assert total < total_full
+
+
+# Passes without __name__ (functools.partial, callable objects)
+def count_pass(counter, ircfg, head):
+    counter.append(head)
+    return False
+
+counter = []
+simplifier = IRCFGSimplifier(lifter)
+simplifier.passes = [partial(count_pass, counter)]
+assert simplifier(ref_ircfg, head) is False
+assert counter == [head]
+assert list(simplifier.stats.passes) == [repr(simplifier.passes[0])]
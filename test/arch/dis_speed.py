@@ -0,0 +1,113 @@
+"""
+Disassembly throughput, with and without the decoding dispatch table.
+
+Instructions are taken from the regression vectors of the architectures tests
+(x86, ARM, Thumb and AArch64); decodings using the dispatch table must match
+the ones walking the whole bintree.
+"""
+from __future__ import print_function
+import ast
+import os
+import sys
+import time
+
+from miasm.analysis.machine import Machine
+from miasm.core.bin_stream import bin_stream_str
+from miasm.core.utils import decode_hex
+
+# Minimum number of decoded instructions per measure
+MIN_INSTRS = 5000
+if len(sys.argv) > 1:
+    MIN_INSTRS = int(sys.argv[1])
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+
+def load_vectors(path, name, namespace=None):
+    """Return the (mode, bytes) regression vectors of the list @name defined in
+    the test script @path, without running it
+    @namespace: names used by the list definition
+    """
+    tree = ast.parse(open(os.path.join(BASE_DIR, path)).read())
+    for node in tree.body:
+        if not isinstance(node, ast.Assign):
+            continue
+        if [target.id for target in node.targets] != [name]:
+            continue
+        code = compile(ast.Expression(node.value), path, "eval")
+        vectors = eval(code, dict(namespace or {}))
+        break
+    else:
+        raise ValueError("%s not found in %s" % (name, path))
+    out = []
+    for vector in vectors:
+        if len(vector) == 3:
+            mode, _, data = vector
+        else:
+            mode, data = None, vector[1]
+        out.append((mode, decode_hex(data.replace(' ', ''))))
+    return out
+
+
+def decode(mn, attrib, vectors, count):
+    """Decode the instructions of @vectors, repeated until at least @count
+    decodings
+    Return the disassembled instructions and the decoding time"""
+    out = []
+    start = time.time()
+    while True:
+        for data in vectors:
+            try:
+                instr = mn.dis(data, attrib)
+            except Exception as error:
+                out.append(error.__class__.__name__)
+                continue
+            out.append((str(instr), instr.l))
+        if len(out) >= count:
+            break
+    return out, time.time() - start
+
+
+x86_vectors = load_vectors(
+    "x86/arch.py", "reg_tests", {"m16": 16, "m32": 32, "m64": 64}
+)
+TESTS = [
+    ("x86_16", 16, [data for mode, data in x86_vectors if mode == 16]),
+    ("x86_32", 32, [data for mode, data in x86_vectors if mode == 32]),
+    ("x86_64", 64, [data for mode, data in x86_vectors if mode == 64]),
+    ("arml", "l", [
+        data for _, data in load_vectors("arm/arch.py", "reg_tests_arm")
+    ]),
+    ("armtl", "l", [
+        data for _, data in load_vectors("arm/arch.py", "reg_tests_armt")
+    ]),
+    ("aarch64l", "l", [
+        data for _, data in load_vectors("aarch64/arch.py", "reg_tests_aarch64")
+    ]),
+]
+
+for name, attrib, vectors in TESTS:
+    mn = Machine(name).mn
+    # Build the dispatch table out of the measures
+    start = time.time()
+    mn.get_dispatch_table()
+    build_time = time.time() - start
+
+    results = {}
+    for dispatch_bits in [0, mn.dispatch_bits]:
+        saved, mn.dispatch_bits = mn.dispatch_bits, dispatch_bits
+        try:
+            # Warm up
+            decode(mn, attrib, vectors, 0)
+            results[dispatch_bits] = decode(mn, attrib, vectors, MIN_INSTRS)
+        finally:
+            mn.dispatch_bits = saved
+    (ref, ref_time), (out, out_time) = results[0], results[mn.dispatch_bits]
+    assert out == ref
+    print(
+        "%-10s %5d vectors, table: %.3fs, instr per sec: tree walk %d, "
+        "dispatch table %d (x%.2f)" % (
+            name, len(vectors), build_time,
+            len(ref) / ref_time, len(out) / out_time, ref_time / out_time
+        )
+    )
@@ -0,0 +1,63 @@
+"""
+Architectures startup time: import of the architecture and first decoding,
+without the on-disk table cache, with an empty one, and with a filled one.
+"""
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+ARCHS = [
+    ("x86", "mn_x86", 32, "8d4c2404"),
+    ("arm", "mn_arm", "l", "0e10a0e1"),
+    ("aarch64", "mn_aarch64", "l", "e1031f2a"),
+    ("mips32", "mn_mips32", "b", "27bdffe0"),
+    ("ppc", "mn_ppc", "b", "7c0802a6"),
+    ("msp430", "mn_msp430", None, "3f4000f0"),
+    ("sh4", "mn_sh4", None, "0b00"),
+    ("mep", "mn_mep", "b", "0000"),
+]
+
+SCRIPT = """
+import time
+start = time.time()
+import miasm.core.asmblock
+import miasm.ir.ir
+base = time.time()
+from miasm.arch.%s.arch import %s as mn
+from miasm.core.utils import decode_hex
+imported = time.time()
+instr = mn.dis(decode_hex(%r), %r)
+end = time.time()
+print("%%f %%f %%s" %% (imported - base, end - imported, instr))
+"""
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    for arch, mn, attrib, data in ARCHS:
+        script = SCRIPT % (arch, mn, data, attrib)
+        results = []
+        for name, env_update in [
+                ("no cache", {}),
+                ("cold cache", {"MIASM_TABLE_CACHE": "1"}),
+                ("warm cache", {"MIASM_TABLE_CACHE": "1"}),
+        ]:
+            env = dict(os.environ)
+            env.pop("MIASM_TABLE_CACHE", None)
+            env["MIASM_CACHE_DIR"] = os.path.join(tmp_dir, arch)
+            env.update(env_update)
+            output = subprocess.check_output(
+                [sys.executable, "-W", "ignore", "-c", script], env=env
+            ).decode().split(" ", 2)
+            results.append((name, float(output[0]), float(output[1]),
+                            output[2].strip()))
+        # Same decoding in every case
+        assert len(set(result[3] for result in results)) == 1
+        print("%-8s %s" % (arch, ", ".join(
+            "%s: import %.3fs, first decoding %.3fs" % result[:3]
+            for result in results
+        )))
+finally:
+    shutil.rmtree(tmp_dir)
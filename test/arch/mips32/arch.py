@@ -275,3 +275,10 @@ for s, l in reg_tests_mips32:
     print(repr(b))
     assert(b in a)
     print(l.to_html())
+
+
+# CLZ destination is rd, rt is only set to the same register by the encoder
+mn = mn_mips32.dis(h2i("70A41820"), 'b')
+assert str(mn) == "CLZ        V1, A1"
+assert mn_mips32.asm(mn_mips32.fromstring(str(mn), loc_db, 'b'), 'b')[0] == \
+    h2i("70A31820")
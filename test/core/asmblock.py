@@ -1,10 +1,12 @@
 from __future__ import print_function
 from builtins import map
+import os
+import random
 from pdb import pm
 
-from future.utils import viewitems
+from future.utils import viewitems, viewvalues
 
-from miasm.core.utils import decode_hex
+from miasm.core.utils import decode_hex, Disasm_Exception
 from miasm.analysis.machine import Machine
 from miasm.analysis.binary import Container
 from miasm.core.asmblock import AsmCFG, AsmConstraint, AsmBlock, \
@@ -16,6 +18,7 @@ from miasm.core.locationdb import LocationDB
 
 # Initial data: from 'samples/simple_test.bin'
 data = decode_hex("5589e583ec10837d08007509c745fc01100000eb73837d08017709c745fc02100000eb64837d08057709c745fc03100000eb55837d080774138b450801c083f80e7509c745fc04100000eb3c8b450801c083f80e7509c745fc05100000eb298b450883e03085c07409c745fc06100000eb16837d08427509c745fc07100000eb07c745fc081000008b45fcc9c3")
+data_simple_test = data
 loc_db = LocationDB()
 cont = Container.from_string(data, loc_db)
 
@@ -341,3 +344,260 @@ try:
 except RuntimeError:
     error_raised = True
 assert error_raised
+
+
+# Parallel disassembly
+def asmcfg_summary(asmcfg, loc_db):
+    """Return a description of @asmcfg blocks independent of LocKeys"""
+    out = []
+    for block in asmcfg.blocks:
+        out.append((
+            loc_db.get_location_offset(block.loc_key),
+            block.__class__.__name__,
+            [str(line) for line in block.lines],
+            sorted(
+                (loc_db.get_location_offset(cst.loc_key), cst.c_t)
+                for cst in block.bto
+            ),
+        ))
+    out.sort(key=repr)
+    return out
+
+
+# Pseudo random data gives bad blocks and overlapping code
+data_random = bytes(bytearray(
+    (index * 0x27d4eb2d >> 17) & 0xFF for index in range(0x4000)
+))
+for data_par, offset, region_size in [(data_simple_test, 0, 0x10000),
+                                      (data_simple_test, 0, 0x20),
+                                      (data2, 0, 0x8),
+                                      (data, 0, 0x8),
+                                      (data_random, 5, 0x10000),
+                                      (data_random, 5, 0x100)]:
+    summaries = []
+    for processes in [None, 1, 3]:
+        loc_db = LocationDB()
+        cont = Container.from_string(data_par, loc_db)
+        callbacks = []
+
+        def dis_block_callback(mdis, cur_block, offsets_to_dis):
+            # User callbacks are only run by the parent process
+            callbacks.append((os.getpid(), cur_block.lines[0].offset
+                              if cur_block.lines else None))
+
+        mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db,
+                                  follow_call=True, processes=processes,
+                                  region_size=region_size, blocks_per_job=4,
+                                  dis_block_callback=dis_block_callback)
+        asmcfg = mdis.dis_multiblock(offset)
+        summaries.append((asmcfg_summary(asmcfg, loc_db), callbacks))
+    assert summaries[0] == summaries[1] == summaries[2]
+    assert all(pid == os.getpid() for pid, _ in summaries[0][1])
+    print("Parallel disassembly:", len(summaries[0][0]), "blocks")
+
+
+# Linear sweep
+loc_db = LocationDB()
+cont = Container.from_string(data_random, loc_db)
+mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db)
+sweep = mdis.dis_linear(0)
+expected = []
+offset = 0
+while offset < len(data_random):
+    try:
+        instr = mdis.arch.dis(cont.bin_stream, mdis.attrib, offset)
+    except (Disasm_Exception, IOError):
+        if expected and expected[-1][2] is None and \
+                expected[-1][0] + expected[-1][1] == offset:
+            expected[-1] = (expected[-1][0], expected[-1][1] + 1, None)
+        else:
+            expected.append((offset, 1, None))
+        offset += 1
+        continue
+    expected.append((offset, instr.l, instr.name))
+    offset += instr.l
+assert list(sweep) == expected
+assert len(sweep) == len(expected)
+assert sweep.offsets[-1] + sweep.lengths[-1] >= len(data_random)
+invalid = list(sweep.invalid_ranges())
+assert invalid
+assert invalid == [(off, l) for off, l, name in expected if name is None]
+for index in range(0, len(sweep), 97):
+    offset, length, name = sweep[index]
+    instr = sweep.instr(index)
+    if name is None:
+        assert instr is None
+        continue
+    assert instr.offset == offset
+    assert instr.l == length
+    assert instr.name == name
+assert sweep.names[sweep.mnemonics[0]] == expected[0][2]
+assert sweep.mnemonic_id(expected[0][2]) == sweep.mnemonics[0]
+
+# Range and resynchronisation step
+sweep = mdis.dis_linear(0x100, 0x180, resync_step=4)
+assert sweep.offsets[0] == 0x100
+assert sweep.offsets[-1] < 0x180
+for offset, length in sweep.invalid_ranges():
+    assert length % 4 == 0 or offset + length == 0x180
+
+try:
+    import numpy
+except ImportError:
+    pass
+else:
+    offsets, lengths, mnemonics = sweep.to_numpy()
+    assert list(offsets) == list(sweep.offsets)
+    assert list(lengths) == list(sweep.lengths)
+    assert list(mnemonics) == list(sweep.mnemonics)
+print("Linear sweep:", len(sweep), "instructions")
+
+# Linear sweep on garbage: decoders must reject invalid encodings
+rnd = random.Random(0)
+data_garbage = bytes(bytearray(rnd.randrange(0x100) for _ in range(0x1000)))
+for arch in ["aarch64l", "aarch64b", "armtl", "armtb"]:
+    loc_db = LocationDB()
+    cont = Container.from_string(data_garbage, loc_db)
+    mdis = Machine(arch).dis_engine(cont.bin_stream, loc_db=loc_db)
+    sweep = mdis.dis_linear(0)
+    assert sweep.offsets[0] == 0
+    assert sweep.offsets[-1] + sweep.lengths[-1] == len(data_garbage)
+    assert list(sweep.invalid_ranges())
+    print("Linear sweep (%s):" % arch, len(sweep), "instructions")
+
+
+# Streaming disassembly
+for data_stream, offset in [(data_simple_test, 0), (data2, 0), (data, 0),
+                            (data_random, 5)]:
+    loc_db = LocationDB()
+    cont = Container.from_string(data_stream, loc_db)
+    mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db,
+                              follow_call=True)
+    expected = asmcfg_summary(mdis.dis_multiblock(offset), loc_db)
+    expected_lines = dict(
+        (block[0], block[2]) for block in expected
+    )
+
+    # Blocks kept by the consumer, split by the consumer
+    for forget_dropped in [False, True]:
+        loc_db = LocationDB()
+        cont = Container.from_string(data_stream, loc_db)
+        mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db,
+                                  follow_call=True)
+        asmcfg = AsmCFG(loc_db)
+        # Ranges of the referenced blocks are not forgotten
+        referenced = []
+        for event in mdis.dis_multiblock_iter(offset,
+                                              forget_dropped=forget_dropped):
+            referenced.append(event.block)
+            if event.split_from is None:
+                asmcfg.add_block(event.block)
+                continue
+            block = asmcfg.loc_key_to_block(
+                loc_db.get_offset_location(event.split_from)
+            )
+            new_block = asmcfg.split_block(
+                block, loc_db.get_location_offset(event.block.loc_key)
+            )
+            assert [str(line) for line in new_block.lines] == \
+                [str(line) for line in event.block.lines]
+        asmcfg.rebuild_edges()
+        assert asmcfg_summary(asmcfg, loc_db) == expected
+
+    # Yielded blocks are not modified by the engine
+    loc_db = LocationDB()
+    cont = Container.from_string(data_stream, loc_db)
+    mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db,
+                              follow_call=True)
+    snapshots = [
+        (event.block, [str(line) for line in event.block.lines])
+        for event in mdis.dis_multiblock_iter(offset)
+    ]
+    for block, lines in snapshots:
+        assert [str(line) for line in block.lines] == lines
+
+    # Blocks dropped by the consumer: tails are disassembled again
+    loc_db = LocationDB()
+    cont = Container.from_string(data_stream, loc_db)
+    mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db,
+                              follow_call=True)
+    yielded = {}
+    for event in mdis.dis_multiblock_iter(offset):
+        lines = [(line.offset, str(line)) for line in event.block.lines]
+        start = loc_db.get_location_offset(event.block.loc_key)
+        if event.split_from is not None:
+            # The new block only holds already yielded instructions
+            split_lines = yielded[event.split_from]
+            head = [line for line in split_lines if line[0] < start]
+            assert head + lines == split_lines
+            yielded[event.split_from] = head
+        yielded[start] = lines
+    assert sorted(yielded) == sorted(expected_lines)
+    for start, lines in viewitems(yielded):
+        assert [line for _, line in lines] == expected_lines[start]
+
+    # Ranges of dropped blocks forgotten: every instruction is still yielded
+    loc_db = LocationDB()
+    cont = Container.from_string(data_stream, loc_db)
+    mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db,
+                              follow_call=True)
+    offsets = set()
+    for event in mdis.dis_multiblock_iter(offset, forget_dropped=True):
+        offsets.update(line.offset for line in event.block.lines)
+    assert set(
+        line_offset
+        for lines in viewvalues(yielded) for line_offset, _ in lines
+    ) <= offsets
+    print("Streaming disassembly:", len(yielded), "blocks")
+
+
+# Blocks offsets index
+loc_db = LocationDB()
+cont = Container.from_string(data_random, loc_db)
+mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db, follow_call=True)
+asmcfg = mdis.dis_multiblock(5)
+
+
+def blocks_containing_ref(asmcfg, offset):
+    """Blocks containing @offset, by a scan of every block"""
+    return set(
+        block.loc_key for block in asmcfg.blocks
+        if block.lines and block.get_range()[0] <= offset < block.get_range()[1]
+    )
+
+
+def check_index(asmcfg):
+    for offset in range(len(data_random) + 1):
+        found = set(
+            block.loc_key for block in asmcfg.blocks_containing(offset)
+        )
+        assert found == blocks_containing_ref(asmcfg, offset)
+        block = asmcfg.getby_offset(offset)
+        if found:
+            assert block.loc_key in found
+        else:
+            assert block is None
+
+check_index(asmcfg)
+## Deleted block
+block = asmcfg.getby_offset(0x100)
+asmcfg.del_block(block)
+check_index(asmcfg)
+asmcfg.add_block(block)
+check_index(asmcfg)
+## Split block
+block = max(asmcfg.blocks, key=lambda block: len(block.lines))
+offset = block.lines[len(block.lines) // 2].offset
+line = next(line for line in block.lines if line.l > 1)
+assert asmcfg.split_block(block, line.offset + 1) is None
+new_block = asmcfg.split_block(block, offset)
+assert new_block.lines[0].offset == offset
+assert asmcfg.loc_key_to_block(new_block.loc_key) is new_block
+assert asmcfg.getby_offset(offset) is new_block
+check_index(asmcfg)
+asmcfg.rebuild_edges()
+assert new_block.loc_key in asmcfg.successors(block.loc_key)
+## Blocks modified outside the AsmCFG are reindexed by rebuild_edges
+block.lines.pop()
+asmcfg.rebuild_edges()
+check_index(asmcfg)
@@ -0,0 +1,165 @@
+from __future__ import print_function
+import os
+import random
+import shutil
+import tempfile
+
+from miasm.analysis.machine import Machine
+from miasm.core.bin_stream import bin_stream_str, bin_stream_mmap
+from miasm.core.locationdb import LocationDB
+
+random.seed(0)
+data = bytes(bytearray(random.getrandbits(8) for _ in range(64)))
+
+
+def getbits_ref(data, start, n, byte_offset=lambda offset: offset):
+    """Bit by bit reference implementation of getbits"""
+    out = 0
+    for bit in range(start, start + n):
+        byte = bytearray(data)[byte_offset(bit // 8)]
+        out = (out << 1) | ((byte >> (7 - bit % 8)) & 1)
+    return out
+
+
+def swapped(word_len):
+    """Physical offset of the byte @offset of a stream of little endian
+    words"""
+    return lambda offset: (offset - offset % word_len) + word_len - 1 - offset % word_len
+
+
+# getbits / getbits_swapped
+bs = bin_stream_str(data)
+for start in range(0, 8 * 24):
+    for n in range(0, 70):
+        assert bs.getbits(start, n) == getbits_ref(data, start, n)
+        for word_len in [2, 4]:
+            assert bs.getbits_swapped(start, n, word_len) == getbits_ref(
+                data, start, n, swapped(word_len)
+            )
+for start, n in [(8 * 63, 9), (8 * 64, 1), (8 * 62 + 1, 16)]:
+    try:
+        bs.getbits(start, n)
+    except IOError:
+        pass
+    else:
+        raise AssertionError("Bits out of the stream")
+try:
+    bin_stream_str(data[:62]).getbits_swapped(8 * 60, 8, 4)
+except IOError:
+    pass
+else:
+    raise AssertionError("Words out of the stream")
+
+
+# Atomic mode
+class bin_stream_count(bin_stream_str):
+    """bin_stream_str recording the read ranges"""
+
+    def __init__(self, *args, **kwargs):
+        super(bin_stream_count, self).__init__(*args, **kwargs)
+        self.reads = []
+
+    def _getbytes(self, start, l=1):
+        self.reads.append((start, l))
+        return super(bin_stream_count, self)._getbytes(start, l)
+
+
+for atomic_window in [0, 4, 32]:
+    bs = bin_stream_count(data)
+    bs.atomic_window = atomic_window
+    bs.enter_atomic_mode()
+    ## Same results as outside of the atomic mode
+    for start, l in [(10, 1), (11, 2), (9, 1), (9, 4), (8, 6), (30, 2),
+                     (29, 1), (62, 2), (60, 1), (0, 64), (63, 1)]:
+        assert bs.getbytes(start, l) == data[start:start + l]
+    try:
+        bs.getbytes(63, 2)
+    except IOError:
+        pass
+    else:
+        raise AssertionError("Bytes out of the stream")
+    bs.leave_atomic_mode()
+    assert not bs._atomic_mode
+    if atomic_window == 0:
+        ## Only missing bytes are read
+        assert bs.reads == [(10, 1), (11, 2), (9, 1), (8, 1), (13, 1), (30, 2),
+                            (29, 1), (62, 2), (60, 1), (0, 60), (61, 3),
+                            (64, 1)]
+
+## Reads of an instruction are served by one read
+bs = bin_stream_count(data)
+bs.enter_atomic_mode()
+for offset in range(10, 20):
+    bs.getbytes(offset)
+bs.leave_atomic_mode()
+assert bs.reads == [(10, bs.atomic_window)]
+## The window is dropped when leaving the atomic mode
+bs.enter_atomic_mode()
+bs.getbytes(10)
+bs.leave_atomic_mode()
+assert len(bs.reads) == 2
+
+
+# mmap bin_stream
+tmp_dir = tempfile.mkdtemp()
+try:
+    path = os.path.join(tmp_dir, "data.bin")
+    with open(path, "wb") as fdesc:
+        fdesc.write(data)
+    for base_address in [0, 0x1000]:
+        bs_ref = bin_stream_str(data, base_address=base_address)
+        for bs in [bin_stream_mmap(path, base_address=base_address),
+                   bin_stream_mmap(open(path, "rb"), base_address=base_address)]:
+            assert bs.getlen() == bs_ref.getlen()
+            assert bytes(bs) == data
+            for start in range(0, len(data)):
+                for l in range(0, 8):
+                    try:
+                        ref = bs_ref.getbytes(base_address + start, l)
+                    except IOError:
+                        ref = None
+                    try:
+                        value = bs.getbytes(base_address + start, l)
+                    except IOError:
+                        value = None
+                    assert value == ref
+                    if ref is not None:
+                        assert bytes(bs.getview(base_address + start, l)) == ref
+            for start in range(0, 8 * 16):
+                for n in range(0, 40):
+                    bit_start = base_address * 8 + start
+                    assert bs.getbits(bit_start, n) == bs_ref.getbits(
+                        bit_start, n
+                    )
+            for offset in [-1, len(data)]:
+                try:
+                    bs.getbytes(base_address + offset)
+                except IOError:
+                    pass
+                else:
+                    raise AssertionError("Bytes out of the file")
+            bs.setoffset(base_address + 4)
+            assert bs.readbs(4) == data[4:8]
+            assert bs.getlen() == len(data) - 8
+            bs.close()
+
+    ## Empty file
+    path_empty = os.path.join(tmp_dir, "empty.bin")
+    open(path_empty, "wb").close()
+    bs = bin_stream_mmap(path_empty)
+    assert bs.getlen() == 0
+    assert bytes(bs) == b""
+    bs.close()
+
+    ## Disassembly
+    for name in ["x86_32", "arml", "mips32b", "msp430"]:
+        machine = Machine(name)
+        result = []
+        for bs in [bin_stream_str(data), bin_stream_mmap(path)]:
+            mdis = machine.dis_engine(bs, loc_db=LocationDB())
+            linear = mdis.dis_linear(0)
+            result.append(list(linear))
+        assert result[0] == result[1]
+        print(name, len(result[0]), "instructions")
+finally:
+    shutil.rmtree(tmp_dir)
@@ -0,0 +1,285 @@
+from __future__ import print_function
+import logging
+import random
+import sys
+import threading
+
+from miasm.analysis.machine import Machine
+from miasm.core.asmblock import log_asmblock
+from miasm.core.bin_stream import bin_stream_str
+from miasm.core.locationdb import LocationDB
+from miasm.core.utils import LRUCache
+
+# Make thread switches as frequent as possible
+if hasattr(sys, "setswitchinterval"):
+    sys.setswitchinterval(1e-6)
+
+THREADS = 8
+
+
+def run_threads(func, chunks):
+    """Run @func on each chunk of @chunks in its own thread
+    Return the concatenation of the results"""
+    results = [None] * len(chunks)
+
+    def worker(index):
+        results[index] = func(chunks[index])
+
+    threads = [
+        threading.Thread(target=worker, args=(index,))
+        for index in range(len(chunks))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    out = []
+    for result in results:
+        out += result
+    return out
+
+
+def decode_all(mn, attrib, vectors):
+    """Return the disassembly (or the error) of each byte string of
+    @vectors"""
+    out = []
+    for data in vectors:
+        try:
+            instr = mn.dis(data, attrib)
+        except Exception as error:
+            out.append((error.__class__.__name__, None, None))
+            continue
+        out.append((str(instr), instr.l, instr.b))
+    return out
+
+
+def templates_state(mn, candidates=None):
+    """Return the values held by the decoding templates of @mn
+    @candidates: (optional) candidates whose templates are returned, default
+    to the already built ones
+    """
+    if candidates is None:
+        candidates = list(mn.all_mn_inst)
+    state = {}
+    for candidate in candidates:
+        state[candidate] = [
+            tuple(
+                (field.l, field.value, getattr(field, "expr", None))
+                for field in template.fields_order
+            )
+            for template in mn.all_mn_inst[candidate]
+        ]
+    return state
+
+
+rnd = random.Random(0x11)
+for name, attrib in [("x86_64", 64), ("x86_32", 32), ("arml", "l"),
+                     ("aarch64l", "l"), ("mips32b", "b")]:
+    machine = Machine(name)
+    mn = machine.mn
+    vectors = [
+        bytes(bytearray(rnd.randrange(0x100) for _ in range(15)))
+        for _ in range(500)
+    ]
+    # Populate the templates before taking a snapshot
+    decode_all(mn, attrib, vectors[:10])
+    state = templates_state(mn)
+
+    expected = decode_all(mn, attrib, vectors)
+    assert templates_state(mn, state) == state
+
+    chunks = [vectors[i::THREADS] for i in range(THREADS)]
+    expected_chunks = []
+    for i in range(THREADS):
+        expected_chunks += expected[i::THREADS]
+    for _ in range(3):
+        result = run_threads(
+            lambda chunk: decode_all(mn, attrib, chunk),
+            chunks
+        )
+        assert result == expected_chunks
+    assert templates_state(mn, state) == state
+    print(name, len(vectors), "instructions")
+
+
+# Threads disassembling blocks of a shared stream
+log_asmblock.setLevel(logging.ERROR)
+data = bytes(bytearray(rnd.randrange(0x100) for _ in range(0x2000)))
+stream = bin_stream_str(data)
+machine = Machine("x86_32")
+
+
+def dis_blocks(offsets):
+    mdis = machine.dis_engine(stream, loc_db=LocationDB())
+    mdis.dont_dis_nulstart_bloc = True
+    out = []
+    for offset in offsets:
+        block = mdis.dis_block(offset)
+        out.append([str(line) for line in block.lines])
+    return out
+
+
+offsets = list(range(0, 0x2000, 0x40))
+chunks = [offsets[i::THREADS] for i in range(THREADS)]
+expected = []
+for chunk in chunks:
+    expected += dis_blocks(chunk)
+assert run_threads(dis_blocks, chunks) == expected
+print("blocks", len(expected))
+
+
+# Decoded instructions cache
+def decode_stream(mn, attrib, stream, offsets, cache=None):
+    """Return the disassembly (or the error) at each offset of @offsets"""
+    out = []
+    for offset in offsets:
+        try:
+            instr = mn.dis(stream, attrib, offset, cache=cache)
+        except Exception as error:
+            out.append((error.__class__.__name__, None, None, None))
+            continue
+        out.append((str(instr), instr.l, instr.b, instr.offset))
+    return out
+
+
+for name, attrib in [("x86_64", 64), ("x86_32", 32), ("arml", "l"),
+                     ("armtl", "l"), ("aarch64l", "l"), ("mips32l", "l"),
+                     ("msp430", None), ("ppc32b", "b")]:
+    machine = Machine(name)
+    mn = machine.mn
+    # Few distinct byte patterns, at every alignment
+    patterns = [
+        bytes(bytearray(rnd.randrange(0x100) for _ in range(8)))
+        for _ in range(16)
+    ]
+    data = b"".join(rnd.choice(patterns) for _ in range(0x80))
+    stream = bin_stream_str(data)
+    offsets = list(range(len(data)))
+    expected = decode_stream(mn, attrib, stream, offsets)
+
+    cache = LRUCache(0x1000)
+    assert decode_stream(mn, attrib, stream, offsets, cache) == expected
+    stats = cache.stats()
+    assert stats["hits"] > 0
+    assert stats["hits"] + stats["misses"] <= len(offsets)
+    # Served from the cache
+    cache.reset_stats()
+    assert decode_stream(mn, attrib, stream, offsets, cache) == expected
+    assert cache.stats()["misses"] <= len(offsets) - len(cache)
+    print(name, "cache", stats)
+
+    # Architecture wide cache
+    mn.enable_dis_cache(0x1000)
+    try:
+        assert decode_stream(mn, attrib, stream, offsets) == expected
+        assert mn.dis_cache.hits > 0
+    finally:
+        mn.disable_dis_cache()
+
+# Cached instructions are independent copies
+machine = Machine("x86_32")
+mn = machine.mn
+cache = LRUCache(10)
+stream = bin_stream_str(b"\xeb\x02" * 16)
+instr = mn.dis(stream, 32, 0, cache=cache)
+loc_db = LocationDB()
+instr.dstflow2label(loc_db)
+instr2 = mn.dis(stream, 32, 4, cache=cache)
+assert cache.hits == 1
+assert instr2.offset == 4
+assert instr2.args == mn.dis(stream, 32, 4).args
+assert instr.args[0].is_loc()
+
+# Prefixes of a cached x86 instruction are not shared with its copies
+stream_rep = bin_stream_str(b"\xf3\xa4" * 16)
+instr = mn.dis(stream_rep, 32, 0, cache=cache)
+instr.additional_info.g1.value = 0
+instr2 = mn.dis(stream_rep, 32, 2, cache=cache)
+assert instr2.additional_info.g1.value == \
+    mn.dis(stream_rep, 32, 2).additional_info.g1.value
+assert instr2.additional_info.g1.value != 0
+assert str(instr2).strip() == "REP MOVSB"
+
+# Through the disassembly engine
+mdis = machine.dis_engine(stream, loc_db=LocationDB(), dis_cache=cache)
+block = mdis.dis_block(0)
+assert block.lines[0].offset == 0
+assert cache.hits == 3
+
+
+# Instructions encodings cache
+from miasm.core import parse_asm
+from miasm.core.asmblock import asm_resolve_final
+
+
+def encode_instrs(mn, instrs, cache=None):
+    """Return the encodings (or the error) of each instruction of @instrs"""
+    out = []
+    for instr in instrs:
+        try:
+            out.append(mn.asm(instr, cache=cache))
+        except Exception as error:
+            out.append(error.__class__.__name__)
+    return out
+
+
+for name, attrib in [("x86_64", 64), ("x86_32", 32), ("arml", "l"),
+                     ("aarch64l", "l"), ("mips32l", "l"), ("msp430", None)]:
+    machine = Machine(name)
+    mn = machine.mn
+    patterns = [
+        bytes(bytearray(rnd.randrange(0x100) for _ in range(8)))
+        for _ in range(16)
+    ]
+    instrs = []
+    for pattern in patterns * 2:
+        try:
+            instrs.append(mn.dis(pattern, attrib))
+        except Exception:
+            continue
+    expected = encode_instrs(mn, instrs)
+    cache = LRUCache(0x1000)
+    assert encode_instrs(mn, instrs, cache) == expected
+    assert cache.hits > 0
+    # Returned encodings are independent copies
+    for encodings in encode_instrs(mn, instrs, cache):
+        if isinstance(encodings, list):
+            encodings.append(b"")
+    assert encode_instrs(mn, instrs, cache) == expected
+    print(name, "asm cache", cache.stats())
+
+# Assembly with an architecture wide cache
+machine = Machine("x86_32")
+mn = machine.mn
+source = """
+main:
+    MOV EAX, 0x1
+loop:
+    ADD EAX, 0x1
+    CMP EAX, 0x100
+    JZ end
+    MOV EBX, 0x1
+    JMP loop
+end:
+    MOV EAX, 0x1
+    RET
+"""
+
+
+def assemble(source):
+    loc_db = LocationDB()
+    asmcfg = parse_asm.parse_txt(mn, 32, source, loc_db)
+    loc_db.set_location_offset(loc_db.get_name_location("main"), 0x1000)
+    return asm_resolve_final(mn, asmcfg)
+
+expected = assemble(source)
+cache = mn.enable_asm_cache(0x1000)
+try:
+    assert assemble(source) == expected
+    assert cache.hits > 0
+    # Served from the cache
+    cache.reset_stats()
+    assert assemble(source) == expected
+    assert cache.misses == 0
+finally:
+    mn.disable_asm_cache()
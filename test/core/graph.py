@@ -308,3 +308,17 @@ graph.add_edge(3, 4)
 
 components = graph.compute_weakly_connected_components()
 assert sorted(components) == [set([1, 2]), set([3, 4])]
+
+
+# Test del_edges
+graph = DiGraph()
+graph.add_edge(1, 2)
+graph.add_edge(1, 2)
+graph.add_edge(2, 3)
+graph.add_edge(3, 1)
+
+graph.del_edges([(1, 2), (3, 1)])
+assert sorted(graph.edges()) == [(1, 2), (2, 3)]
+assert graph.successors(1) == [2]
+assert graph.predecessors(1) == []
+assert graph.successors(3) == []
@@ -0,0 +1,118 @@
+from __future__ import print_function
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+
+from miasm.core import table_cache
+from miasm.core.table_cache import cached_table
+
+# The cache is disabled by default
+enabled = table_cache.enabled
+table_cache.enabled = True
+
+tmp_dir = tempfile.mkdtemp()
+try:
+    table_cache.cache_dir = os.path.join(tmp_dir, "cache")
+    source = os.path.join(tmp_dir, "source.py")
+    with open(source, "w") as fdesc:
+        fdesc.write("TABLE = 1\n")
+
+    builds = []
+
+    def builder():
+        builds.append(None)
+        return {"table": list(range(10))}
+
+    # First build, then load
+    assert cached_table("test", builder, [source]) == {"table": list(range(10))}
+    assert len(builds) == 1
+    assert cached_table("test", builder, [source]) == {"table": list(range(10))}
+    assert len(builds) == 1
+
+    # Different additional data
+    cached_table("test", builder, [source], extra=[1, 2])
+    assert len(builds) == 2
+    cached_table("test", builder, [source], extra=[1, 2])
+    assert len(builds) == 2
+
+    # Source modification
+    with open(source, "w") as fdesc:
+        fdesc.write("TABLE = 2\n")
+    table_cache._sources_digests.clear()
+    cached_table("test", builder, [source])
+    assert len(builds) == 3
+
+    # Corrupted cache file
+    path = table_cache.table_path("test", [source])
+    with open(path, "wb") as fdesc:
+        fdesc.write(b"garbage")
+    assert cached_table("test", builder, [source]) == {"table": list(range(10))}
+    assert len(builds) == 4
+    cached_table("test", builder, [source])
+    assert len(builds) == 4
+
+    if hasattr(os, "getuid"):
+        # The cache directory is private
+        assert os.stat(table_cache.cache_dir).st_mode & 0o777 == 0o700
+        # Directory writable by other users: tables are not loaded nor saved
+        os.chmod(table_cache.cache_dir, 0o777)
+        for count in [5, 6]:
+            cached_table("test", builder, [source])
+            assert len(builds) == count
+        os.chmod(table_cache.cache_dir, 0o700)
+        cached_table("test", builder, [source])
+        assert len(builds) == 6
+
+    # Disabled cache
+    table_cache.enabled = False
+    builds[:] = []
+    cached_table("test", builder, [source])
+    assert len(builds) == 1
+    table_cache.enabled = True
+
+    # Architecture tables loaded by another process: fields names differ
+    # between processes
+    script = """
+import sys
+from miasm.analysis.machine import Machine
+from miasm.core.utils import decode_hex
+for name, attrib, data in [
+        ("x86_32", 32, "8d4c2404"), ("x86_64", 64, "48c7c001000000"),
+        ("x86_16", 16, "66b801000000"), ("x86_64", 64, "f30f1efa"),
+        ("arml", "l", "0e10a0e1"), ("aarch64l", "l", "e1031f2a"),
+        ("mips32b", "b", "27bdffe0"), ("ppc32b", "b", "7c0802a6"),
+        ("msp430", None, "3f4000f0")]:
+    mn = Machine(name).mn
+    print(name, mn.dis(decode_hex(data), attrib))
+    for value, (candidates, pending) in enumerate(mn.get_dispatch_table()):
+        sys.stdout.write("%d %s %s\\n" % (
+            value,
+            sorted(c.__name__ for c in candidates),
+            sorted((len(values), branch[0][:3], pos)
+                   for values, branch, pos in pending)
+        ))
+"""
+    env = dict(os.environ)
+    env.pop("MIASM_TABLE_CACHE", None)
+    env["MIASM_CACHE_DIR"] = os.path.join(tmp_dir, "default")
+    outputs = [
+        subprocess.check_output([sys.executable, "-c", script], env=env)
+    ]
+    # Nothing is written by default
+    assert not os.path.exists(env["MIASM_CACHE_DIR"])
+    env["MIASM_CACHE_DIR"] = table_cache.cache_dir
+    env["MIASM_TABLE_CACHE"] = "1"
+    for _ in range(2):
+        outputs.append(
+            subprocess.check_output([sys.executable, "-c", script], env=env)
+        )
+    assert os.listdir(table_cache.cache_dir)
+    assert outputs[0] == outputs[1] == outputs[2]
+    print(b"\n".join(
+        line for line in outputs[0].splitlines() if not line[:1].isdigit()
+    ).decode())
+finally:
+    shutil.rmtree(tmp_dir)
+    table_cache.enabled = enabled
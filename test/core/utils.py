@@ -37,6 +37,37 @@ class TestUtils(unittest.TestCase):
         assert("element2" in bd)
         self.assertEqual(bd["element2"], "value2")
 
+    def test_lruCache(self):
+        from miasm.core.utils import LRUCache
+
+        cache = LRUCache(3)
+        for i in range(3):
+            cache[i] = str(i)
+        self.assertEqual(cache[0], "0")
+
+        # 1 is the least recently used element
+        cache[3] = "3"
+        assert(1 not in cache)
+        self.assertEqual(sorted(cache), [0, 2, 3])
+        self.assertEqual(cache.get(1), None)
+        self.assertEqual(cache.get(2), "2")
+
+        # Updating an element does not evict anything
+        cache[3] = "three"
+        self.assertEqual(len(cache), 3)
+
+        stats = cache.stats()
+        self.assertEqual(stats["size"], 3)
+        self.assertEqual(stats["max_size"], 3)
+        self.assertEqual(stats["hits"], 2)
+        self.assertEqual(stats["misses"], 1)
+        self.assertEqual(stats["evictions"], 1)
+
+        cache.clear()
+        cache.reset_stats()
+        self.assertEqual(len(cache), 0)
+        self.assertEqual(cache.stats()["hits"], 0)
+
 
 if __name__ == '__main__':
     testsuite = unittest.TestLoader().loadTestsFromTestCase(TestUtils)
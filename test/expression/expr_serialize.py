@@ -0,0 +1,73 @@
+from __future__ import print_function
+import pickle
+
+from miasm.expression.expression import *
+from miasm.expression.expression_helper import ExprRandom
+from miasm.expression.expression_serialize import expr_dumps, expr_loads, \
+    write_varint, read_varint
+
+
+# Varints
+for value in [0, 1, 0x7F, 0x80, 0x3FFF, 0x4000, 1 << 64, (1 << 200) - 1]:
+    out = bytearray()
+    write_varint(out, value)
+    assert read_varint(out, 0) == (value, len(out))
+out = bytearray()
+write_varint(out, 0x7F)
+assert len(out) == 1
+
+a = ExprId("test", 8)
+b = ExprInt(1338, 8)
+c = a + b
+d = ExprCompose(a, b)
+e = ExprMem(a, 32)
+f = a[:8]
+aff = ExprAssign(a, b)
+loc = ExprLoc(LocKey(42), 32)
+cond = ExprCond(a[:1], c, a)
+id_bytes = ExprId(b"bytes_name", 16)
+big = ExprInt((1 << 128) - 1, 128)
+
+exprs = [a, b, c, d, e, f, aff, loc, cond, id_bytes, big]
+data = expr_dumps(exprs)
+new_exprs = expr_loads(data)
+assert new_exprs == exprs
+# Expressions are re-interned
+for expr, new_expr in zip(exprs, new_exprs):
+    assert expr is new_expr
+assert isinstance(new_exprs[-2].name, bytes)
+
+# Shared sub-expressions are stored once
+shared = ExprId("shared_identifier_with_a_long_name", 32)
+exprs = [shared]
+for i in range(100):
+    exprs.append(exprs[-1] + ExprInt(i, 32))
+assert len(expr_dumps(exprs)) < len(pickle.dumps(exprs))
+assert expr_loads(expr_dumps(exprs)) == exprs
+
+# Random expressions
+for _ in range(100):
+    try:
+        expr = ExprRandom.get(depth=6)
+    except ValueError:
+        # Generator may produce inconsistent sizes
+        continue
+    assert expr_loads(expr_dumps([expr])) == [expr]
+
+# Without singletons
+data = expr_dumps([c, d, cond])
+Expr.use_singleton = False
+new_c, new_d, new_cond = expr_loads(data)
+assert new_c is not c
+assert new_c == c
+assert new_d == d
+assert new_cond == cond
+Expr.use_singleton = True
+
+# Corrupted data
+try:
+    expr_loads(b"NOTMIASM" + data[8:])
+except ValueError:
+    pass
+else:
+    raise AssertionError("Invalid data must be rejected")
@@ -116,3 +116,141 @@ assign3 = ExprAssign(mem1, mem2)
 assert assign3.get_r() == set([mem2])
 assert assign3.get_r(mem_read=True) == set([mem1, mem2, A, B])
 assert assign3.get_w() == set([mem1])
+
+# Singletons interning
+import gc
+stats = Expr.interning_stats()
+assert stats["exprs"] > 0 and stats["bytes"] > 0
+
+generation = Expr.new_generation()
+expr = ExprOp("+", ExprId("gen_a", 32), ExprInt(0x1337, 32))
+expr_id = id(expr)
+assert expr is ExprOp("+", ExprId("gen_a", 32), ExprInt(0x1337, 32))
+del expr
+gc.collect()
+# Kept alive by the generation
+assert id(ExprOp("+", ExprId("gen_a", 32), ExprInt(0x1337, 32))) == expr_id
+assert Expr.interning_stats()["generations"] >= 3
+assert Expr.drop_generation(generation) >= 3
+assert Expr.interning_stats()["generations"] == 0
+# No generation left to drop
+try:
+    Expr.drop_generation()
+except ValueError:
+    pass
+else:
+    raise AssertionError("Dropped a missing generation")
+gc.collect()
+# Released once nobody references it
+gen_a, gen_cst = ExprId("gen_a", 32), ExprInt(0x1337, 32)
+assert (ExprOp, ("+", (gen_a, gen_cst))) not in Expr.args2expr
+
+# Iterative visitors
+import random
+import time
+random.seed(0)
+
+def deep_expr(depth):
+    """Return an expression nesting @depth random sub-expressions"""
+    expr = ExprRandom.get(depth=2, clean=False)
+    for _ in range(depth):
+        son = ExprRandom.get(depth=2, clean=False)
+        if random.random() < 0.5:
+            expr = ExprOp(random.choice("+^&|"), expr, son)
+        else:
+            expr = ExprCompose(expr[:16], son[16:])
+    return expr
+
+def increment_int(expr):
+    if expr.is_int():
+        return ExprInt(int(expr) + 1, expr.size)
+    return expr
+
+for expr in [deep_expr(50) for _ in range(10)] + [assign2, assign3]:
+    assert (
+        ExprVisitorCallbackBottomToTop(increment_int).visit(expr) ==
+        ExprVisitorCallbackBottomToTopIterative(increment_int).visit(expr)
+    )
+    for mem_read in [False, True]:
+        for cst_read in [False, True]:
+            visitor = ExprGetR(mem_read, cst_read)
+            visitor.visit(expr)
+            assert visitor.elements == expr.get_r(mem_read, cst_read)
+    for walk_cls, walk_iter_cls in [(ExprWalkBase, ExprWalkBaseIterative),
+                                    (ExprWalk, ExprWalkIterative)]:
+        walked, walked_iter = [], []
+        walk_cls(walked.append).visit(expr)
+        walk_iter_cls(walked_iter.append).visit(expr)
+        assert walked == walked_iter
+
+# Stop on callback result
+walk_c = ExprId("walk_c", 32)
+expr = ExprCompose(A - B, walk_c + B)
+walked = []
+def stop_on_c(expr):
+    walked.append(expr)
+    return expr == walk_c
+assert ExprWalkIterative(stop_on_c).visit(expr) is True
+assert walked == [A, B, -B, A - B, walk_c]
+
+# Deep expressions do not reach the recursion limit
+expr = deep_expr(5000)
+assert A not in expr
+assert expr.visit(lambda expr: expr) == expr
+assert expr.get_r(cst_read=True)
+
+# Benchmark against recursive visitors
+expr = deep_expr(100)
+for name, visitor_cls, visitor_iter_cls in [
+        ("visit", ExprVisitorCallbackBottomToTop,
+         ExprVisitorCallbackBottomToTopIterative),
+        ("walk", ExprWalk, ExprWalkIterative),
+]:
+    timings = []
+    for cls in [visitor_cls, visitor_iter_cls]:
+        start = time.time()
+        for _ in range(20):
+            cls(lambda expr: None if name == "walk" else expr).visit(expr)
+        timings.append(time.time() - start)
+    print("%s: recursive %.3fs, iterative %.3fs" % (name, timings[0], timings[1]))
+timings = []
+for cls in [ExprGetR, ExprGetRIterative]:
+    start = time.time()
+    for _ in range(20):
+        cls().visit(expr)
+    timings.append(time.time() - start)
+print("get_r: recursive %.3fs, iterative %.3fs" % (timings[0], timings[1]))
+
+# Structural metadata
+meta_a, meta_b = ExprId("meta_a", 32), ExprId("meta_b", 32)
+meta_mem = ExprMem(meta_a + meta_b, 32)
+expr = ExprCompose(meta_mem[:16], (meta_a ^ meta_mem)[16:])
+assert meta_a.depth() == 1
+assert meta_mem.depth() == 3
+assert expr.depth() == 6
+assert meta_mem.node_count() == 4
+assert expr.node_count() == 1 + (1 + 4) + (1 + 1 + 1 + 4)
+assert expr.may_contain(meta_mem)
+assert not meta_a.may_contain(meta_mem)
+assert meta_mem in expr
+assert (meta_a + meta_b) in expr
+assert (meta_a ^ meta_b) not in expr
+assert expr not in meta_mem
+
+# Read sets are cached, but returned as new sets
+reads = expr.get_r()
+assert reads == set([meta_mem, meta_a])
+reads.add(meta_b)
+assert expr.get_r() == set([meta_mem, meta_a])
+assert expr.get_r(mem_read=True) == set([meta_mem, meta_a, meta_b])
+
+# Bloom filter short-cut is consistent with a real search
+def contains_walk(expr, needle):
+    return ExprWalkIterative(lambda sub: sub == needle or None).visit(expr)
+
+for _ in range(50):
+    expr = deep_expr(10)
+    candidates = list(expr.get_r(mem_read=True, cst_read=True))
+    candidates += [ExprId("not_in_expr", 32), expr, expr + expr]
+    for needle in candidates:
+        assert (needle in expr) == bool(contains_walk(expr, needle))
@@ -16,3 +16,72 @@ for expr_test in [ExprInt(0x12, 32),
 
     print('Test: %s' % expr_test)
     assert str_to_expr(repr(expr_test)) == expr_test
+
+# Hand-written parser and pyparsing grammar accept the same language
+import random
+import time
+from miasm.expression.expression_helper import ExprRandom
+from miasm.expression.parser import str_to_expr_pyparsing
+
+def parse_result(parser, str_in):
+    try:
+        return parser(str_in)
+    except RuntimeError:
+        return None
+
+for str_in in [
+        " ExprInt( - 0x10 ,32 )trailing characters",
+        "ExprInt(012, 8)",
+        "ExprInt(0X10, 32)",
+        "ExprInt(0xg, 32)",
+        "ExprInt(1, 32",
+        "ExprInt(1,, 32)",
+        "ExprIntX(1, 32)",
+        "",
+        "ExprId('a\\\\b', 32)",
+        "ExprId('a\\'b', 32)",
+        "ExprId('a\\\\', 32)",
+        "ExprId(' , 32)",
+        "ExprInt(- , 32)",
+        "ExprId(\"x\\ty\", 8)",
+        "ExprId('x\ty', 8)",
+        "ExprLoc(<LocKey12>,32)",
+        "ExprLoc(< LocKey 12 >, 32)",
+        "ExprOp('+')",
+        "ExprOp(\"'\", ExprInt(1, 32), ExprInt(2, 32))",
+        "ExprCompose()",
+        "ExprCompose(ExprInt(0x2, 2),)",
+        "ExprSlice(ExprInt(1, 32), 8, 0)",
+]:
+    assert parse_result(str_to_expr, str_in) == \
+        parse_result(str_to_expr_pyparsing, str_in), str_in
+
+random.seed(0)
+corpus = []
+while len(corpus) < 500:
+    try:
+        expr = ExprRandom.get(depth=5, clean=False)
+    except ValueError:
+        # Generator may produce inconsistent sizes
+        continue
+    corpus.append(repr(expr))
+
+for str_in in corpus:
+    assert parse_result(str_to_expr, str_in) is \
+        parse_result(str_to_expr_pyparsing, str_in)
+
+# Benchmark
+for parser in [str_to_expr, str_to_expr_pyparsing]:
+    start = time.time()
+    for str_in in corpus:
+        parse_result(parser, str_in)
+    print("%s: %d bytes in %.3fs" % (
+        parser.__name__,
+        sum(len(str_in) for str_in in corpus),
+        time.time() - start
+    ))
+
+# Deep expressions
+expr = str_to_expr("ExprMem(" * 2000 + "ExprId('deep', 32)" + ", 32)" * 2000)
+assert expr.depth() == 2001
+assert expr.get_r(mem_read=True) >= set([ExprId('deep', 32)])
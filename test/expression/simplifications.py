@@ -986,4 +986,66 @@ for x, y in to_test:
     assert(str(x) == str(y))
     print(x)
 
+
+# Shared simplification cache
+from miasm.core.utils import LRUCache
+
+cache = LRUCache(0x100)
+simp_1 = ExpressionSimplifier(cache)
+simp_1.enable_passes(ExpressionSimplifier.PASS_COMMONS)
+simp_2 = ExpressionSimplifier(cache)
+simp_2.enable_passes(ExpressionSimplifier.PASS_COMMONS)
+simp_explicit = ExpressionSimplifier(cache)
+simp_explicit.enable_passes(ExpressionSimplifier.PASS_HIGH_TO_EXPLICIT)
+assert simp_1.passes_fingerprint == simp_2.passes_fingerprint
+assert simp_1.passes_fingerprint != simp_explicit.passes_fingerprint
+
+expr = (a + ExprInt(1, 32)) + ExprInt(2, 32)
+assert simp_1(expr) == a + ExprInt(3, 32)
+misses = cache.misses
+# Served by the cache filled by simp_1
+assert simp_2(expr) == a + ExprInt(3, 32)
+assert cache.misses == misses
+# Do not share results of other passes
+assert simp_explicit(expr) != a + ExprInt(3, 32)
+assert cache.misses > misses
+assert simp_2.cache_stats()["size"] <= 0x100
+
+# Operator indexed passes
+from miasm.expression import simplifications_common
+op_passes = [simp_func for _, simp_func in simp_1.get_op_passes(a + b)]
+assert simplifications_common.simp_cst_propagation in op_passes
+assert simplifications_common.simp_add_multiple in op_passes
+assert simplifications_common.simp_flag_cst not in op_passes
+op_passes = [simp_func for _, simp_func in simp_1.get_op_passes(a.zeroExtend(64))]
+assert simplifications_common.simp_double_zeroext in op_passes
+assert simplifications_common.simp_double_signext not in op_passes
+# Passes of the new operator are run once a pass changes the operator
+assert simp_1(ExprOp("FLAG_SUB_CF", ExprInt(0, 32), a)) == ExprCond(
+    a, ExprInt(1, 1), ExprInt(0, 1)
+)
+
+# Passes profiling
+simp_profiled = ExpressionSimplifier()
+simp_profiled.enable_passes(ExpressionSimplifier.PASS_COMMONS)
+profile = simp_profiled.enable_profiling()
+assert simp_profiled((a + ExprInt(1, 32)) + ExprInt(2, 32)) == a + ExprInt(3, 32)
+assert simp_profiled(ExprCond(ExprInt(1, 1), a, b)) == a
+stats = profile.as_dict()
+assert stats["simplifications_common.simp_cst_propagation"]["calls"] > 0
+assert stats["simplifications_common.simp_cst_propagation"]["rewrites"] > 0
+assert stats["simplifications_common.simp_cond"]["rewrites"] == 1
+for stat in stats.values():
+    assert stat["rewrites"] <= stat["calls"]
+    assert 0 <= stat["own_time"] <= stat["time"]
+# Only enabled passes are recorded
+assert "simplifications_explicit.simp_flags" not in stats
+assert "simp_cst_propagation" in profile.report()
+simp_profiled.disable_profiling()
+calls = stats["simplifications_common.simp_cst_propagation"]["calls"]
+simp_profiled(a * ExprInt(1, 32) + ExprInt(3, 32))
+assert profile.as_dict()["simplifications_common.simp_cst_propagation"]["calls"] == calls
+profile.reset()
+assert profile.as_dict() == {}
+
 print('all tests ok')
@@ -0,0 +1,132 @@
+from __future__ import print_function
+import gc
+import os
+import sys
+import time
+
+from future.utils import viewitems, viewvalues
+
+from miasm.analysis.binary import Container
+from miasm.analysis.machine import Machine
+from miasm.core.locationdb import LocationDB
+from miasm.expression.simplifications import expr_simp
+from miasm.ir.ir import AssignBlock, IRBlock
+
+try:
+    import tracemalloc
+except ImportError:
+    # Python 2
+    tracemalloc = None
+
+SAMPLES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "example",
+    "samples"
+)
+
+
+def whole_program_ircfg(sample):
+    """Return the IRCFG of the functions reachable from the entry point and
+    the main function of @sample"""
+    loc_db = LocationDB()
+    data = open(os.path.join(SAMPLES, sample), "rb").read()
+    cont = Container.from_string(data, loc_db)
+    machine = Machine(cont.arch)
+    mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db, follow_call=True)
+    asmcfg = mdis.dis_multiblock(cont.entry_point)
+    mdis.dis_multiblock(loc_db.get_name_offset("main"), asmcfg)
+    lifter = machine.lifter_model_call(loc_db)
+    return lifter.new_ircfg_from_asmcfg(asmcfg)
+
+
+def container_size(ircfg):
+    """Return the size of the IRBlocks and AssignBlocks of @ircfg, and the size
+    they would have with a dictionary per AssignBlock (expressions, which are
+    shared, are not counted)"""
+    size = dict_size = 0
+    for irblock in viewvalues(ircfg.blocks):
+        common = sys.getsizeof(irblock) + sys.getsizeof(irblock.assignblks)
+        size += common
+        dict_size += common
+        for assignblk in irblock:
+            slots = sys.getsizeof(assignblk)
+            size += slots + sys.getsizeof(assignblk._dsts)
+            size += sys.getsizeof(assignblk._srcs)
+            dict_size += slots + sys.getsizeof(dict(viewitems(assignblk)))
+    return size, dict_size
+
+
+def rebuild(ircfg, trusted):
+    """Rebuild all the blocks of @ircfg, using the checked or the @trusted
+    constructors"""
+    blocks = []
+    for irblock in viewvalues(ircfg.blocks):
+        if trusted:
+            assignblks = tuple(
+                AssignBlock.from_trusted(dict(assignblk), assignblk.instr)
+                for assignblk in irblock
+            )
+            blocks.append(
+                IRBlock.from_trusted(irblock.loc_db, irblock.loc_key,
+                                     assignblks)
+            )
+        else:
+            assignblks = [
+                AssignBlock(dict(assignblk), assignblk.instr)
+                for assignblk in irblock
+            ]
+            blocks.append(
+                IRBlock(irblock.loc_db, irblock.loc_key, assignblks)
+            )
+    return blocks
+
+
+def measure(func, *args):
+    """Return the result of func(*args), its duration and the memory it
+    allocated (None without tracemalloc)"""
+    gc.collect()
+    allocated = None
+    if tracemalloc is not None:
+        tracemalloc.start()
+    start = time.time()
+    result = func(*args)
+    duration = time.time() - start
+    if tracemalloc is not None:
+        allocated = tracemalloc.get_traced_memory()[0]
+        tracemalloc.stop()
+    return result, duration, allocated
+
+
+def fmt_size(size):
+    if size is None:
+        return "n/a"
+    return "%.2fMB" % (size / (1024. * 1024))
+
+
+for sample in ["dse_crackme", "md5_arm", "md5_aarch64l"]:
+    ircfg = whole_program_ircfg(sample)
+    assignblks = sum(len(irblock) for irblock in viewvalues(ircfg.blocks))
+    size, dict_size = container_size(ircfg)
+    print("%s: %d IR blocks, %d AssignBlocks" % (
+        sample, len(ircfg.blocks), assignblks
+    ))
+    print("    blocks containers: %s (with dictionaries: %s)" % (
+        fmt_size(size), fmt_size(dict_size)
+    ))
+    assert size < dict_size
+
+    blocks, duration, allocated = measure(rebuild, ircfg, False)
+    print("    checked rebuild: %.3fs (%s)" % (duration, fmt_size(allocated)))
+    trusted_blocks, duration, allocated = measure(rebuild, ircfg, True)
+    print("    trusted rebuild: %.3fs (%s)" % (duration, fmt_size(allocated)))
+    assert trusted_blocks == blocks
+    assert blocks == list(viewvalues(ircfg.blocks))
+
+    # Unchanged blocks are kept by the simplification
+    while ircfg.simplify(expr_simp):
+        pass
+    ref_blocks = dict(ircfg.blocks)
+    assert not ircfg.simplify(expr_simp)
+    assert all(
+        ircfg.blocks[loc_key] is irblock
+        for loc_key, irblock in viewitems(ref_blocks)
+    )
@@ -0,0 +1,106 @@
+from __future__ import print_function
+
+from miasm.analysis.machine import Machine
+from miasm.core.bin_stream import bin_stream_str
+from miasm.core.locationdb import LocationDB
+from miasm.core.utils import decode_hex
+from miasm.expression.expression import ExprId
+
+# Code containing position independent instructions, PC relative ones and
+# instructions with internal loops (x86 string instructions)
+TESTS = [
+    ("x86_32", "5589e58b4d08f3a4e80a00000083f810740831c055e2e901c8c35dc3"),
+    ("x86_64", "55488d0520000000498b0d00010000e804000000f3a675e84801c8c3"),
+    ("arml", "10402de910008fe208109fe56120a0e1010000eb000050e3f8ffff1a01008"
+     "0e01080bde8"),
+    ("aarch64l", "00000010010000900000018b0200009480ffffb400040091c0035fd6"),
+    ("mips32b", "27bdfff00c000004000000001085fffc000000000085102103e000080000"
+     "0000"),
+]
+BASES = [0x1000, 0x401000, 0x7fff0000, 0x1000]
+
+
+def normalize(loc_db, result):
+    """Return a printable version of the lifting @result, in which locations
+    without offsets are renamed in their appearance order"""
+    names = {}
+
+    def loc_name(loc_key):
+        offset = loc_db.get_location_offset(loc_key)
+        if offset is not None:
+            return "loc_%x" % offset
+        return names.setdefault(loc_key, "fresh_%d" % len(names))
+
+    def fix_loc(expr):
+        if expr.is_loc():
+            return ExprId(loc_name(expr.loc_key), expr.size)
+        return expr
+
+    def fix_assignblk(assignblk):
+        return [
+            (str(dst.visit(fix_loc)), str(src.visit(fix_loc)))
+            for dst, src in assignblk.items()
+        ]
+
+    assignblk, extra = result
+    out = [fix_assignblk(assignblk)]
+    for irblock in extra:
+        out.append(loc_name(irblock.loc_key))
+        out += [fix_assignblk(assignblk) for assignblk in irblock]
+    return out
+
+
+for name, data in TESTS:
+    machine = Machine(name)
+    loc_db = LocationDB()
+    lifter = machine.lifter(loc_db)
+    lifter_cached = machine.lifter(loc_db)
+    cache = lifter_cached.enable_lift_cache()
+    instrs = 0
+    for base in BASES:
+        bs = bin_stream_str(decode_hex(data), base_address=base)
+        mdis = machine.dis_engine(bs, loc_db=loc_db)
+        asmcfg = mdis.dis_multiblock(base)
+        for block in asmcfg.blocks:
+            for instr in block.lines:
+                ref = lifter.instr2ir(instr.clone())
+                ref = normalize(loc_db, ref)
+                lifted = lifter_cached.instr2ir(instr.clone())
+                lifted = normalize(loc_db, lifted)
+                assert ref == lifted, (instr, ref, lifted)
+                instrs += 1
+    # Each instruction is only lifted at the first offset
+    print(name, cache.stats())
+    assert cache.misses == len(cache)
+    assert cache.misses <= instrs // len(BASES)
+    assert cache.hits == instrs - cache.misses
+    # PC relative instructions are cached as templates
+    templates = [template for template in cache.values() if template]
+    assert any(template.placeholders for template in templates)
+    lifter_cached.disable_lift_cache()
+    assert lifter_cached.lift_cache is None
+
+
+# Instructions additional information updated by the lifting
+machine = Machine("x86_32")
+loc_db = LocationDB()
+lifter = machine.lifter(loc_db)
+lifter.enable_lift_cache()
+mdis = machine.dis_engine(bin_stream_str(decode_hex("f3a4")), loc_db=loc_db)
+for _ in range(2):
+    instr = mdis.dis_instr(0)
+    assert not instr.additional_info.except_on_instr
+    _, extra = lifter.instr2ir(instr)
+    assert len(extra) == 4
+    assert instr.additional_info.except_on_instr
+assert lifter.lift_cache.hits == 1
+
+# Lifter settings are part of the cache key
+mdis = machine.dis_engine(bin_stream_str(decode_hex("8b00")), loc_db=loc_db)
+instr = mdis.dis_instr(0)
+lifter.do_ds_segm = True
+assignblk, _ = lifter.instr2ir(instr)
+assert "segm" in str(assignblk)
+lifter.do_ds_segm = False
+assignblk, _ = lifter.instr2ir(instr)
+assert "segm" not in str(assignblk)
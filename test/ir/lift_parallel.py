@@ -0,0 +1,98 @@
+from __future__ import print_function
+import os
+
+from miasm.analysis.binary import Container
+from miasm.analysis.machine import Machine
+from miasm.core.locationdb import LocationDB
+
+SAMPLES = os.path.join(
+    os.path.dirname(os.path.abspath(__file__)), "..", "..", "example",
+    "samples"
+)
+
+
+def analyse(data, **kwargs):
+    """Disassemble and lift the main function of the binary @data
+    Return the LocationDB, the AsmCFG and the IRCFG"""
+    loc_db = LocationDB()
+    cont = Container.from_string(data, loc_db)
+    machine = Machine(cont.arch)
+    mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db, follow_call=True)
+    asmcfg = mdis.dis_multiblock(loc_db.get_name_offset("main"))
+    lifter = machine.lifter_model_call(loc_db)
+    ircfg = lifter.new_ircfg_from_asmcfg(asmcfg, **kwargs)
+    return loc_db, asmcfg, ircfg
+
+
+def summary(loc_db, asmcfg, ircfg):
+    """Return the LocKeys and the IR of the analysis"""
+    lines = {}
+    for block in asmcfg.blocks:
+        for instr in block.lines:
+            lines[id(instr)] = instr
+    out = []
+    for loc_key in sorted(loc_db.loc_keys):
+        out.append((
+            loc_key,
+            loc_db.get_location_offset(loc_key),
+            sorted(loc_db.get_location_names(loc_key)),
+        ))
+    for block in asmcfg.blocks:
+        for instr in block.lines:
+            out.append((instr.offset, instr.to_string(loc_db)))
+    for loc_key, irblock in sorted(ircfg.blocks.items()):
+        out.append((loc_key, str(irblock.dst)))
+        for assignblk in irblock:
+            # Assignments are linked to the instructions of the AsmCFG
+            assert lines[id(assignblk.instr)] is assignblk.instr
+            out.append((assignblk.instr.offset, str(assignblk)))
+    return out
+
+
+for sample in ["dse_crackme", "md5_arm"]:
+    data = open(os.path.join(SAMPLES, sample), "rb").read()
+    ref = analyse(data)
+    ref_summary = summary(*ref)
+    for processes, blocks_per_job in [(2, 1), (3, 4), (2, 1000)]:
+        result = analyse(
+            data, processes=processes, blocks_per_job=blocks_per_job
+        )
+        assert len(result[2].blocks) == len(ref[2].blocks)
+        assert summary(*result) == ref_summary
+    print("%s: %d blocks, %d IR blocks, %d locations" % (
+        sample, len(ref[1].blocks), len(ref[2].blocks),
+        len(ref[0].loc_keys)
+    ))
+
+
+# Without fork, the blocks are lifted in one process
+data = open(os.path.join(SAMPLES, "md5_arm"), "rb").read()
+ref_summary = summary(*analyse(data))
+fork = os.fork
+del os.fork
+try:
+    assert summary(*analyse(data, processes=2, blocks_per_job=1)) == \
+        ref_summary
+finally:
+    os.fork = fork
+
+
+# A failing worker is reported
+class FailingLifter(object):
+    def _lift_blocks(self, blocks):
+        raise ValueError("lifting failure")
+
+
+loc_db = LocationDB()
+cont = Container.from_string(data, loc_db)
+machine = Machine(cont.arch)
+mdis = machine.dis_engine(cont.bin_stream, loc_db=loc_db)
+asmcfg = mdis.dis_multiblock(loc_db.get_name_offset("main"))
+lifter = machine.lifter_model_call(loc_db)
+lifter._lift_blocks = FailingLifter()._lift_blocks
+try:
+    lifter.new_ircfg_from_asmcfg(asmcfg, processes=2, blocks_per_job=1)
+except RuntimeError as error:
+    assert "lifting failure" in str(error)
+else:
+    raise AssertionError("The worker failure is not reported")
@@ -0,0 +1,65 @@
+from __future__ import print_function
+import pickle
+
+from future.utils import viewitems
+
+from miasm.arch.x86.arch import mn_x86
+from miasm.arch.x86.lifter_model_call import LifterModelCall_x86_32
+from miasm.core import parse_asm, asmblock
+from miasm.core.locationdb import LocationDB
+from miasm.expression.expression import ExprId, ExprInt, ExprMem
+from miasm.ir.ir import AssignBlock, IRBlock
+from miasm.ir.serialize import ir_dumps, ir_loads
+
+loc_db = LocationDB()
+asmcfg = parse_asm.parse_txt(
+    mn_x86, 32, '''
+main:
+   MOV    EAX, 1
+   MOV    EBX, DWORD PTR [ESP + 4]
+   MOV    ECX, 2
+   MOV    DX, 2
+
+loop:
+   INC    EBX
+   CMOVZ  EAX, EBX
+   ADD    EAX, ECX
+   PUSH   EAX
+   JZ     loop
+   RET
+''',
+    loc_db
+)
+loc_db.set_location_offset(loc_db.get_name_location("main"), 0x0)
+asmblock.asm_resolve_final(mn_x86, asmcfg)
+
+lifter = LifterModelCall_x86_32(loc_db)
+ircfg = lifter.new_ircfg_from_asmcfg(asmcfg)
+
+# AssignBlock
+a = ExprId("a", 32)
+assignblk = AssignBlock({a: a + ExprInt(1, 32), ExprMem(a, 32): a})
+assert ir_loads(ir_dumps(assignblk)) == assignblk
+
+# IRBlock
+for irblock in ircfg.blocks.values():
+    new_irblock = ir_loads(ir_dumps(irblock), loc_db)
+    assert isinstance(new_irblock, IRBlock)
+    assert new_irblock == irblock
+    assert new_irblock.dst == irblock.dst
+
+# IRCFG
+data = ir_dumps(ircfg)
+new_ircfg = ir_loads(data, loc_db)
+assert new_ircfg.IRDst == ircfg.IRDst
+assert new_ircfg == ircfg
+assert new_ircfg.blocks == ircfg.blocks
+print("IRCFG: %d bytes (pickle: %d bytes)" % (
+    len(data),
+    len(pickle.dumps(ircfg.blocks))
+))
+assert len(data) < len(pickle.dumps(ircfg.blocks))
+
+# Lists
+blocks = list(ircfg.blocks.values())
+assert ir_loads(ir_dumps((blocks, a)), loc_db) == [blocks, a]
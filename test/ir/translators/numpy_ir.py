@@ -0,0 +1,85 @@
+from __future__ import print_function
+import random
+
+import numpy
+
+from miasm.expression.expression import *
+from miasm.ir.translators.python import compile_expr
+from miasm.ir.translators.numpy_ir import batch_eval, compile_expr_batch
+
+random.seed(0)
+
+a = ExprId("a", 32)
+b = ExprId("b", 32)
+c = ExprId("c", 8)
+d = ExprId("d", 64)
+cond = ExprId("cond", 1)
+
+exprs = [
+    a + b,
+    a - b,
+    -a,
+    a * b ^ ExprInt(0x1337, 32),
+    ExprOp("<<<", a, b),
+    ExprOp(">>>", a, b),
+    ExprOp("<<<", a, ExprInt(0, 32)),
+    ExprOp("<<<", d, d[:8].zeroExtend(64)),
+    ExprOp(">>>", d, ExprInt(13, 64)),
+    a << b,
+    a >> b,
+    d << d,
+    d >> ExprInt(63, 64),
+    ExprOp("a>>", a, b),
+    ExprOp("a>>", d, d),
+    ExprOp("==", a, b).zeroExtend(32),
+    ExprOp("<u", a, b).zeroExtend(32),
+    ExprOp("<s", a, b).zeroExtend(32),
+    ExprOp("<=u", a, b).zeroExtend(32),
+    ExprOp("<=s", d, d ^ ExprInt(0x8000000000000000, 64)).zeroExtend(32),
+    c.signExtend(32) + c.zeroExtend(32),
+    a.signExtend(64) * d,
+    ExprCompose(a[8:16], c, b[:16]),
+    ExprCompose(a, b) + d,
+    ExprCond(cond, a, b),
+    ExprCond(a[:1], a + b, a ^ b)[4:12].zeroExtend(32),
+    ExprMem(a + b, 32) ^ ExprMem(a, 8).zeroExtend(32),
+]
+
+def memory(address, size):
+    return ((address * 0x12345679) ^ address) & ((1 << (8 * size)) - 1)
+
+def memory_batch(addresses, size):
+    return ((addresses * numpy.uint64(0x12345679)) ^ addresses) & \
+        numpy.uint64((1 << (8 * size)) - 1)
+
+count = 1000
+for expr in exprs:
+    print(expr)
+    leaves = get_expr_ids(expr)
+    inputs = {}
+    for leaf in leaves:
+        values = [random.getrandbits(leaf.size) for _ in range(count - 4)]
+        values += [0, 1, int(leaf.mask), 1 << (leaf.size - 1)]
+        inputs[leaf] = numpy.array(values, dtype=numpy.uint64)
+    result = batch_eval(expr, inputs, memory_batch)
+    assert result.dtype == numpy.uint64
+    assert result.shape == (count,)
+    func = compile_expr(expr)
+    for i in range(count):
+        values = dict((leaf, int(inputs[leaf][i])) for leaf in leaves)
+        assert int(result[i]) == func(values, memory)
+
+# Broadcasting
+result = batch_eval(a + b, {a: numpy.arange(10, dtype=numpy.uint64), b: 0xFFFFFFFF})
+assert list(result) == [0xFFFFFFFF] + list(range(9))
+
+# Cache
+assert compile_expr_batch(a + b) is compile_expr_batch(a + b)
+
+# Too large expressions
+try:
+    compile_expr_batch(ExprCompose(d, d))
+except ValueError:
+    pass
+else:
+    raise AssertionError("Expression larger than 64 bits must be rejected")
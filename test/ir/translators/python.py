@@ -0,0 +1,77 @@
+from __future__ import print_function
+import random
+
+from miasm.expression.expression import *
+from miasm.expression.simplifications import expr_simp
+from miasm.ir.translators.python import compile_expr, compiled_exprs
+
+random.seed(0)
+
+a = ExprId("a", 32)
+b = ExprId("b", 32)
+c = ExprId("c", 8)
+cond = ExprId("cond", 1)
+
+exprs = [
+    a + b,
+    a - b,
+    a * b ^ ExprInt(0x1337, 32),
+    ExprOp("<<<", a, b),
+    ExprOp(">>>", a, b),
+    a << b,
+    a >> b,
+    ExprOp("a>>", a, b),
+    ExprOp("udiv", a, b),
+    ExprOp("umod", a, b),
+    ExprOp("sdiv", a, b),
+    ExprOp("smod", a, b),
+    ExprOp("==", a, b).zeroExtend(32),
+    ExprOp("<u", a, b).zeroExtend(32),
+    ExprOp("<s", a, b).zeroExtend(32),
+    ExprOp("<=u", a, b).zeroExtend(32),
+    ExprOp("<=s", a, b).zeroExtend(32),
+    ExprOp("parity", a).zeroExtend(32),
+    ExprOp("cntleadzeros", a),
+    ExprOp("cnttrailzeros", a),
+    c.signExtend(32) + c.zeroExtend(32),
+    ExprCompose(a[8:16], c, b[:16]),
+    ExprCond(cond, a, b),
+    ExprCond(a[:1], a + b, a ^ b)[4:12].zeroExtend(32),
+]
+
+for expr in exprs:
+    func = compile_expr(expr)
+    print(expr)
+    print(func.source)
+    assert compile_expr(expr) is func
+    for values in [
+            [0, 0, 0, 0],
+            [0xFFFFFFFF, 1, 0x80, 1],
+            [0x80000000, 0xFFFFFFFF, 0x7F, 0],
+    ] + [
+        [random.getrandbits(32), random.getrandbits(32),
+         random.getrandbits(8), random.getrandbits(1)]
+        for _ in range(20)
+    ]:
+        leaves = dict(zip([a, b, c, cond], values))
+        ref = expr_simp(expr.replace_expr({
+            leaf: ExprInt(value, leaf.size)
+            for leaf, value in leaves.items()
+        }))
+        if not ref.is_int():
+            # Division by zero
+            continue
+        assert int(ref) == func(leaves)
+
+
+# Memory access
+memory = lambda addr, size: (addr * 0x10001) & ((1 << (size * 8)) - 1)
+func = compile_expr(ExprMem(a + ExprInt(4, 32), 16) + c.zeroExtend(16))
+assert func({a: 0x10, c: 2}, memory) == 0x16
+
+# ExprCond sources are evaluated lazily
+func = compile_expr(ExprCond(cond, ExprMem(a, 32), ExprOp("udiv", a, b)))
+assert func({a: 8, b: 0, cond: 1}, memory) == 0x80008
+assert func({a: 8, b: 2, cond: 0}) == 4
+
+assert len(compiled_exprs) > 0
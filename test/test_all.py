@@ -30,6 +30,7 @@ TAGS = {"regression": "REGRESSION", # Regression tests
         "gcc": "GCC", # GCC based tests
         "python": "PYTHON", # Python jitted tests
         "z3": "Z3", # Z3 dependency is needed
+        "numpy": "NUMPY", # NumPy dependency is needed
         "qemu": "QEMU", # QEMU tests (several tests)
         "cparser": "CPARSER", # pycparser is needed
         "linux": "LINUX", # Test must be run on a Linux
@@ -65,6 +66,8 @@ testset += RegressionTest(["sh4/arch.py"], base_dir="arch")
 testset += RegressionTest(["msp430/arch.py"], base_dir="arch")
 testset += RegressionTest(["mips32/arch.py"], base_dir="arch")
 testset += RegressionTest(["ppc32/arch.py"], base_dir="arch")
+testset += RegressionTest(["dis_speed.py", "0"], base_dir="arch")
+testset += RegressionTest(["import_speed.py"], base_dir="arch")
 
 
 
@@ -316,6 +319,9 @@ for script in ["modint.py",
                "sembuilder.py",
                "locationdb.py",
                "test_types.py",
+               "cpu.py",
+               "table_cache.py",
+               "bin_stream.py",
                ]:
     testset += RegressionTest([script], base_dir="core")
 testset += RegressionTest(["asmblock.py"], base_dir="core",
@@ -327,6 +333,7 @@ for script in ["expression.py",
                "simplifications.py",
                "expression_helper.py",
                "expr_pickle.py",
+               "expr_serialize.py",
                "parser.py",
                "expr_cmp.py",
                ]:
@@ -347,10 +354,17 @@ testset += RegressionTest(["test_chandler.py"], base_dir="expr_type",
 ## IR
 for script in ["symbexec.py",
                "ir.py",
-               "reduce_graph.py"
+               "reduce_graph.py",
+               "serialize.py",
+               "lift_cache.py",
+               "lift_parallel.py",
+               "ir_memory.py",
                ]:
     testset += RegressionTest([script], base_dir="ir")
 
+testset += RegressionTest(["python.py"], base_dir="ir/translators")
+testset += RegressionTest(["numpy_ir.py"], base_dir="ir/translators",
+                          tags=[TAGS["numpy"]])
 testset += RegressionTest(["z3_ir.py"], base_dir="ir/translators",
                           tags=[TAGS["z3"]])
 testset += RegressionTest(["smt2.py"], base_dir="ir/translators",
@@ -399,6 +413,8 @@ testset += RegressionTest(["data_flow.py"], base_dir="analysis",
             for test_nb in range(1, 18))
                                     for fname in fnames])
 testset += RegressionTest(["unssa.py"], base_dir="analysis")
+testset += RegressionTest(["simplifier.py"], base_dir="analysis")
+testset += RegressionTest(["binary_cache.py"], base_dir="analysis")
 
 for i in range(1, 21):
     input_name = "cst_propag/x86_32_sc_%d" % i
@@ -1003,6 +1019,15 @@ By default, all tag are considered." % ", ".join(list(TAGS)), default="")
         if TAGS["z3"] not in exclude_tags:
             exclude_tags.append(TAGS["z3"])
 
+    # Handle NumPy dependency
+    try:
+        import numpy
+    except ImportError:
+        print("%(red)s[NUMPY]%(end)s " % cosmetics.colors + \
+            "numpy is necessary for TranslatorNumpy.")
+        if TAGS["numpy"] not in exclude_tags:
+            exclude_tags.append(TAGS["numpy"])
+
     # Handle pycparser dependency
     try:
         import pycparser